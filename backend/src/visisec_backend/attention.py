@@ -0,0 +1,246 @@
+"""
+VisiSec Attention Scoring Engine
+服务端向量化注意力评分（NumPy）：运动幅度、滚动方差、应用切换密度、视线
+"""
+
+from typing import Any, Dict, Optional, Tuple
+import time
+
+import numpy as np
+
+# Penalties mirror AttentionScorer.scoreAttention in frontend/src/services/edgeModels.js
+MOTION_MODERATE = 1.0       # m/s², average magnitude above this is "moderate"
+MOTION_ACTIVE = 5.0         # above this is "active"
+MOTION_MODERATE_PENALTY = 0.1
+MOTION_ACTIVE_PENALTY = 0.3
+VARIANCE_THRESHOLD = 4.0    # magnitude variance considered fidgeting
+VARIANCE_PENALTY = 0.1
+SWITCH_PENALTY = 0.4        # full penalty at `switch_threshold` switches per window
+BACKGROUND_PENALTY = 0.5    # scaled by the fraction of the window spent in background
+GAZE_PENALTY = 0.3          # scaled by the fraction of the window looking away
+
+HIGH_THRESHOLD = 0.7
+LOW_THRESHOLD = 0.4
+STATE_SAMPLES_PER_WINDOW = 16
+MAX_WINDOWS = 100_000       # ~6 days of 5 s windows; bounds the per-window arrays
+EPOCH_MS_THRESHOLD = 1e11   # timestamps above this are epoch milliseconds
+
+REASONS = {
+    'motion': '手机移动',
+    'switches': '设备切换',
+    'background': '应用切到后台',
+    'gaze': '视线偏离',
+}
+
+
+def _to_seconds(t: np.ndarray) -> np.ndarray:
+    """Accept epoch milliseconds (JS Date.now()) or seconds, but not both in one column"""
+    t = np.asarray(t, dtype=np.float64)
+    finite = t[np.isfinite(t)]
+    if not finite.size:
+        return t
+    is_ms = finite > EPOCH_MS_THRESHOLD
+    if is_ms.all():
+        return t / 1000.0
+    if is_ms.any():
+        raise ValueError("Timestamps mix epoch milliseconds and seconds")
+    return t
+
+
+def _check_lengths(name: str, columns: Dict[str, np.ndarray]):
+    lengths = {column: len(values) for column, values in columns.items()}
+    if len(set(lengths.values())) > 1:
+        raise ValueError(f"{name} columns have different lengths: {lengths}")
+
+
+def _columns(data: Any, fields: Dict[str, Tuple[str, ...]]) -> Dict[str, np.ndarray]:
+    """
+    Normalize either columnar input (``{"t": [...], "ax": [...]}``) or a
+    list of records into float arrays. ``fields`` maps output column to the
+    key path inside a record, e.g. ``'ax': ('acceleration', 'x')``.
+    """
+    if not data:
+        return {name: np.empty(0) for name in fields}
+
+    if isinstance(data, dict):
+        out = {}
+        for name, path in fields.items():
+            values = data.get(name, data.get(path[-1]))
+            out[name] = np.asarray(values if values is not None else [], dtype=np.float64)
+        return out
+
+    out = {}
+    for name, path in fields.items():
+        values = []
+        for record in data:
+            value = record
+            for key in path:
+                value = value.get(key) if isinstance(value, dict) else None
+            values.append(np.nan if value is None else value)
+        out[name] = np.asarray(values, dtype=np.float64)
+    return out
+
+
+def imu_columns(imu_data: Any) -> Dict[str, np.ndarray]:
+    return _columns(imu_data, {
+        't': ('timestamp',),
+        'ax': ('acceleration', 'x'),
+        'ay': ('acceleration', 'y'),
+        'az': ('acceleration', 'z'),
+    })
+
+
+def app_state_columns(app_state: Any) -> Dict[str, np.ndarray]:
+    if isinstance(app_state, list) and app_state and isinstance(app_state[0], dict) and 'state' in app_state[0]:
+        return {
+            't': np.asarray([r.get('timestamp', np.nan) for r in app_state], dtype=np.float64),
+            'foreground': np.asarray([0.0 if r.get('state') == 'background' else 1.0 for r in app_state]),
+        }
+    return _columns(app_state, {'t': ('timestamp',), 'foreground': ('foreground',)})
+
+
+def gaze_columns(gaze_data: Any) -> Dict[str, np.ndarray]:
+    # on_screen: 1.0 looking at the screen/content, 0.0 looking away
+    return _columns(gaze_data, {'t': ('timestamp',), 'on_screen': ('on_screen',)})
+
+
+def _window_means(index: np.ndarray, values: np.ndarray, n_windows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-window count, mean and variance with bincount (no Python loops)"""
+    counts = np.bincount(index, minlength=n_windows).astype(np.float64)
+    sums = np.bincount(index, weights=values, minlength=n_windows)
+    squares = np.bincount(index, weights=values * values, minlength=n_windows)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, sums / counts, 0.0)
+        variances = np.where(counts > 1, squares / counts - means * means, 0.0)
+    return counts, means, np.maximum(variances, 0.0)
+
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start (inclusive) and end (exclusive) indices of True runs"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges[0::2], edges[1::2]
+
+
+def score_attention(
+    imu: Dict[str, np.ndarray],
+    app_state: Optional[Dict[str, np.ndarray]] = None,
+    gaze: Optional[Dict[str, np.ndarray]] = None,
+    window_seconds: float = 5.0,
+    switch_threshold: int = 3,
+    max_windows: Optional[int] = MAX_WINDOWS,
+) -> Dict[str, Any]:
+    """
+    Compute per-window attention scores from column arrays.
+
+    Returns the overall score, the per-window timeline and low-attention
+    periods (seconds relative to the first sample). Raises ValueError for
+    malformed input or a time span of more than ``max_windows`` windows.
+    """
+    started = time.perf_counter()
+    if not window_seconds > 0:
+        raise ValueError("window_seconds must be positive")
+    app_state = app_state or {'t': np.empty(0), 'foreground': np.empty(0)}
+    gaze = gaze or {'t': np.empty(0), 'on_screen': np.empty(0)}
+    for name, columns in (('imu', imu), ('app_state', app_state), ('gaze', gaze)):
+        _check_lengths(name, columns)
+
+    imu_t = _to_seconds(imu['t'])
+    app_t = _to_seconds(app_state['t'])
+    gaze_t = _to_seconds(gaze['t'])
+
+    all_t = [t[np.isfinite(t)] for t in (imu_t, app_t, gaze_t) if t.size]
+    all_t = [t for t in all_t if t.size]
+    if not all_t:
+        return {
+            'attention_score': None,
+            'level': 'unknown',
+            'low_attention_periods': [],
+            'timeline': {'window_seconds': window_seconds, 'scores': []},
+            'stats': {'samples': 0, 'windows': 0, 'elapsed_ms': 0.0}
+        }
+
+    t0 = min(t.min() for t in all_t)
+    t1 = max(t.max() for t in all_t)
+    n_windows = int((t1 - t0) // window_seconds) + 1
+    if max_windows is not None and n_windows > max_windows:
+        raise ValueError(
+            f"Time span of {t1 - t0:.0f}s needs {n_windows} windows of {window_seconds}s "
+            f"(limit {max_windows}); use a wider window_seconds or a shorter range"
+        )
+    penalties = {name: np.zeros(n_windows) for name in REASONS}
+
+    # Motion magnitude and its rolling (per-window) variance
+    valid = np.isfinite(imu_t)
+    if valid.any():
+        ax, ay, az = (np.nan_to_num(imu[c][valid]) for c in ('ax', 'ay', 'az'))
+        magnitude = np.sqrt(ax * ax + ay * ay + az * az)
+        index = ((imu_t[valid] - t0) // window_seconds).astype(np.int64)
+        counts, mean_mag, var_mag = _window_means(index, magnitude, n_windows)
+        has = counts > 0
+        penalties['motion'] = np.where(
+            has & (mean_mag >= MOTION_ACTIVE), MOTION_ACTIVE_PENALTY,
+            np.where(has & (mean_mag >= MOTION_MODERATE), MOTION_MODERATE_PENALTY, 0.0)
+        ) + np.where(has & (var_mag > VARIANCE_THRESHOLD), VARIANCE_PENALTY, 0.0)
+
+    # App state: switch density and time spent in background
+    valid = np.isfinite(app_t)
+    if valid.any():
+        order = np.argsort(app_t[valid], kind='stable')
+        state_t = app_t[valid][order]
+        foreground = app_state['foreground'][valid][order]
+
+        previous = np.concatenate(([1.0], foreground[:-1]))
+        to_background = (foreground == 0) & (previous != 0)
+        switch_index = ((state_t[to_background] - t0) // window_seconds).astype(np.int64)
+        switches = np.bincount(switch_index, minlength=n_windows)[:n_windows]
+        penalties['switches'] = SWITCH_PENALTY * np.minimum(1.0, switches / max(1, switch_threshold))
+
+        # Sample the piecewise-constant state on a sub-window grid
+        grid = t0 + (np.arange(n_windows * STATE_SAMPLES_PER_WINDOW) + 0.5) * (window_seconds / STATE_SAMPLES_PER_WINDOW)
+        position = np.searchsorted(state_t, grid, side='right') - 1
+        sampled = np.where(position >= 0, foreground[np.clip(position, 0, None)], 1.0)
+        background_fraction = 1.0 - sampled.reshape(n_windows, STATE_SAMPLES_PER_WINDOW).mean(axis=1)
+        penalties['background'] = BACKGROUND_PENALTY * background_fraction
+
+    # Gaze: fraction of the window looking away
+    valid = np.isfinite(gaze_t)
+    if valid.any():
+        index = ((gaze_t[valid] - t0) // window_seconds).astype(np.int64)
+        on_screen = np.clip(np.nan_to_num(gaze['on_screen'][valid], nan=1.0), 0.0, 1.0)
+        counts, mean_gaze, _ = _window_means(index, on_screen, n_windows)
+        penalties['gaze'] = np.where(counts > 0, GAZE_PENALTY * (1.0 - mean_gaze), 0.0)
+
+    stacked = np.vstack([penalties[name] for name in REASONS])
+    scores = np.clip(1.0 - stacked.sum(axis=0), 0.0, 1.0)
+
+    low = scores <= LOW_THRESHOLD
+    run_starts, run_ends = _runs(low)
+    reason_names = list(REASONS)
+    periods = []
+    for start, end in zip(run_starts.tolist(), run_ends.tolist()):
+        dominant = reason_names[int(stacked[:, start:end].sum(axis=1).argmax())]
+        periods.append({
+            'start': round(start * window_seconds, 3),
+            'end': round(min(end * window_seconds, t1 - t0), 3),
+            'duration': round((end - start) * window_seconds, 3),
+            'reason': REASONS[dominant]
+        })
+
+    overall = float(scores.mean())
+    samples = int(imu_t.size + app_t.size + gaze_t.size)
+    return {
+        'attention_score': round(overall, 4),
+        'level': 'high' if overall > HIGH_THRESHOLD else 'medium' if overall > LOW_THRESHOLD else 'low',
+        'low_attention_periods': periods,
+        'timeline': {
+            'window_seconds': window_seconds,
+            'start_time': float(t0),
+            'scores': np.round(scores, 4).tolist()
+        },
+        'stats': {
+            'samples': samples,
+            'windows': n_windows,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3)
+        }
+    }
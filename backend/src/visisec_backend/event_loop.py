@@ -0,0 +1,149 @@
+"""
+VisiSec Background Event Loop
+常驻后台事件循环线程，供异步路由与 Socket.IO 处理器共享
+"""
+
+from typing import Any, Awaitable, Optional
+import asyncio
+import atexit
+import concurrent.futures
+import contextvars
+import logging
+import threading
+
+from .native_threads import green_threads, native_executor, native_selector, start_native_thread
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundLoop:
+    """
+    A single long-running asyncio loop on a daemon thread.
+
+    Synchronous callers (Flask request threads, Socket.IO handlers) submit
+    coroutines with ``run()``/``submit()``. The caller's contextvars are
+    carried over, so Flask's ``request``/``g`` proxies keep working inside
+    the coroutine. Loop-bound resources (connection pools, semaphores,
+    locks) can therefore be shared across requests.
+    """
+
+    def __init__(self, name: str = 'visisec-async-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """The underlying loop, started lazily on first use"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"Background loop '{self.name}' is stopped")
+            if self._loop is None:
+                if green_threads():
+                    # Under gevent the loop still needs a real thread, epoll and executor
+                    loop = asyncio.SelectorEventLoop(native_selector())
+                    loop.set_default_executor(native_executor(4))
+                else:
+                    loop = asyncio.new_event_loop()
+                started = threading.Event()
+                thread = start_native_thread(self._run, loop, started, name=self.name)
+                started.wait()
+                self._loop = loop
+                self._thread = thread
+                logger.info(f"🔁 Background event loop started: {self.name}")
+            return self._loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop, started: threading.Event):
+        asyncio.set_event_loop(loop)
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+    def in_loop(self) -> bool:
+        """True when called from a coroutine running on this loop"""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, coro: Awaitable[Any]) -> concurrent.futures.Future:
+        """Schedule a coroutine on the loop, preserving the caller's context"""
+        loop = self.loop
+        ctx = contextvars.copy_context()
+        future: concurrent.futures.Future = concurrent.futures.Future()
+
+        def _start():
+            # create_task copies the *current* context, so create it inside ctx
+            task = ctx.run(loop.create_task, coro)
+
+            def _done(t: asyncio.Task):
+                if future.done():
+                    return
+                if t.cancelled():
+                    future.cancel()
+                elif t.exception() is not None:
+                    future.set_exception(t.exception())
+                else:
+                    future.set_result(t.result())
+
+            task.add_done_callback(_done)
+            future.add_done_callback(
+                lambda f: loop.call_soon_threadsafe(task.cancel) if f.cancelled() else None
+            )
+
+        loop.call_soon_threadsafe(_start)
+        return future
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread for its result"""
+        if self.in_loop():
+            raise RuntimeError("BackgroundLoop.run() called from inside the loop; await instead")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+    async def run_async(self, coro: Awaitable[Any]) -> Any:
+        """Await a coroutine on this loop from any other event loop"""
+        if self.in_loop():
+            return await coro
+        return await asyncio.wrap_future(self.submit(coro))
+
+    def stop(self, timeout: float = 5.0):
+        """Cancel outstanding tasks and stop the loop thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            loop, thread = self._loop, self._thread
+
+        if loop is None:
+            return
+
+        async def _cancel_all():
+            tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            asyncio.run_coroutine_threadsafe(_cancel_all(), loop).result(timeout)
+        except Exception as e:
+            logger.warning(f"⚠️  Error while cancelling background tasks: {str(e)}")
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            if thread is not None:
+                thread.join(timeout)
+            loop.close()
+            logger.info(f"🔁 Background event loop stopped: {self.name}")
+
+
+def create_background_loop(name: str = 'visisec-async-loop') -> BackgroundLoop:
+    """Create the process-wide background loop and register its shutdown hook"""
+    background = BackgroundLoop(name)
+    atexit.register(background.stop)
+    return background
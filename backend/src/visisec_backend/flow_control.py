@@ -0,0 +1,226 @@
+"""
+VisiSec Flow Control
+高频传感器事件的服务端流控：按会话令牌桶、处理负载与队列深度监测、throttle 降速建议与分级丢弃
+"""
+
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple
+import threading
+import time
+
+NORMAL, ELEVATED, OVERLOADED = 0, 1, 2
+LEVEL_NAMES = ('normal', 'elevated', 'overloaded')
+# Share of the per-session rate a client is asked to keep at each level
+LEVEL_RATE_FACTORS = (1.0, 0.5, 0.25)
+
+
+class TokenBucket:
+    """``rate`` tokens per second up to ``burst``; the rate can change on every call"""
+
+    __slots__ = ('burst', 'tokens', 'updated')
+
+    def __init__(self, burst: float, now: float):
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, rate: float, now: float, cost: float = 1.0) -> bool:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class _SessionFlow:
+    __slots__ = ('bucket', 'advised_level', 'advised_at', 'admitted', 'rejected')
+
+    def __init__(self, burst: float, now: float):
+        self.bucket = TokenBucket(burst, now)
+        self.advised_level = NORMAL
+        self.advised_at = 0.0
+        self.admitted = 0
+        self.rejected = 0
+
+
+class Admission(NamedTuple):
+    admitted: bool
+    level: int
+    throttle: Optional[Dict[str, Any]]   # advice to send to the client now, if any
+
+
+class FlowController:
+    """
+    Backpressure for high-rate sensor events.
+
+    Server load is the worst of: ingest handlers in flight against
+    ``max_inflight``, the moving average of handler time against
+    ``latency_target``, scheduling lag (how late a periodic sleep wakes up,
+    which catches a saturated event loop or GIL before handlers notice)
+    against ``lag_target``, and every watched queue's depth against its limit.
+    At ``elevated_load`` and above non-essential work (acks, debug
+    telemetry) is shed; at 1.0 and above the server is overloaded.
+
+    Each session has a token bucket whose refill rate is ``session_rate``
+    scaled down by the current level, so one fast client cannot take the
+    capacity of the others and everyone slows down together under load.
+    Events over budget are rejected before any processing. A ``throttle``
+    advice (events per second / minimum send interval) goes to a session
+    whenever its level changes, and at most once per ``advice_interval``
+    while it keeps being rejected.
+    """
+
+    def __init__(
+        self,
+        session_rate: float = 20.0,
+        session_burst: float = 40.0,
+        max_inflight: int = 64,
+        latency_target: float = 0.05,
+        lag_target: float = 0.1,
+        elevated_load: float = 0.5,
+        check_interval: float = 0.25,
+        advice_interval: float = 1.0,
+    ):
+        self.session_rate = session_rate
+        self.session_burst = max(1.0, session_burst)
+        self.max_inflight = max(1, max_inflight)
+        self.latency_target = latency_target
+        self.lag_target = lag_target
+        self.elevated_load = elevated_load
+        self.check_interval = check_interval
+        self.advice_interval = advice_interval
+
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _SessionFlow] = {}
+        self._queues: Dict[str, Tuple[Callable[[], int], int]] = {}
+        self._inflight = 0
+        self._latency = 0.0
+        self._lag = 0.0
+        self._load = 0.0
+        self._level = NORMAL
+        self._checked = 0.0
+        self.rejected = 0
+        self.shed = 0
+        self.advice_sent = 0
+        self.level_changes = 0
+
+    def watch(self, name: str, depth: Callable[[], int], limit: int):
+        """Count ``depth()`` against ``limit`` when computing the load"""
+        self._queues[name] = (depth, max(1, limit))
+
+    def _queue_loads(self) -> Dict[str, float]:
+        loads = {}
+        for name, (depth, limit) in self._queues.items():
+            try:
+                loads[name] = depth() / limit
+            except Exception:
+                loads[name] = 0.0
+        return loads
+
+    def _refresh(self, now: float):
+        """Recompute load and level (at most every ``check_interval``; caller holds the lock)"""
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        load = max(
+            self._inflight / self.max_inflight,
+            self._latency / self.latency_target if self.latency_target > 0 else 0.0,
+            self._lag / self.lag_target if self.lag_target > 0 else 0.0,
+            *self._queue_loads().values(),
+            0.0
+        )
+        level = OVERLOADED if load >= 1.0 else ELEVATED if load >= self.elevated_load else NORMAL
+        if level != self._level:
+            self.level_changes += 1
+        self._load, self._level = load, level
+
+    @property
+    def level(self) -> int:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._level
+
+    def rate_for(self, level: int) -> float:
+        return self.session_rate * LEVEL_RATE_FACTORS[level]
+
+    def advice(self, level: int) -> Dict[str, Any]:
+        rate = self.rate_for(level)
+        return {
+            'level': LEVEL_NAMES[level],
+            'maxEventsPerSecond': round(rate, 3),
+            'minIntervalMs': int(1000 / rate) if rate > 0 else None,
+            'acks': level == NORMAL,
+            'timestamp': time.time()
+        }
+
+    def admit(self, session_id: str, cost: float = 1.0) -> Admission:
+        """Charge one event to the session's budget; rejected events must not be processed"""
+        now = time.monotonic()
+        with self._lock:
+            self._refresh(now)
+            level = self._level
+            flow = self._sessions.get(session_id)
+            if flow is None:
+                flow = self._sessions[session_id] = _SessionFlow(self.session_burst, now)
+            admitted = flow.bucket.take(self.rate_for(level), now, cost)
+            if admitted:
+                flow.admitted += 1
+            else:
+                flow.rejected += 1
+                self.rejected += 1
+            if admitted and level > NORMAL:
+                self.shed += 1   # handled without its ack / debug telemetry
+
+            throttle = None
+            if level != flow.advised_level or (not admitted and now - flow.advised_at >= self.advice_interval):
+                flow.advised_level = level
+                flow.advised_at = now
+                self.advice_sent += 1
+                throttle = self.advice(level)
+        return Admission(admitted, level, throttle)
+
+    @contextmanager
+    def track(self) -> Iterator[None]:
+        """Count an admitted event as in flight and feed its handling time into the load"""
+        with self._lock:
+            self._inflight += 1
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._inflight -= 1
+                self._latency += 0.1 * (elapsed - self._latency)
+
+    def record_lag(self, lag: float):
+        """Feed one scheduling-lag probe (seconds a timed sleep overslept)"""
+        with self._lock:
+            self._lag += 0.3 * (max(0.0, lag) - self._lag)
+
+    def forget(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return {
+                'level': LEVEL_NAMES[self._level],
+                'load': round(self._load, 3),
+                'inflight': self._inflight,
+                'max_inflight': self.max_inflight,
+                'latency_ms': round(self._latency * 1000, 3),
+                'latency_target_ms': round(self.latency_target * 1000, 3),
+                'lag_ms': round(self._lag * 1000, 3),
+                'lag_target_ms': round(self.lag_target * 1000, 3),
+                'queues': {name: round(load, 3) for name, load in self._queue_loads().items()},
+                'session_rate': self.session_rate,
+                'advised_rate': round(self.rate_for(self._level), 3),
+                'sessions': len(self._sessions),
+                'rejected': self.rejected,
+                'shed': self.shed,
+                'advice_sent': self.advice_sent,
+                'level_changes': self.level_changes
+            }
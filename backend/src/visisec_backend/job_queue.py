@@ -0,0 +1,431 @@
+"""
+VisiSec Durable Media Job Queue
+基于 SQLite 的持久化媒体处理作业队列（优先级、租约、重启恢复、完成回调）
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from .media_jobs import MediaJobExecutor, TASKS, JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED, JOB_QUEUED, JOB_RUNNING
+
+logger = logging.getLogger(__name__)
+
+PRIORITIES = {'live': 10, 'normal': 5, 'bulk': 0}
+
+# on_finish(job_dict) — called from a worker thread once a job reaches a final state
+FinishCallback = Callable[[Dict[str, Any]], None]
+
+
+def parse_priority(value: Any, default: int = PRIORITIES['normal']) -> int:
+    """Accept a priority name ("live" / "normal" / "bulk") or an integer"""
+    if value is None or value == '':
+        return default
+    if isinstance(value, str) and value in PRIORITIES:
+        return PRIORITIES[value]
+    return int(value)
+
+
+class DurableJobQueue:
+    """
+    SQLite-backed queue in front of the media worker pool.
+
+    Jobs are claimed inside ``BEGIN IMMEDIATE`` transactions, so a job is
+    handed to exactly one worker even with several processes sharing the
+    database. A claimed job carries a lease that its worker keeps renewing;
+    on startup, jobs whose lease expired (their worker died mid-job) go back
+    to the queue until ``max_attempts`` is reached. Finished jobs are never
+    claimed again.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        executor: MediaJobExecutor,
+        concurrency: int = 2,
+        lease_seconds: float = 60.0,
+        max_attempts: int = 3,
+        on_finish: Optional[FinishCallback] = None,
+    ):
+        self.db_path = db_path
+        self.executor = executor
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.on_finish = on_finish
+        self.worker_id = uuid.uuid4().hex
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition()
+        self._waiters: Dict[str, threading.Event] = {}
+        self._running: Dict[str, str] = {}     # queue job id -> executor job id
+        self._cancelled: set = set()
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS media_jobs ('
+            ' job_id TEXT PRIMARY KEY,'
+            ' kind TEXT NOT NULL,'
+            ' media_id TEXT NOT NULL,'
+            ' path TEXT NOT NULL,'
+            ' params TEXT NOT NULL,'
+            ' start_time REAL NOT NULL DEFAULT 0,'
+            ' end_time REAL,'
+            ' priority INTEGER NOT NULL,'
+            ' status TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' lease_owner TEXT,'
+            ' lease_until REAL,'
+            ' notify_room TEXT,'
+            ' created_at REAL NOT NULL,'
+            ' started_at REAL,'
+            ' finished_at REAL,'
+            ' result TEXT,'
+            ' error TEXT)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_media_jobs_queue ON media_jobs (status, priority DESC, created_at)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_media_jobs_media ON media_jobs (media_id, kind)')
+        self.recover()
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _execute(self, sql: str, params: tuple = ()) -> int:
+        """Run a write statement; returns the number of affected rows"""
+        with self._lock:
+            return self._db.execute(sql, params).rowcount
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def recover(self) -> int:
+        """Requeue jobs whose worker lease expired (e.g. the process crashed)"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                failed = self._db.execute(
+                    'UPDATE media_jobs SET status = ?, error = ?, finished_at = ?, lease_owner = NULL'
+                    ' WHERE status = ? AND lease_until < ? AND attempts >= ?',
+                    (JOB_FAILED, 'Worker died too many times', now, JOB_RUNNING, now, self.max_attempts)
+                ).rowcount
+                requeued = self._db.execute(
+                    'UPDATE media_jobs SET status = ?, lease_owner = NULL, lease_until = NULL'
+                    ' WHERE status = ? AND lease_until < ?',
+                    (JOB_QUEUED, JOB_RUNNING, now)
+                ).rowcount
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+        if requeued or failed:
+            logger.info(f"♻️  Media queue recovery: {requeued} job(s) requeued, {failed} failed")
+        return requeued
+
+    def enqueue(
+        self,
+        kind: str,
+        media_id: str,
+        path: str,
+        params: Dict[str, Any],
+        priority: int = PRIORITIES['normal'],
+        start_time: float = 0.0,
+        end_time: Optional[float] = None,
+        notify_room: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        if kind not in TASKS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        job_id = str(uuid.uuid4())
+        self._execute(
+            'INSERT INTO media_jobs (job_id, kind, media_id, path, params, start_time, end_time,'
+            ' priority, status, notify_room, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (job_id, kind, media_id, path, json.dumps(params, ensure_ascii=False),
+             start_time, end_time, priority, JOB_QUEUED, notify_room, time.time())
+        )
+        with self._wakeup:
+            self._wakeup.notify()
+        logger.info(f"📥 Queued {kind} job {job_id} for {media_id} (priority {priority})")
+        return self.get(job_id)
+
+    def _row_to_dict(self, row: sqlite3.Row, include_result: bool = True) -> Dict[str, Any]:
+        data = {
+            'job_id': row['job_id'],
+            'kind': row['kind'],
+            'media_id': row['media_id'],
+            'status': row['status'],
+            'priority': row['priority'],
+            'attempts': row['attempts'],
+            'start_time': row['start_time'],
+            'end_time': row['end_time'],
+            'created_at': row['created_at'],
+            'started_at': row['started_at'],
+            'finished_at': row['finished_at'],
+            'notify_room': row['notify_room'],
+            'error': row['error']
+        }
+        executor_job_id = self._running.get(row['job_id'])
+        if executor_job_id:
+            executor_job = self.executor.get(executor_job_id)
+            if executor_job is not None:
+                progress = executor_job.to_dict(include_result=False)
+                data['segments'] = progress['segments']
+                data['completed_segments'] = progress['completed_segments']
+                data['progress'] = progress['progress']
+        elif row['status'] == JOB_COMPLETED:
+            data['progress'] = 1.0
+        if include_result:
+            data['result'] = json.loads(row['result']) if row['result'] else None
+        return data
+
+    def get(self, job_id: str, include_result: bool = True) -> Optional[Dict[str, Any]]:
+        rows = self._query('SELECT * FROM media_jobs WHERE job_id = ?', (job_id,))
+        return self._row_to_dict(rows[0], include_result) if rows else None
+
+    def find(self, media_id: str, kind: str) -> Optional[Dict[str, Any]]:
+        """Latest job of ``kind`` for a media item that has not failed or been cancelled"""
+        rows = self._query(
+            'SELECT * FROM media_jobs WHERE media_id = ? AND kind = ? AND status NOT IN (?, ?)'
+            ' ORDER BY created_at DESC LIMIT 1',
+            (media_id, kind, JOB_FAILED, JOB_CANCELLED)
+        )
+        return self._row_to_dict(rows[0]) if rows else None
+
+    def recent(self, limit: int = 50, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        if status:
+            rows = self._query(
+                'SELECT * FROM media_jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?', (status, limit)
+            )
+        else:
+            rows = self._query('SELECT * FROM media_jobs ORDER BY created_at DESC LIMIT ?', (limit,))
+        return [self._row_to_dict(row, include_result=False) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._query('SELECT status, COUNT(*) FROM media_jobs GROUP BY status')
+        return {status: count for status, count in rows}
+
+    def _claim(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._db.execute(
+                    'SELECT job_id FROM media_jobs WHERE status = ? ORDER BY priority DESC, created_at LIMIT 1',
+                    (JOB_QUEUED,)
+                ).fetchone()
+                if row is None:
+                    self._db.execute('COMMIT')
+                    return None
+                self._db.execute(
+                    'UPDATE media_jobs SET status = ?, attempts = attempts + 1, lease_owner = ?,'
+                    ' lease_until = ?, started_at = ? WHERE job_id = ? AND status = ?',
+                    (JOB_RUNNING, self.worker_id, now + self.lease_seconds, now, row['job_id'], JOB_QUEUED)
+                )
+                claimed = self._db.execute('SELECT * FROM media_jobs WHERE job_id = ?', (row['job_id'],)).fetchone()
+                self._db.execute('COMMIT')
+                return claimed
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _renew(self, job_id: str):
+        self._execute(
+            'UPDATE media_jobs SET lease_until = ? WHERE job_id = ? AND lease_owner = ?',
+            (time.time() + self.lease_seconds, job_id, self.worker_id)
+        )
+
+    def _finish(
+        self,
+        job_id: str,
+        status: str,
+        result: Optional[Dict[str, Any]] = None,
+        error: Optional[str] = None,
+        owned: bool = True,
+    ):
+        """
+        Record a final state. Worker results (``owned``) are only written while
+        this instance still holds the lease, so a job recovered by another
+        process after a stall is never finalized twice.
+        """
+        values = (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error, time.time(), job_id)
+        if owned:
+            updated = self._execute(
+                'UPDATE media_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_owner = NULL,'
+                ' lease_until = NULL WHERE job_id = ? AND status = ? AND lease_owner = ?',
+                values + (JOB_RUNNING, self.worker_id)
+            )
+        else:
+            updated = self._execute(
+                'UPDATE media_jobs SET status = ?, result = ?, error = ?, finished_at = ?, lease_owner = NULL,'
+                ' lease_until = NULL WHERE job_id = ? AND status IN (?, ?)',
+                values + (JOB_QUEUED, JOB_RUNNING)
+            )
+        if not updated:
+            logger.warning(f"⚠️  Media job {job_id} was already finalized or its lease was lost")
+            return
+
+        self._notify(job_id)
+
+    def _notify(self, job_id: str):
+        job = self.get(job_id)
+        with self._lock:
+            waiter = self._waiters.pop(job_id, None)
+        if waiter is not None:
+            waiter.set()
+        if job is not None and self.on_finish is not None:
+            try:
+                self.on_finish(job)
+            except Exception as e:
+                logger.error(f"❌ Media job callback failed: {str(e)}", exc_info=True)
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the dispatcher threads (idempotent)"""
+        if self._threads:
+            return
+        for i in range(self.concurrency):
+            thread = threading.Thread(target=self._worker_loop, name=f"media-queue-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"📥 Media job queue started: {self.db_path} ({self.concurrency} concurrent jobs)")
+
+    def _worker_loop(self):
+        last_recovery = time.monotonic()
+        while not self._stopping:
+            if time.monotonic() - last_recovery > self.lease_seconds:
+                # Pick up jobs orphaned by another process sharing the database
+                last_recovery = time.monotonic()
+                try:
+                    self.recover()
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Media queue recovery failed: {str(e)}")
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                logger.error(f"❌ Media queue claim failed: {str(e)}")
+                row = None
+            if row is None:
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1.0)
+                continue
+            self._process(row)
+
+    def _process(self, row: sqlite3.Row):
+        job_id = row['job_id']
+        try:
+            executor_job = self.executor.submit(
+                row['kind'], row['media_id'], row['path'], json.loads(row['params']),
+                start_time=row['start_time'], end_time=row['end_time']
+            )
+        except Exception as e:
+            logger.error(f"❌ Media job {job_id} could not start: {str(e)}")
+            self._finish(job_id, JOB_FAILED, error=str(e))
+            return
+
+        with self._lock:
+            self._running[job_id] = executor_job.job_id
+            cancelled = job_id in self._cancelled
+        if cancelled:
+            self.executor.cancel(executor_job.job_id)
+
+        # Keep the lease alive while the worker pool runs the segments
+        while not executor_job.done.wait(self.lease_seconds / 4):
+            self._renew(job_id)
+
+        with self._lock:
+            self._running.pop(job_id, None)
+            self._cancelled.discard(job_id)
+        if executor_job.status == JOB_COMPLETED:
+            self._finish(job_id, JOB_COMPLETED, result=executor_job.result)
+        else:
+            self._finish(job_id, executor_job.status, error=executor_job.error)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it already finished"""
+        job = self.get(job_id, include_result=False)
+        if job is None or job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            return False
+        if job['status'] == JOB_QUEUED:
+            if self._execute(
+                'UPDATE media_jobs SET status = ?, finished_at = ? WHERE job_id = ? AND status = ?',
+                (JOB_CANCELLED, time.time(), job_id, JOB_QUEUED)
+            ):
+                self._notify(job_id)
+                return True
+
+        with self._lock:
+            executor_job_id = self._running.get(job_id)
+            if executor_job_id is None:
+                # Claimed but not yet submitted; _process cancels it right after
+                self._cancelled.add(job_id)
+        if executor_job_id is not None:
+            self.executor.cancel(executor_job_id)
+        return True
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Block until the job finishes (or ``timeout``); returns its latest state"""
+        with self._lock:
+            event = self._waiters.setdefault(job_id, threading.Event())
+        job = self.get(job_id)
+        if job is None or job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+            with self._lock:
+                self._waiters.pop(job_id, None)
+            return job
+        event.wait(timeout)
+        return self.get(job_id)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'db_path': self.db_path,
+            'concurrency': self.concurrency,
+            'running': len(self._running),
+            'jobs': self.counts(),
+            'pool': self.executor.snapshot()
+        }
+
+    def stop(self):
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        # Jobs still running keep their lease and are requeued on next start
+
+
+def create_job_queue(
+    db_path: str,
+    executor: MediaJobExecutor,
+    concurrency: int,
+    lease_seconds: float,
+    max_attempts: int,
+    on_finish: Optional[FinishCallback] = None,
+) -> DurableJobQueue:
+    """Create the process-wide queue, start its workers and register shutdown"""
+    job_queue = DurableJobQueue(
+        db_path,
+        executor,
+        concurrency=concurrency,
+        lease_seconds=lease_seconds,
+        max_attempts=max_attempts,
+        on_finish=on_finish
+    )
+    job_queue.start()
+    atexit.register(job_queue.stop)
+    return job_queue
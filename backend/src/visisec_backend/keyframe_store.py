@@ -0,0 +1,318 @@
+"""
+VisiSec Keyframe Image Store
+实时关键帧图像的感知哈希去重（aHash/dHash + 汉明距离）、内容寻址存储与按需缩略图
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import uuid
+
+import cv2
+import numpy as np
+
+from .sensor_archive import archive_path
+
+logger = logging.getLogger(__name__)
+
+_DIGEST = re.compile(r'^[0-9a-f]{64}$')
+_IMAGE_TYPES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'RIFF', 'image/webp'),
+]
+
+
+class KeyframeImageError(ValueError):
+    """Payload is too large or is not a decodable image"""
+
+
+def image_mimetype(head: bytes) -> str:
+    for magic, mimetype in _IMAGE_TYPES:
+        if head.startswith(magic):
+            return mimetype
+    return 'application/octet-stream'
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), 'big')
+
+
+def average_hash(gray: np.ndarray) -> int:
+    """64-bit aHash: 8x8 area-averaged thumbnail, one bit per pixel above the mean"""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return _pack(small > small.mean())
+
+
+def difference_hash(gray: np.ndarray) -> int:
+    """64-bit dHash: 9x8 thumbnail, one bit per horizontal gradient sign"""
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA).astype(np.int16)
+    return _pack(small[:, 1:] > small[:, :-1])
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(values)
+    return np.unpackbits(values.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
+
+def hamming_distances(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Hamming distance from ``value`` to every 64-bit hash in ``hashes``"""
+    return _popcount(np.bitwise_xor(hashes, np.uint64(value)))
+
+
+class BlobStore:
+    """
+    Content-addressed files: ``<root>/<sha256[:2]>/<sha256>``. Writing the
+    same bytes twice stores them once; files are never modified after the
+    atomic rename, so readers need no locking.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.writes = 0
+        self.deduplicated = 0
+
+    def path(self, digest: str) -> str:
+        if not _DIGEST.match(digest or ''):
+            raise ValueError(f"Invalid blob digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def put(self, data: bytes, digest: Optional[str] = None) -> Tuple[str, bool]:
+        """Store ``data``; returns ``(digest, created)``"""
+        digest = digest or hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if os.path.exists(path):
+            self.deduplicated += 1
+            return digest, False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(partial, 'wb') as f:
+            f.write(data)
+        os.replace(partial, path)
+        self.writes += 1
+        return digest, True
+
+
+class _Recording:
+    """Dedup index of one recording: hashes of its distinct images plus counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.images: Dict[str, Dict[str, Any]] = {}
+        self.digests: List[str] = []
+        self.ahash = np.empty(0, dtype=np.uint64)
+        self.dhash = np.empty(0, dtype=np.uint64)
+        self.frames = 0
+        self.duplicates = 0
+
+    def add_image(self, info: Dict[str, Any], ahash: int, dhash: int):
+        self.images[info['image']] = info
+        self.digests.append(info['image'])
+        self.ahash = np.append(self.ahash, np.uint64(ahash))
+        self.dhash = np.append(self.dhash, np.uint64(dhash))
+
+    def seen(self, digest: str, t: float):
+        info = self.images[digest]
+        info['count'] += 1
+        info['last_t'] = t
+        self.frames += 1
+
+
+class KeyframeStore:
+    """
+    Keyframe images of live recordings.
+
+    Each image is first checked by SHA-256 (a byte-identical resend costs a
+    hash and a dict lookup), then decoded at reduced size and compared by
+    aHash and dHash with the recording's distinct images; within
+    ``hamming_threshold`` bits on both it counts as the same slide and is
+    neither stored nor processed further. Distinct images go to the
+    content-addressed blob store once. Every keyframe is appended to
+    ``<root>/recordings/<recording_id>.jsonl`` so the index survives a
+    restart and can be rebuilt for finished meetings.
+    """
+
+    def __init__(self, root: str, hamming_threshold: int = 4, thumbnail_width: int = 320, max_bytes: int = 4 * 1024 * 1024):
+        self.root = root
+        self.blobs = BlobStore(os.path.join(root, 'blobs'))
+        self.hamming_threshold = hamming_threshold
+        self.thumbnail_width = thumbnail_width
+        self.max_bytes = max_bytes
+        self._manifests = os.path.join(root, 'recordings')
+        self._thumbnails = os.path.join(root, 'thumbnails', f"w{thumbnail_width}")
+        os.makedirs(self._manifests, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, _Recording] = {}
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.thumbnails_built = 0
+
+    def _manifest(self, recording_id: str) -> str:
+        return archive_path(self._manifests, recording_id) + '.jsonl'
+
+    def _recording(self, recording_id: str, live: bool = True) -> _Recording:
+        """Index of a recording; finished ones are read from the manifest without being kept"""
+        with self._lock:
+            recording = self._recordings.get(recording_id)
+            if recording is None:
+                recording = self._load(recording_id)
+                if live:
+                    self._recordings[recording_id] = recording
+            return recording
+
+    def _load(self, recording_id: str) -> _Recording:
+        recording = _Recording()
+        path = self._manifest(recording_id)
+        if not os.path.exists(path):
+            return recording
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line after a crash
+                if entry['image'] in recording.images:
+                    recording.seen(entry['image'], entry['t'])
+                    recording.duplicates += 1
+                else:
+                    recording.add_image(self._image_info(entry), int(entry['ahash'], 16), int(entry['dhash'], 16))
+                    recording.frames += 1
+        return recording
+
+    @staticmethod
+    def _image_info(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'image': entry['image'],
+            'width': entry['width'],
+            'height': entry['height'],
+            'bytes': entry['bytes'],
+            'first_t': entry['t'],
+            'last_t': entry['t'],
+            'count': 1
+        }
+
+    def _append(self, recording_id: str, entry: Dict[str, Any]):
+        with open(self._manifest(recording_id), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def add(self, recording_id: str, data: bytes, t: float) -> Dict[str, Any]:
+        """
+        Add one keyframe image; returns ``{'image', 'duplicate', 'distance'}``
+        where ``image`` is the digest of the stored image it maps to.
+        """
+        if len(data) > self.max_bytes:
+            raise KeyframeImageError(f"Keyframe image exceeds {self.max_bytes} bytes")
+        recording = self._recording(recording_id)
+        digest = hashlib.sha256(data).hexdigest()
+
+        with recording.lock:
+            if digest in recording.images:
+                recording.seen(digest, t)
+                recording.duplicates += 1
+                self.exact_hits += 1
+                self._append(recording_id, {'t': t, 'image': digest, 'duplicate': True, 'distance': 0})
+                return {'image': digest, 'duplicate': True, 'distance': 0}
+
+        # Decoding at 1/4 scale is plenty for 8x8 / 9x8 hashes
+        gray = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+        if gray is None:
+            raise KeyframeImageError("Keyframe payload is not a decodable image")
+        ahash, dhash = average_hash(gray), difference_hash(gray)
+
+        with recording.lock:
+            if recording.digests:
+                a_dist = hamming_distances(recording.ahash, ahash)
+                d_dist = hamming_distances(recording.dhash, dhash)
+                distance = np.maximum(a_dist, d_dist)
+                best = int(np.argmin(distance))
+                if distance[best] <= self.hamming_threshold:
+                    match = recording.digests[best]
+                    recording.seen(match, t)
+                    recording.duplicates += 1
+                    self.near_hits += 1
+                    self._append(recording_id, {'t': t, 'image': match, 'duplicate': True, 'distance': int(distance[best])})
+                    return {'image': match, 'duplicate': True, 'distance': int(distance[best])}
+
+            # Only distinct slides get the full-size decode (for their dimensions)
+            height, width = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_UNCHANGED).shape[:2]
+            self.blobs.put(data, digest)
+            entry = {
+                't': t, 'image': digest, 'duplicate': False, 'distance': None,
+                'ahash': f"{ahash:016x}", 'dhash': f"{dhash:016x}",
+                'width': int(width), 'height': int(height), 'bytes': len(data)
+            }
+            recording.add_image(self._image_info(entry), ahash, dhash)
+            recording.frames += 1
+            self._append(recording_id, entry)
+        return {'image': digest, 'duplicate': False, 'distance': None}
+
+    def images(self, recording_id: str) -> List[Dict[str, Any]]:
+        """Distinct images of a recording in first-seen order"""
+        recording = self._recording(recording_id, live=False)
+        with recording.lock:
+            return [dict(recording.images[d]) for d in recording.digests]
+
+    def has_image(self, recording_id: str, digest: str) -> bool:
+        recording = self._recording(recording_id, live=False)
+        with recording.lock:
+            return digest in recording.images
+
+    def finish(self, recording_id: str) -> Dict[str, Any]:
+        """Summary for the meeting record; the index is dropped from memory"""
+        recording = self._recording(recording_id, live=False)
+        with self._lock:
+            self._recordings.pop(recording_id, None)
+        with recording.lock:
+            return {
+                'frames': recording.frames,
+                'duplicates': recording.duplicates,
+                'images': [dict(recording.images[d]) for d in recording.digests]
+            }
+
+    def image_path(self, digest: str) -> str:
+        return self.blobs.path(digest)
+
+    def thumbnail_path(self, digest: str) -> str:
+        """JPEG thumbnail of a stored image, built on first request and cached on disk"""
+        path = os.path.join(self._thumbnails, digest[:2], f"{digest}.jpg")
+        if os.path.exists(path):
+            return path
+        image = cv2.imread(self.blobs.path(digest), cv2.IMREAD_COLOR)
+        if image is None:
+            raise KeyframeImageError(f"Stored image {digest} cannot be decoded")
+        height, width = image.shape[:2]
+        if width > self.thumbnail_width:
+            size = (self.thumbnail_width, max(1, round(height * self.thumbnail_width / width)))
+            image = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{uuid.uuid4().hex}.tmp.jpg"
+        cv2.imwrite(partial, image, [cv2.IMWRITE_JPEG_QUALITY, 80])
+        os.replace(partial, path)
+        self.thumbnails_built += 1
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            recordings = list(self._recordings.values())
+        frames = sum(r.frames for r in recordings)
+        return {
+            'hamming_threshold': self.hamming_threshold,
+            'live_recordings': len(recordings),
+            'frames': frames,
+            'distinct_images': sum(len(r.digests) for r in recordings),
+            'exact_duplicates': self.exact_hits,
+            'near_duplicates': self.near_hits,
+            'blob_writes': self.blobs.writes,
+            'blob_dedup': self.blobs.deduplicated,
+            'thumbnails_built': self.thumbnails_built
+        }
@@ -0,0 +1,182 @@
+"""
+VisiSec Keyframe Extraction Engine
+基于 OpenCV 的场景变化/关键帧检测（跳帧采样 + 缩小灰度帧差分 + 直方图）
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+CHANGE_TYPES = {
+    'initial': '初始画面',
+    'slide_change': '幻灯片变化',
+    'content_update': '内容更新',
+}
+
+
+class KeyframeExtractor:
+    """
+    Scene-change detector for recorded meetings.
+
+    Frames are sampled every ``stride_seconds``; skipped frames are only
+    ``grab()``-ed (or seeked over for long strides) so they are never
+    converted or copied. Each sampled frame is downscaled to a small
+    grayscale image and compared with the last keyframe: a large pixel
+    difference with a large histogram change is a slide change, a large
+    pixel difference with a similar histogram is incremental content
+    (e.g. new whiteboard writing).
+    """
+
+    def __init__(
+        self,
+        stride_seconds: float = 0.5,
+        downscale_width: int = 160,
+        diff_threshold: float = 0.08,
+        hist_threshold: float = 0.25,
+        min_interval_seconds: float = 1.0,
+        seek_stride_frames: int = 90,
+    ):
+        self.stride_seconds = stride_seconds
+        self.downscale_width = downscale_width
+        self.diff_threshold = diff_threshold
+        self.hist_threshold = hist_threshold
+        self.min_interval_seconds = min_interval_seconds
+        self.seek_stride_frames = seek_stride_frames
+
+    def _prepare(self, frame: np.ndarray):
+        height, width = frame.shape[:2]
+        scaled_height = max(1, int(height * self.downscale_width / width))
+        small = cv2.resize(frame, (self.downscale_width, scaled_height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        hist = cv2.calcHist([gray], [0], None, [32], [0, 256])
+        cv2.normalize(hist, hist)
+        return gray.astype(np.float32), hist
+
+    def extract(
+        self,
+        video_path: str,
+        start_time: float = 0.0,
+        end_time: Optional[float] = None,
+        save_dir: Optional[str] = None,
+        frame_id_prefix: str = 'frame',
+        emit_initial: bool = True,
+        should_stop: Optional[Callable[[], bool]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Detect keyframes in ``[start_time, end_time)`` of a video file.
+        Returns keyframes plus per-job throughput statistics.
+
+        With ``emit_initial=False`` the first sampled frame only seeds the
+        reference image; used when a long video is split into segments and
+        each segment starts one stride before its boundary.
+        ``should_stop`` is polled once per analysed frame for cancellation.
+        """
+        started = time.perf_counter()
+        capture = cv2.VideoCapture(video_path)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {video_path}")
+
+        try:
+            fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+            total_frames = int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+            duration = total_frames / fps if total_frames else None
+            stride = max(1, int(round(self.stride_seconds * fps)))
+
+            first_index = frame_index = int(round(start_time * fps))
+            end_index = int(round(end_time * fps)) if end_time is not None else None
+            if frame_index:
+                capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+
+            if save_dir:
+                os.makedirs(save_dir, exist_ok=True)
+
+            keyframes: List[Dict[str, Any]] = []
+            reference_gray = None
+            reference_hist = None
+            last_keyframe_time = -float('inf')
+            frames_read = 0
+            frames_sampled = 0
+            cancelled = False
+
+            while end_index is None or frame_index < end_index:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                if should_stop is not None and should_stop():
+                    cancelled = True
+                    break
+                frames_read += 1
+                frames_sampled += 1
+                timestamp = frame_index / fps
+
+                gray, hist = self._prepare(frame)
+                change_type = None
+                change_ratio = 0.0
+                if reference_gray is None:
+                    if emit_initial:
+                        change_type = 'initial'
+                    else:
+                        reference_gray, reference_hist = gray, hist
+                elif timestamp - last_keyframe_time >= self.min_interval_seconds:
+                    change_ratio = float(np.mean(np.abs(gray - reference_gray))) / 255.0
+                    if change_ratio >= self.diff_threshold:
+                        hist_distance = cv2.compareHist(reference_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+                        change_type = 'slide_change' if hist_distance >= self.hist_threshold else 'content_update'
+
+                if change_type is not None:
+                    frame_id = f"{frame_id_prefix}_{frame_index:07d}"
+                    keyframe = {
+                        'timestamp': round(timestamp, 3),
+                        'frame_id': frame_id,
+                        'frame_index': frame_index,
+                        'change_type': CHANGE_TYPES[change_type],
+                        'change_kind': change_type,
+                        'change_ratio': round(change_ratio, 4)
+                    }
+                    if save_dir:
+                        image_path = os.path.join(save_dir, f"{frame_id}.jpg")
+                        cv2.imwrite(image_path, frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                        keyframe['image_path'] = image_path
+                    keyframes.append(keyframe)
+                    reference_gray, reference_hist = gray, hist
+                    last_keyframe_time = timestamp
+
+                # Skip ahead without decoding into Python-visible frames
+                next_index = frame_index + stride
+                if end_index is not None and next_index >= end_index:
+                    break
+                if stride >= self.seek_stride_frames:
+                    capture.set(cv2.CAP_PROP_POS_FRAMES, next_index)
+                else:
+                    for _ in range(stride - 1):
+                        if not capture.grab():
+                            break
+                        frames_read += 1
+                frame_index = next_index
+        finally:
+            capture.release()
+
+        elapsed = time.perf_counter() - started
+        covered = (frame_index - first_index) / fps
+        return {
+            'keyframes': keyframes,
+            'cancelled': cancelled,
+            'stats': {
+                'fps': fps,
+                'duration': duration,
+                'segment': [start_time, end_time],
+                'stride_frames': stride,
+                'frames_read': frames_read,
+                'frames_analyzed': frames_sampled,
+                'covered_seconds': round(covered, 3),
+                'elapsed_seconds': round(elapsed, 3),
+                'frames_per_second': round(frames_read / elapsed, 1) if elapsed > 0 else None,
+                'realtime_factor': round(covered / elapsed, 1) if elapsed > 0 else None
+            }
+        }
@@ -0,0 +1,232 @@
+"""
+VisiSec Live Summarizer
+录制进行中的增量滚动摘要（每 N 分钟或每 K 条新转录片段更新一次）
+"""
+
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import logging
+import threading
+import time
+
+from .event_loop import BackgroundLoop
+from .summarizer import MapReduceSummarizer
+
+logger = logging.getLogger(__name__)
+
+# on_update(recording_id, summary_text, final)
+UpdateCallback = Callable[[str, str, bool], None]
+
+
+class _LiveState:
+    """Rolling summary state for one recording"""
+
+    def __init__(self, recording_id: str):
+        self.recording_id = recording_id
+        self.started_at = time.time()
+        self.pending: List[Dict[str, Any]] = []
+        self.mapping: List[Dict[str, Any]] = []   # tail taken from pending, not yet a partial
+        self.pending_lock = threading.Lock()
+        self.partials: List[str] = []
+        self.segment_count = 0
+        self.summary: Optional[str] = None
+        self.updated_at: Optional[float] = None
+        self.lock: Optional[asyncio.Lock] = None
+        self.timer: Optional[asyncio.Task] = None
+        self.updating = False
+
+
+class LiveSummarizer:
+    """
+    Maintains a running summary per active recording.
+
+    New transcript segments are buffered; every ``segment_threshold``
+    segments or every ``interval`` seconds the buffered tail is mapped into
+    one more partial summary and the partials are reduced into an updated
+    running summary. At session end only the remaining tail needs mapping
+    before a final reduce, which is usually a cache hit when nothing new
+    arrived since the last rolling update.
+    """
+
+    def __init__(
+        self,
+        summarizer: MapReduceSummarizer,
+        background: BackgroundLoop,
+        on_update: UpdateCallback,
+        interval: float = 300.0,
+        segment_threshold: int = 40,
+    ):
+        self.summarizer = summarizer
+        self.background = background
+        self.on_update = on_update
+        self.interval = interval
+        self.segment_threshold = max(1, segment_threshold)
+        self._states: Dict[str, _LiveState] = {}
+        self._lock = threading.Lock()
+
+    def start(self, recording_id: str, checkpoint: Optional[Dict[str, Any]] = None):
+        """
+        Begin tracking a recording and start its periodic update timer.
+        ``checkpoint`` (see ``checkpoint()``) restores a recording that moved
+        here from another worker, so the final summary still covers it all.
+        """
+        state = _LiveState(recording_id)
+        if checkpoint:
+            state.started_at = checkpoint.get('started_at') or state.started_at
+            state.partials = list(checkpoint.get('partials') or [])
+            state.pending = list(checkpoint.get('pending') or [])
+            state.segment_count = checkpoint.get('segment_count') or 0
+            state.summary = checkpoint.get('summary')
+            state.updated_at = checkpoint.get('updated_at')
+        with self._lock:
+            self._states[recording_id] = state
+        self.background.submit(self._start_timer(state))
+        logger.info(
+            f"📝 Live summary {'resumed' if checkpoint else 'started'} for recording: {recording_id}"
+            + (f" ({len(state.partials)} partials, {len(state.pending)} pending segments)" if checkpoint else '')
+        )
+
+    async def _start_timer(self, state: _LiveState):
+        state.lock = asyncio.Lock()
+        state.timer = asyncio.create_task(self._timer_loop(state))
+
+    async def _timer_loop(self, state: _LiveState):
+        while True:
+            await asyncio.sleep(self.interval)
+            if state.pending:
+                await self._update(state, final=False)
+
+    def add_segments(self, recording_id: str, segments: List[Dict[str, Any]]) -> int:
+        """
+        Buffer transcript segments (``start``/``speaker``/``text``). Segments
+        without ``start`` are stamped with the offset since session start.
+        Returns the number of segments accepted.
+        """
+        with self._lock:
+            state = self._states.get(recording_id)
+        if state is None:
+            return 0
+
+        now_offset = time.time() - state.started_at
+        accepted = 0
+        with state.pending_lock:
+            for seg in segments:
+                text = str(seg.get('text', '')).strip()
+                if not text:
+                    continue
+                start = seg.get('start')
+                state.pending.append({
+                    'start': float(start) if start is not None else round(now_offset, 1),
+                    'speaker': seg.get('speaker') or '',
+                    'text': text
+                })
+                accepted += 1
+            state.segment_count += accepted
+            trigger = len(state.pending) >= self.segment_threshold and not state.updating
+            if trigger:
+                state.updating = True
+
+        if trigger:
+            self.background.submit(self._update(state, final=False))
+        return accepted
+
+    async def _update(self, state: _LiveState, final: bool) -> Optional[str]:
+        if state.lock is None:
+            state.lock = asyncio.Lock()
+        async with state.lock:
+            with state.pending_lock:
+                tail, state.pending = state.pending, []
+                state.mapping = tail
+            try:
+                if tail:
+                    partial = await self.summarizer.map_chunk(tail)
+                    with state.pending_lock:
+                        state.partials.append(partial)
+                        state.mapping = []
+                    tail = []
+                if not state.partials:
+                    return state.summary
+
+                messages = await self.summarizer.reduce_messages(state.partials)
+                state.summary = await self.summarizer.llm(messages)
+                state.updated_at = time.time()
+                logger.info(
+                    f"📝 Live summary {'finalized' if final else 'updated'} for "
+                    f"{state.recording_id} ({len(state.partials)} partials)"
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Live summary update failed for {state.recording_id}: {str(e)}")
+                # Keep unmapped segments for the next attempt
+                with state.pending_lock:
+                    state.pending = tail + state.pending
+                    state.mapping = []
+                return state.summary
+            finally:
+                state.updating = False
+
+        if state.summary is None:
+            return None
+        try:
+            self.on_update(state.recording_id, state.summary, final)
+        except Exception as e:
+            logger.error(f"❌ Live summary callback failed: {str(e)}", exc_info=True)
+        return state.summary
+
+    def snapshot(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """Current rolling summary state for a recording"""
+        with self._lock:
+            state = self._states.get(recording_id)
+        if state is None:
+            return None
+        return {
+            'recording_id': recording_id,
+            'summary': state.summary,
+            'updated_at': state.updated_at,
+            'segment_count': state.segment_count,
+            'pending_segments': len(state.pending),
+            'partials': len(state.partials)
+        }
+
+    def checkpoint(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """
+        JSON-serializable copy of a recording's partial summaries and its
+        unmapped segments, for ``start()`` on the worker that takes it over
+        """
+        with self._lock:
+            state = self._states.get(recording_id)
+        if state is None:
+            return None
+        with state.pending_lock:
+            return {
+                'started_at': state.started_at,
+                'partials': list(state.partials),
+                'pending': state.mapping + state.pending,
+                'segment_count': state.segment_count,
+                'summary': state.summary,
+                'updated_at': state.updated_at
+            }
+
+    async def _finish(self, state: _LiveState) -> Optional[str]:
+        if state.timer is not None:
+            state.timer.cancel()
+        return await self._update(state, final=True)
+
+    def finish(self, recording_id: str):
+        """
+        Stop tracking and schedule the final reduce. Returns a future with
+        the final summary text (None if nothing was transcribed).
+        """
+        with self._lock:
+            state = self._states.pop(recording_id, None)
+        if state is None:
+            return None
+        return self.background.submit(self._finish(state))
+
+    def discard(self, recording_id: str):
+        """Stop tracking a recording without producing a final summary"""
+        with self._lock:
+            state = self._states.pop(recording_id, None)
+        if state is not None and state.timer is not None:
+            self.background.loop.call_soon_threadsafe(state.timer.cancel)
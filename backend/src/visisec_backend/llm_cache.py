@@ -0,0 +1,243 @@
+"""
+VisiSec LLM Response Cache
+基于内容哈希的 LLM 响应缓存（内存 LRU + 可选 SQLite 持久层）
+"""
+
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def make_cache_key(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: float,
+    max_tokens: int
+) -> str:
+    """Content-addressed key: sha256 over the canonical request parameters"""
+    canonical = json.dumps(
+        {
+            'model': model,
+            'messages': messages,
+            'temperature': temperature,
+            'max_tokens': max_tokens
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(',', ':')
+    )
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier cache for LLM completions.
+
+    - Memory tier: LRU bounded by ``max_entries`` with a per-entry TTL.
+    - Disk tier (optional): SQLite table that survives restarts. Disk hits
+      are promoted back into the memory tier.
+
+    Callers on the shared event loop use ``aget``/``aset``: only the memory
+    tier is touched on the loop, the SQLite reads, writes and commits run
+    on the loop's executor so they never stall other LLM calls or streams.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        ttl: float = 3600.0,
+        db_path: Optional[str] = None,
+        disk_ttl: float = 7 * 24 * 3600.0,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path or None
+        self.disk_ttl = disk_ttl
+
+        self._memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()      # memory tier and counters
+        self._db_lock = threading.Lock()   # disk tier connection
+        self._db: Optional[sqlite3.Connection] = None
+
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._stores = 0
+
+        if self.db_path:
+            self._open_db()
+
+    def _open_db(self):
+        directory = os.path.dirname(os.path.abspath(self.db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS llm_cache ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' expires_at REAL NOT NULL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_expires ON llm_cache (expires_at)')
+        self._db.commit()
+        logger.info(f"💾 LLM cache disk tier enabled: {self.db_path}")
+
+    def get_memory(self, key: str) -> Optional[str]:
+        """Memory tier only; a miss here is not counted until the disk tier is checked"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._memory_hits += 1
+                return value
+            del self._memory[key]
+            self._expirations += 1
+            return None
+
+    def _get_disk(self, key: str) -> Optional[str]:
+        """Disk tier lookup after a memory miss (blocking); counts the hit or miss"""
+        now = time.time()
+        value = None
+        expired = False
+        with self._db_lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT value, expires_at FROM llm_cache WHERE key = ?', (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        value = row[0]
+                    else:
+                        self._db.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                        self._db.commit()
+                        expired = True
+        with self._lock:
+            if value is not None:
+                self._disk_hits += 1
+                self._put_memory(key, value, now)
+            else:
+                self._misses += 1
+                self._expirations += int(expired)
+        return value
+
+    def _set_disk(self, key: str, value: str, now: float):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO llm_cache (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, value, now, now + self.disk_ttl)
+                )
+                self._db.commit()
+
+    def _set_memory(self, key: str, value: str, now: float):
+        with self._lock:
+            self._put_memory(key, value, now)
+            self._stores += 1
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion or None (blocks on the disk tier)"""
+        value = self.get_memory(key)
+        return value if value is not None else self._get_disk(key)
+
+    def set(self, key: str, value: str):
+        """Store a completion in both tiers (blocks on the disk tier)"""
+        now = time.time()
+        self._set_memory(key, value, now)
+        if self._db is not None:
+            self._set_disk(key, value, now)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """``get`` for coroutines: a memory miss goes to SQLite on the loop's executor"""
+        value = self.get_memory(key)
+        if value is not None:
+            return value
+        if self._db is None:
+            return self._get_disk(key)   # only counts the miss
+        return await asyncio.get_running_loop().run_in_executor(None, self._get_disk, key)
+
+    async def aset(self, key: str, value: str):
+        """``set`` for coroutines: the SQLite write and commit run on the loop's executor"""
+        now = time.time()
+        self._set_memory(key, value, now)
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._set_disk, key, value, now)
+
+    def _put_memory(self, key: str, value: str, now: float):
+        self._memory[key] = (value, now + self.ttl)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._evictions += 1
+
+    def purge_expired(self) -> int:
+        """Drop expired entries from both tiers, returns number removed"""
+        now = time.time()
+        removed = 0
+        with self._lock:
+            for key in [k for k, (_, exp) in self._memory.items() if exp <= now]:
+                del self._memory[key]
+                removed += 1
+        with self._db_lock:
+            if self._db is not None:
+                cursor = self._db.execute('DELETE FROM llm_cache WHERE expires_at <= ?', (now,))
+                self._db.commit()
+                removed += cursor.rowcount
+        with self._lock:
+            self._expirations += removed
+        return removed
+
+    def clear(self):
+        """Remove every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.execute('DELETE FROM llm_cache')
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        disk_entries = None
+        with self._db_lock:
+            if self._db is not None:
+                disk_entries = self._db.execute('SELECT COUNT(*) FROM llm_cache').fetchone()[0]
+        with self._lock:
+            lookups = self._memory_hits + self._disk_hits + self._misses
+            return {
+                'memory_entries': len(self._memory),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_enabled': self._db is not None,
+                'disk_entries': disk_entries,
+                'disk_ttl': self.disk_ttl if self._db is not None else None,
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round((self._memory_hits + self._disk_hits) / lookups, 4) if lookups else 0.0,
+                'stores': self._stores,
+                'evictions': self._evictions,
+                'expirations': self._expirations
+            }
+
+    def close(self):
+        """Close the disk tier"""
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
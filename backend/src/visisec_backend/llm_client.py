@@ -0,0 +1,228 @@
+"""
+VisiSec LLM HTTP Client Pool
+进程级共享的 LLM HTTP 连接池（keep-alive / HTTP/2 / 按主机限流）
+"""
+
+from contextlib import asynccontextmanager
+from typing import Dict, Any, AsyncIterator, Awaitable, Callable, Optional, Tuple
+from urllib.parse import urlsplit
+import atexit
+import importlib.util
+import logging
+
+import httpx
+
+from .event_loop import BackgroundLoop
+
+logger = logging.getLogger(__name__)
+
+
+class LLMClientPool:
+    """
+    Long-lived httpx client pool shared by every call_llm invocation.
+
+    The clients are bound to the shared background loop; callers awaiting
+    from any other loop are forwarded to it, so they still reuse the same
+    warm connections. One client is kept per origin, which makes the
+    connection limits effectively per-host.
+    """
+
+    def __init__(
+        self,
+        background: BackgroundLoop,
+        max_connections_per_host: int = 20,
+        max_keepalive_per_host: int = 10,
+        keepalive_expiry: float = 60.0,
+        timeout: float = 60.0,
+        http2: bool = True,
+    ):
+        if http2 and importlib.util.find_spec('h2') is None:
+            logger.warning("⚠️  HTTP/2 requested but 'h2' is not installed, falling back to HTTP/1.1")
+            http2 = False
+
+        self.max_connections_per_host = max_connections_per_host
+        self.max_keepalive_per_host = max_keepalive_per_host
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.http2 = http2
+
+        self._background = background
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self._traces: Dict[str, Callable[[str, Dict[str, Any]], Awaitable[None]]] = {}
+        self._closed = False
+
+        # Per-origin statistics, mutated only on the background loop thread
+        self._host_stats: Dict[str, Dict[str, int]] = {}
+
+    def _get_client(self, url: str) -> Tuple[httpx.AsyncClient, str]:
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        client = self._clients.get(origin)
+        if client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections_per_host,
+                max_keepalive_connections=self.max_keepalive_per_host,
+                keepalive_expiry=self.keepalive_expiry
+            )
+            client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=limits,
+                http2=self.http2
+            )
+            self._clients[origin] = client
+            self._host_stats[origin] = {
+                'requests': 0, 'in_flight': 0, 'connections_opened': 0, 'tls_handshakes': 0
+            }
+            self._traces[origin] = self._make_trace(self._host_stats[origin])
+            logger.debug(f"Created pooled client for {origin}")
+        return client, origin
+
+    @staticmethod
+    def _make_trace(counters: Dict[str, int]) -> Callable[[str, Dict[str, Any]], Awaitable[None]]:
+        """httpcore trace hook: counts fresh TCP connections and TLS handshakes of one origin"""
+        async def trace(event_name: str, info: Dict[str, Any]):
+            if event_name == 'connection.connect_tcp.complete':
+                counters['connections_opened'] += 1
+            elif event_name == 'connection.start_tls.complete':
+                counters['tls_handshakes'] += 1
+        return trace
+
+    @asynccontextmanager
+    async def _request(self, url: str, kwargs: Dict[str, Any]) -> AsyncIterator[httpx.AsyncClient]:
+        """Pick the origin's client, attach its trace hook and count the request"""
+        client, origin = self._get_client(url)
+        extensions = kwargs.pop('extensions', None) or {}
+        extensions['trace'] = self._traces[origin]
+        kwargs['extensions'] = extensions
+        counters = self._host_stats[origin]
+        counters['requests'] += 1
+        counters['in_flight'] += 1
+        try:
+            yield client
+        finally:
+            counters['in_flight'] -= 1
+
+    async def _post_on_loop(self, url: str, **kwargs) -> httpx.Response:
+        async with self._request(url, kwargs) as client:
+            return await client.post(url, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        """
+        POST through the shared pool. Safe to await from any event loop.
+        The response body is fully read before it is returned.
+        """
+        if self._closed:
+            raise RuntimeError("LLM client pool is closed")
+        return await self._background.run_async(self._post_on_loop(url, **kwargs))
+
+    @asynccontextmanager
+    async def stream(self, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """
+        Streaming POST through the shared pool (``stream: true`` completions).
+        Must be used from the background loop, where the clients live.
+        """
+        if self._closed:
+            raise RuntimeError("LLM client pool is closed")
+        if not self._background.in_loop():
+            raise RuntimeError("LLMClientPool.stream() must run on the background loop")
+
+        async with self._request(url, kwargs) as client:
+            async with client.stream('POST', url, **kwargs) as response:
+                yield response
+
+    @staticmethod
+    def _pool_connections(client: httpx.AsyncClient) -> Optional[Dict[str, int]]:
+        """
+        Open / idle connections of a client, read from httpx and httpcore
+        internals. Best effort: None when those internals are not available.
+        """
+        pool = getattr(getattr(client, '_transport', None), '_pool', None)
+        connections = getattr(pool, 'connections', None)
+        if connections is None:
+            return None
+        try:
+            connections = list(connections)
+            idle = sum(1 for c in connections if c.is_idle())
+        except Exception:
+            return None
+        return {'connections': len(connections), 'in_use': len(connections) - idle, 'idle': idle}
+
+    def stats(self) -> Dict[str, Any]:
+        """Connection pool statistics for sizing (counters come from the trace hook)"""
+        hosts = {}
+        totals = {'requests': 0, 'in_flight': 0, 'connections_opened': 0, 'tls_handshakes': 0}
+        in_use, idle = 0, 0
+        pool_visible = True
+        for origin, client in list(self._clients.items()):
+            counters = dict(self._host_stats[origin])
+            for key in totals:
+                totals[key] += counters[key]
+            connections = self._pool_connections(client)
+            if connections is None:
+                pool_visible = False
+            else:
+                in_use += connections['in_use']
+                idle += connections['idle']
+            hosts[origin] = {**counters, **(connections or {})}
+
+        return {
+            'http2': self.http2,
+            'max_connections_per_host': self.max_connections_per_host,
+            'max_keepalive_per_host': self.max_keepalive_per_host,
+            'keepalive_expiry': self.keepalive_expiry,
+            'requests_total': totals['requests'],
+            'requests_in_flight': totals['in_flight'],
+            'connections_in_use': in_use if pool_visible else None,
+            'connections_idle': idle if pool_visible else None,
+            'connections_opened': totals['connections_opened'],
+            'tls_handshakes': totals['tls_handshakes'],
+            'handshakes_saved': max(0, totals['requests'] - totals['connections_opened']),
+            'hosts': hosts
+        }
+
+    def close(self, timeout: float = 5.0):
+        """Close all pooled connections"""
+        if self._closed:
+            return
+        self._closed = True
+        if not self._clients:
+            return
+
+        async def _aclose_all():
+            for client in list(self._clients.values()):
+                await client.aclose()
+            self._clients.clear()
+
+        try:
+            self._background.run(_aclose_all(), timeout)
+            logger.info("🔗 LLM client pool closed")
+        except Exception as e:
+            logger.warning(f"⚠️  Error while closing LLM clients: {str(e)}")
+
+
+def create_llm_client_pool(
+    background: BackgroundLoop,
+    max_connections_per_host: int,
+    max_keepalive_per_host: int,
+    keepalive_expiry: float,
+    timeout: float,
+    http2: bool,
+) -> LLMClientPool:
+    """
+    Create the process-wide pool and register its shutdown hook.
+    Create it after the background loop so atexit closes it first.
+    """
+    pool = LLMClientPool(
+        background,
+        max_connections_per_host=max_connections_per_host,
+        max_keepalive_per_host=max_keepalive_per_host,
+        keepalive_expiry=keepalive_expiry,
+        timeout=timeout,
+        http2=http2
+    )
+    atexit.register(pool.close)
+    return pool
@@ -0,0 +1,334 @@
+"""
+VisiSec LLM Provider Gateway
+LLM 上游调用网关：全局/按用户并发限制、相同请求合并、抖动退避重试、熔断器
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+import asyncio
+import contextvars
+import logging
+import random
+import time
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Identity used for per-user concurrency limits; set by the calling route
+current_llm_user: contextvars.ContextVar[str] = contextvars.ContextVar('current_llm_user', default='anonymous')
+
+
+class UpstreamError(Exception):
+    """Non-200 response from the LLM provider"""
+
+    def __init__(self, status_code: int, body: str, retry_after: Optional[float] = None):
+        super().__init__(f"LLM API returned {status_code}: {body}")
+        self.status_code = status_code
+        self.body = body
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class GatewayBusyError(Exception):
+    """Raised when the wait queue for a concurrency slot is full"""
+
+
+class _LeaderCancelled(Exception):
+    """Handed to coalesced waiters when the call they joined was cancelled"""
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, UpstreamError):
+        return error.status_code == 429 or error.status_code >= 500
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+class CircuitBreaker:
+    """Closed → open after N consecutive failures → half-open probe after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.probe_in_flight = False
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self) -> bool:
+        if self.state == self.OPEN:
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            else:
+                self.rejected += 1
+                return False
+        if self.state == self.HALF_OPEN:
+            if self.probe_in_flight:
+                self.rejected += 1
+                return False
+            self.probe_in_flight = True
+        return True
+
+    def release_probe(self):
+        """End a half-open probe without a verdict (cancelled, or a client-side error)"""
+        self.probe_in_flight = False
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("✅ LLM circuit breaker closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.trips += 1
+                logger.warning(
+                    f"⚠️  LLM circuit breaker opened after {self.consecutive_failures} failures "
+                    f"(cool-down {self.reset_timeout}s)"
+                )
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = max(0.0, round(self.reset_timeout - (time.monotonic() - self.opened_at), 2))
+        return {
+            'state': self.state,
+            'consecutive_failures': self.consecutive_failures,
+            'failure_threshold': self.failure_threshold,
+            'reset_timeout': self.reset_timeout,
+            'retry_in': retry_in,
+            'rejected': self.rejected,
+            'trips': self.trips
+        }
+
+
+class _Slot:
+    """Semaphore plus wait-queue accounting"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.semaphore = asyncio.Semaphore(limit)
+        self.waiting = 0
+        self.active = 0
+
+
+class LLMGateway:
+    """
+    Guards every upstream LLM call. Must be used from the background loop,
+    where its asyncio primitives live.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        per_user_concurrency: int = 2,
+        max_queue: int = 100,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_user_concurrency = max(1, per_user_concurrency)
+        self.max_queue = max_queue
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        self._global: Optional[_Slot] = None
+        self._users: Dict[str, _Slot] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.requests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failures = 0
+
+    # ------------------------------------------------------------------
+    # Concurrency slots
+    # ------------------------------------------------------------------
+
+    def _global_slot(self) -> _Slot:
+        if self._global is None:
+            self._global = _Slot(self.max_concurrency)
+        return self._global
+
+    @asynccontextmanager
+    async def _acquire(self, slot: _Slot):
+        if self.max_queue and slot.waiting >= self.max_queue and slot.semaphore.locked():
+            raise GatewayBusyError("LLM gateway queue is full")
+        slot.waiting += 1
+        try:
+            await slot.semaphore.acquire()
+        finally:
+            slot.waiting -= 1
+        slot.active += 1
+        try:
+            yield
+        finally:
+            slot.active -= 1
+            slot.semaphore.release()
+
+    @asynccontextmanager
+    async def slot(self, user: Optional[str] = None) -> AsyncIterator[None]:
+        """Hold a per-user and a global concurrency slot"""
+        user = user or current_llm_user.get()
+        user_slot = self._users.get(user)
+        if user_slot is None:
+            user_slot = self._users[user] = _Slot(self.per_user_concurrency)
+        try:
+            async with self._acquire(user_slot):
+                async with self._acquire(self._global_slot()):
+                    yield
+        finally:
+            if user_slot.active == 0 and user_slot.waiting == 0:
+                self._users.pop(user, None)
+
+    # ------------------------------------------------------------------
+    # Calls
+    # ------------------------------------------------------------------
+
+    def _backoff(self, attempt: int, error: BaseException) -> float:
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return min(self.backoff_max, retry_after)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _call_with_retries(self, send: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                raise CircuitOpenError("LLM provider circuit breaker is open")
+            try:
+                async with self.slot():
+                    result = await send()
+            except GatewayBusyError:
+                self.breaker.release_probe()
+                raise
+            except Exception as e:
+                if not _is_retryable(e):
+                    # Client-side errors (4xx other than 429) say nothing about provider health
+                    self.breaker.release_probe()
+                    raise
+                self.failures += 1
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                self.retries += 1
+                logger.warning(f"⚠️  LLM call failed ({str(e)[:120]}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (e.g. the SSE client went away): no verdict, but a
+                # half-open probe must not stay in flight forever
+                self.breaker.release_probe()
+                raise
+            self.breaker.record_success()
+            return result
+
+    async def call(self, key: Optional[str], send: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run ``send`` through breaker, concurrency limits and retries.
+        Concurrent calls with the same ``key`` share one upstream call.
+        """
+        self.requests += 1
+        if key is None:
+            return await self._call_with_retries(send)
+
+        existing = self._inflight.get(key)
+        if existing is not None:
+            self.coalesced += 1
+            logger.info(f"🔗 Coalesced identical in-flight LLM request: {key[:12]}")
+        while existing is not None:
+            try:
+                return await asyncio.shield(existing)
+            except _LeaderCancelled:
+                # Only the caller that started it went away; make the call ourselves
+                existing = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._call_with_retries(send)
+        except BaseException as e:
+            if not future.done():
+                future.set_exception(_LeaderCancelled() if isinstance(e, asyncio.CancelledError) else e)
+                # Avoid "exception was never retrieved" when nobody else waited
+                future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self._inflight.pop(key, None)
+
+    @asynccontextmanager
+    async def stream_slot(self) -> AsyncIterator[None]:
+        """
+        Breaker and concurrency guard for streaming calls. Streams are not
+        retried or coalesced, since tokens may already have been forwarded.
+        """
+        if not self.breaker.allow():
+            raise CircuitOpenError("LLM provider circuit breaker is open")
+        self.requests += 1
+        try:
+            async with self.slot():
+                yield
+        except GatewayBusyError:
+            self.breaker.release_probe()
+            raise
+        except Exception as e:
+            if _is_retryable(e):
+                self.failures += 1
+                self.breaker.record_failure()
+            else:
+                self.breaker.release_probe()
+            raise
+        except BaseException:
+            # CancelledError / GeneratorExit when the consumer stops reading
+            self.breaker.release_probe()
+            raise
+        else:
+            self.breaker.record_success()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Gateway state for the status endpoint"""
+        global_slot = self._global
+        return {
+            'circuit': self.breaker.snapshot(),
+            'max_concurrency': self.max_concurrency,
+            'per_user_concurrency': self.per_user_concurrency,
+            'max_queue': self.max_queue,
+            'active': global_slot.active if global_slot else 0,
+            'queued': global_slot.waiting if global_slot else 0,
+            'users': {
+                user: {'active': s.active, 'queued': s.waiting}
+                for user, s in list(self._users.items())
+            },
+            'inflight_keys': len(self._inflight),
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'retries': self.retries,
+            'failures': self.failures
+        }
@@ -0,0 +1,192 @@
+"""
+VisiSec Logging Pipeline
+非阻塞日志管道（QueueHandler/QueueListener）、JSON 结构化记录、按事件类型采样与限速、惰性序列化
+"""
+
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, List, Optional
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+# Attributes every LogRecord has; anything else was passed through ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class LazyJson:
+    """
+    Defers ``json.dumps`` until a handler actually formats the record, so
+    ``logger.debug("Payload: %s", LazyJson(payload))`` costs nothing when
+    DEBUG is off or the record is sampled away.
+    """
+
+    __slots__ = ('obj', 'indent')
+
+    def __init__(self, obj: Any, indent: Optional[int] = None):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self) -> str:
+        try:
+            return json.dumps(self.obj, ensure_ascii=False, indent=self.indent, default=str)
+        except (TypeError, ValueError):
+            return repr(self.obj)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message plus ``extra`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+            'thread': record.threadName
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def parse_event_limits(spec: str, cast=float) -> Dict[str, float]:
+    """``"sensor_data=0.01,keyframe=0.5"`` → ``{'sensor_data': 0.01, 'keyframe': 0.5}``"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            name, value = item.split('=', 1)
+            limits[name.strip()] = cast(value)
+    return limits
+
+
+class EventSamplingFilter(logging.Filter):
+    """
+    Per-event-type sampling and rate limiting for hot-path records.
+
+    Records tagged with ``extra={'event': name}`` keep one in ``1/rate``
+    (deterministic, so a steady stream is thinned evenly) and then pass a
+    token bucket of ``rate_limits[name]`` records per second. Untagged
+    records and anything at WARNING or above always pass. Kept records get
+    ``sample_rate`` so counts can be re-weighted downstream.
+    """
+
+    def __init__(self, sample_rates: Optional[Dict[str, float]] = None, rate_limits: Optional[Dict[str, float]] = None):
+        super().__init__()
+        self.sample_rates = dict(sample_rates or {})
+        self.rate_limits = dict(rate_limits or {})
+        self._lock = threading.Lock()
+        self._seen: Dict[str, int] = {}
+        self._buckets: Dict[str, List[float]] = {}   # event -> [tokens, last refill]
+        self.dropped: Dict[str, int] = {}
+
+    def _drop(self, event: str) -> bool:
+        self.dropped[event] = self.dropped.get(event, 0) + 1
+        return False
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, 'event', None)
+        if event is None or record.levelno >= logging.WARNING:
+            return True
+
+        with self._lock:
+            rate = self.sample_rates.get(event)
+            if rate is not None and rate < 1.0:
+                seen = self._seen.get(event, 0)
+                self._seen[event] = seen + 1
+                if rate <= 0 or seen % max(1, round(1.0 / rate)):
+                    return self._drop(event)
+                record.sample_rate = rate
+
+            limit = self.rate_limits.get(event)
+            if limit is not None:
+                now = time.monotonic()
+                bucket = self._buckets.get(event)
+                if bucket is None:
+                    bucket = self._buckets[event] = [limit, now]
+                bucket[0] = min(limit, bucket[0] + (now - bucket[1]) * limit)
+                bucket[1] = now
+                if bucket[0] < 1.0:
+                    return self._drop(event)
+                bucket[0] -= 1.0
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'sample_rates': self.sample_rates,
+                'rate_limits': self.rate_limits,
+                'dropped': dict(self.dropped)
+            }
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue the record as-is. The stock ``prepare()`` formats the message in
+    the calling thread, which would run LazyJson and %-formatting on the hot
+    path; here all formatting happens on the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LoggingPipeline:
+    """Root QueueHandler → in-process queue → QueueListener thread → real handlers"""
+
+    def __init__(self, handlers: List[logging.Handler], sampling: EventSamplingFilter):
+        self.queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+        self.sampling = sampling
+        self.handler = _DeferredQueueHandler(self.queue)
+        self.handler.addFilter(sampling)
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+
+    def start(self):
+        self.listener.start()
+
+    def stop(self):
+        # Drains what is already queued before the listener thread exits
+        self.listener.stop()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'queued': self.queue.qsize(), **self.sampling.stats()}
+
+
+def setup_logging(
+    level: str = 'INFO',
+    log_file: Optional[str] = None,
+    json_format: bool = True,
+    sample_rates: Optional[Dict[str, float]] = None,
+    rate_limits: Optional[Dict[str, float]] = None,
+) -> LoggingPipeline:
+    """
+    Route all logging through a background listener thread. Handlers and
+    formatters only ever run on that thread; request threads pay for the
+    level check, the sampling filter and a queue put.
+    """
+    formatter = JsonFormatter() if json_format else logging.Formatter(
+        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    handlers: List[logging.Handler] = [logging.StreamHandler()]
+    if log_file:
+        log_file = os.path.abspath(log_file)
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    pipeline = LoggingPipeline(handlers, EventSamplingFilter(sample_rates, rate_limits))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(pipeline.handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO))
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    return pipeline
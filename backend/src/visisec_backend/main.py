@@ -3,33 +3,73 @@ VisiSec Backend - Multimodal Meeting Analysis API
 使用 Flask + Silicon Flow DeepSeek LLM
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_socketio import SocketIO, emit, join_room, leave_room
-from typing import Dict, Any, List
+from concurrent.futures import Future
+from typing import Dict, Any, AsyncIterator, List, Optional
+import atexit
 import logging
 import os
 import httpx
 import json
-import asyncio
+import queue
+import threading
+import base64
+import binascii
+from contextlib import contextmanager
 from functools import wraps
 from dotenv import load_dotenv
 from datetime import datetime, timedelta
+import time
 import uuid
 import jwt
-import bcrypt as bcrypt_lib
+
+from .event_loop import create_background_loop
+from .llm_client import create_llm_client_pool
+from .llm_cache import LLMResponseCache, make_cache_key
+from .summarizer import MapReduceSummarizer
+from .live_summary import LiveSummarizer
+from .sensor_buffers import SessionBuffers, BatchFormatError, IMU_BATCH_FORMAT, ARCHIVE_STREAMS
+from .sensor_archive import SensorArchiveWriter, archive_path, open_archive
+from .keyframe_store import KeyframeStore, KeyframeImageError, image_mimetype
+from .timeline import TimelineBuilder, open_timeline
+from .native_threads import native_executor
+from .attention import score_attention, imu_columns, app_state_columns, gaze_columns
+from .media_jobs import create_media_job_executor, JOB_COMPLETED, JOB_QUEUED, JOB_RUNNING
+from .job_queue import create_job_queue, parse_priority, PRIORITIES
+from .uploads import ChunkedUploadManager, UploadError, stream_to_file
+from .storage import create_storage
+from .session_state import create_session_store, SessionBusyError
+from .flow_control import FlowController, NORMAL
+from .password_hasher import create_password_hasher, HasherBusyError
+from .token_cache import TokenCache
+from .log_pipeline import setup_logging, parse_event_limits, LazyJson
+from .metrics import REGISTRY as METRICS, CONTENT_TYPE as METRICS_CONTENT_TYPE, UPSTREAM_BUCKETS, register_process_metrics
+from .socket_queue import message_queue_options
+from .llm_gateway import (
+    LLMGateway, UpstreamError, CircuitOpenError, GatewayBusyError, current_llm_user
+)
 
 # Load environment variables
 load_dotenv()
 
-# Configure comprehensive logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('visisec_backend.log')
-    ]
+# Logging pipeline: handlers run on a background listener thread, hot-path events are sampled
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json').lower()  # "json" or "text"
+LOG_FILE = os.getenv('LOG_FILE', '')  # empty = stderr only; use an absolute path
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', 'sensor_data=0.01,transcript_segment=0.1')
+LOG_RATE_LIMITS = os.getenv('LOG_RATE_LIMITS', 'sensor_data=5,keyframe=10,transcript_segment=10')
+SOCKETIO_LOGGER = os.getenv('SOCKETIO_LOGGER', 'False').lower() == 'true'
+ENGINEIO_LOGGER = os.getenv('ENGINEIO_LOGGER', 'False').lower() == 'true'
+
+log_pipeline = setup_logging(
+    level=LOG_LEVEL,
+    log_file=LOG_FILE or None,
+    json_format=LOG_FORMAT == 'json',
+    sample_rates=parse_event_limits(LOG_SAMPLE_RATES),
+    rate_limits=parse_event_limits(LOG_RATE_LIMITS)
 )
 logger = logging.getLogger(__name__)
 
@@ -45,9 +85,92 @@ SILICON_FLOW_API_URL = os.getenv('SILICON_FLOW_API_URL', 'https://api.siliconflo
 FLASK_HOST = os.getenv('FLASK_HOST', '0.0.0.0')
 FLASK_PORT = int(os.getenv('FLASK_PORT', '5124'))
 FLASK_DEBUG = os.getenv('FLASK_DEBUG', 'False').lower() == 'true'
+# Server mode (set by visisec-server): Socket.IO async driver, cross-process message queue, worker id
+SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')   # "", "local" or redis:// / kafka:// / amqp:// URL
+SOCKETIO_CHANNEL = os.getenv('SOCKETIO_CHANNEL', 'visisec-socketio')
+SERVER_WORKER_ID = os.getenv('SERVER_WORKER_ID', '0')
 JWT_SECRET = os.getenv('JWT_SECRET', 'visisec-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRATION_HOURS = 24
+# Password hashing pool (bcrypt)
+PASSWORD_HASH_ROUNDS = int(os.getenv('PASSWORD_HASH_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '32'))
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+# Verified-token cache
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', '1024'))
+TOKEN_CACHE_MAX_AGE = float(os.getenv('TOKEN_CACHE_MAX_AGE', '60'))  # bounds cross-process revocation delay
+
+# LLM connection pool configuration
+LLM_TIMEOUT = float(os.getenv('LLM_TIMEOUT', '60'))
+LLM_HTTP2 = os.getenv('LLM_HTTP2', 'True').lower() == 'true'
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv('LLM_POOL_MAX_CONNECTIONS', '20'))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv('LLM_POOL_MAX_KEEPALIVE', '10'))
+LLM_POOL_KEEPALIVE_EXPIRY = float(os.getenv('LLM_POOL_KEEPALIVE_EXPIRY', '60'))
+LLM_MAX_TOKENS = int(os.getenv('LLM_MAX_TOKENS', '2000'))
+
+# LLM response cache configuration
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE_ENABLED', 'True').lower() == 'true'
+LLM_CACHE_MAX_ENTRIES = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '256'))
+LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '3600'))
+LLM_CACHE_DB_PATH = os.getenv('LLM_CACHE_DB_PATH', '')
+LLM_CACHE_DISK_TTL = float(os.getenv('LLM_CACHE_DISK_TTL', str(7 * 24 * 3600)))
+
+# Map-reduce summarization configuration
+SUMMARY_MAX_CONCURRENCY = int(os.getenv('SUMMARY_MAX_CONCURRENCY', '4'))
+SUMMARY_SINGLE_PASS_CHARS = int(os.getenv('SUMMARY_SINGLE_PASS_CHARS', '8000'))
+SUMMARY_CHUNK_SECONDS = float(os.getenv('SUMMARY_CHUNK_SECONDS', '600'))
+SUMMARY_CHUNK_CHARS = int(os.getenv('SUMMARY_CHUNK_CHARS', '6000'))
+SUMMARY_CHUNK_TURNS = int(os.getenv('SUMMARY_CHUNK_TURNS', '50'))
+# LLM provider gateway configuration
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+LLM_PER_USER_CONCURRENCY = int(os.getenv('LLM_PER_USER_CONCURRENCY', '4'))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '100'))
+LLM_MAX_RETRIES = int(os.getenv('LLM_MAX_RETRIES', '3'))
+LLM_BACKOFF_BASE = float(os.getenv('LLM_BACKOFF_BASE', '0.5'))
+LLM_BACKOFF_MAX = float(os.getenv('LLM_BACKOFF_MAX', '8'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_RESET = float(os.getenv('LLM_BREAKER_RESET', '30'))
+
+LIVE_SUMMARY_INTERVAL = float(os.getenv('LIVE_SUMMARY_INTERVAL', '300'))
+LIVE_SUMMARY_SEGMENT_THRESHOLD = int(os.getenv('LIVE_SUMMARY_SEGMENT_THRESHOLD', '40'))
+# Uploaded media and keyframe extraction
+UPLOAD_DIR = os.getenv('UPLOAD_DIR', 'uploads')
+KEYFRAME_STRIDE_SECONDS = float(os.getenv('KEYFRAME_STRIDE_SECONDS', '0.5'))
+KEYFRAME_DOWNSCALE_WIDTH = int(os.getenv('KEYFRAME_DOWNSCALE_WIDTH', '160'))
+KEYFRAME_DIFF_THRESHOLD = float(os.getenv('KEYFRAME_DIFF_THRESHOLD', '0.08'))
+KEYFRAME_HIST_THRESHOLD = float(os.getenv('KEYFRAME_HIST_THRESHOLD', '0.25'))
+KEYFRAME_MIN_INTERVAL = float(os.getenv('KEYFRAME_MIN_INTERVAL', '1.0'))
+KEYFRAME_SAVE_IMAGES = os.getenv('KEYFRAME_SAVE_IMAGES', 'True').lower() == 'true'
+KEYFRAME_WAIT_TIMEOUT = float(os.getenv('KEYFRAME_WAIT_TIMEOUT', '600'))
+# Live keyframe images (perceptual-hash dedup + content-addressed blobs)
+KEYFRAME_STORE_DIR = os.getenv('KEYFRAME_STORE_DIR', os.path.join('data', 'keyframes'))
+KEYFRAME_HASH_THRESHOLD = int(os.getenv('KEYFRAME_HASH_THRESHOLD', '4'))     # max differing aHash/dHash bits of a repeat
+KEYFRAME_THUMBNAIL_WIDTH = int(os.getenv('KEYFRAME_THUMBNAIL_WIDTH', '320'))
+KEYFRAME_MAX_IMAGE_BYTES = int(os.getenv('KEYFRAME_MAX_IMAGE_BYTES', str(4 * 1024 * 1024)))
+# Media worker processes (0 = one per CPU core)
+MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', '0'))
+MEDIA_SEGMENT_SECONDS = float(os.getenv('MEDIA_SEGMENT_SECONDS', '300'))
+THUMBNAIL_INTERVAL_SECONDS = float(os.getenv('THUMBNAIL_INTERVAL_SECONDS', '10'))
+THUMBNAIL_WIDTH = int(os.getenv('THUMBNAIL_WIDTH', '320'))
+# Durable media job queue
+MEDIA_QUEUE_DB = os.getenv('MEDIA_QUEUE_DB', os.path.join(UPLOAD_DIR, 'media_jobs.sqlite3'))
+MEDIA_QUEUE_CONCURRENCY = int(os.getenv('MEDIA_QUEUE_CONCURRENCY', '2'))
+MEDIA_QUEUE_LEASE_SECONDS = float(os.getenv('MEDIA_QUEUE_LEASE_SECONDS', '60'))
+MEDIA_QUEUE_MAX_ATTEMPTS = int(os.getenv('MEDIA_QUEUE_MAX_ATTEMPTS', '3'))
+# Persistent storage for users, meetings, sessions and sensor rows ("sqlite" or "memory")
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite').lower()
+STORAGE_DB_PATH = os.getenv('STORAGE_DB_PATH', os.path.join('data', 'visisec.sqlite3'))
+STORAGE_SENSOR_BATCH_SIZE = int(os.getenv('STORAGE_SENSOR_BATCH_SIZE', '500'))
+STORAGE_FLUSH_INTERVAL = float(os.getenv('STORAGE_FLUSH_INTERVAL', '2'))
+# Live session state shared across workers ("storage" = the storage backend above, or "memory")
+SESSION_STATE_BACKEND = os.getenv('SESSION_STATE_BACKEND', 'storage').lower()
+SESSION_STATE_FLUSH_INTERVAL = float(os.getenv('SESSION_STATE_FLUSH_INTERVAL', '1'))  # write-behind period
+SESSION_LEASE_SECONDS = float(os.getenv('SESSION_LEASE_SECONDS', '15'))      # owner must renew within this
+SESSION_REAPER_INTERVAL = float(os.getenv('SESSION_REAPER_INTERVAL', '2'))   # lease renewal / sweep period
+SESSION_RESUME_GRACE = float(os.getenv('SESSION_RESUME_GRACE', '300'))       # seconds a dropped session waits for a resume
+SESSION_HANDOFF_TIMEOUT = float(os.getenv('SESSION_HANDOFF_TIMEOUT', '5'))   # wait for the owning worker to let go
 
 # Log critical configuration
 logger.info(f"Silicon Flow API URL: {SILICON_FLOW_API_URL}")
@@ -77,37 +200,305 @@ CORS(app, origins=allowed_origins)
 socketio = SocketIO(
     app,
     cors_allowed_origins="*",  # Allow all origins as requested
-    async_mode='threading',
-    logger=True,
-    engineio_logger=True
+    async_mode=SOCKETIO_ASYNC_MODE,
+    logger=SOCKETIO_LOGGER,
+    engineio_logger=ENGINEIO_LOGGER,
+    # Room for one binary keyframe image (base64 payloads are ~4/3 of that)
+    max_http_buffer_size=KEYFRAME_MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024,
+    **message_queue_options(SOCKETIO_MESSAGE_QUEUE, SOCKETIO_CHANNEL)
+)
+
+# Long-running event loop shared by async routes and Socket.IO handlers
+background_loop = create_background_loop()
+
+# Process-wide LLM HTTP connection pool (shared across requests)
+llm_pool = create_llm_client_pool(
+    background_loop,
+    max_connections_per_host=LLM_POOL_MAX_CONNECTIONS,
+    max_keepalive_per_host=LLM_POOL_MAX_KEEPALIVE,
+    keepalive_expiry=LLM_POOL_KEEPALIVE_EXPIRY,
+    timeout=LLM_TIMEOUT,
+    http2=LLM_HTTP2
+)
+
+# Provider gateway: concurrency limits, request coalescing, retries, circuit breaker
+llm_gateway = LLMGateway(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    per_user_concurrency=LLM_PER_USER_CONCURRENCY,
+    max_queue=LLM_MAX_QUEUE,
+    max_retries=LLM_MAX_RETRIES,
+    backoff_base=LLM_BACKOFF_BASE,
+    backoff_max=LLM_BACKOFF_MAX,
+    failure_threshold=LLM_BREAKER_FAILURES,
+    reset_timeout=LLM_BREAKER_RESET
 )
 
-# Store for meeting data (in production, use a database)
-meetings_db = {}
-active_sessions = {}  # Track active WebSocket sessions
+# Content-addressed LLM response cache (memory LRU + optional SQLite tier)
+llm_cache = LLMResponseCache(
+    max_entries=LLM_CACHE_MAX_ENTRIES,
+    ttl=LLM_CACHE_TTL,
+    db_path=LLM_CACHE_DB_PATH,
+    disk_ttl=LLM_CACHE_DISK_TTL
+) if LLM_CACHE_ENABLED else None
 
-# User database (in production, use a real database)
-# TODO: Replace with persistent database (e.g., PostgreSQL, MongoDB) for production
-# In-memory storage will lose all data on restart and doesn't support multi-instance deployments
-users_db = {}
+# Server-side scene-change detector settings for uploaded recordings
+KEYFRAME_EXTRACTOR_PARAMS = {
+    'stride_seconds': KEYFRAME_STRIDE_SECONDS,
+    'downscale_width': KEYFRAME_DOWNSCALE_WIDTH,
+    'diff_threshold': KEYFRAME_DIFF_THRESHOLD,
+    'hist_threshold': KEYFRAME_HIST_THRESHOLD,
+    'min_interval_seconds': KEYFRAME_MIN_INTERVAL
+}
+
+# Process pool for CPU-heavy media work (keyframes, thumbnails, audio features)
+media_jobs = create_media_job_executor(
+    max_workers=MEDIA_WORKERS or None,
+    segment_seconds=MEDIA_SEGMENT_SECONDS
+)
+
+# Users, meetings, session metadata and per-event sensor rows
+storage = create_storage(
+    STORAGE_BACKEND,
+    STORAGE_DB_PATH,
+    sensor_batch_size=STORAGE_SENSOR_BATCH_SIZE,
+    sensor_flush_interval=STORAGE_FLUSH_INTERVAL
+)
+# bcrypt runs on its own bounded pool so login bursts can't starve request threads
+password_hasher = create_password_hasher(
+    rounds=PASSWORD_HASH_ROUNDS,
+    max_workers=PASSWORD_HASH_WORKERS,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    timeout=PASSWORD_HASH_TIMEOUT
+)
+# Already-verified JWTs, so hot paths skip the decode + HMAC check
+token_cache = TokenCache(max_entries=TOKEN_CACHE_SIZE, max_age=TOKEN_CACHE_MAX_AGE)
+# Live session state (owner, counters, lease) readable by every worker; written behind
+session_store = create_session_store(
+    SESSION_STATE_BACKEND,
+    storage,
+    flush_interval=SESSION_STATE_FLUSH_INTERVAL
+)
+# Identifies this process as a session lease holder (unique across restarts)
+WORKER_TOKEN = f"{SERVER_WORKER_ID}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+socket_identities = {}  # sid -> JWT payload verified at connect
+socket_sessions = {}  # sid -> session_id the socket is feeding
+active_sessions = {}  # session_id -> sessions this worker holds the lease for (state + live buffers)
+session_adoption_locks = {}  # session_id -> [lock, holders + waiters]; one adoption at a time per session
+session_adoption_lock = threading.Lock()  # guards session_adoption_locks only
+videos_db = {}  # video_id -> uploaded video metadata
+audio_db = {}   # audio_id -> uploaded audio metadata
 
 # Configuration constants
+SENSOR_BUFFER_CAPACITY = int(os.getenv('SENSOR_BUFFER_CAPACITY', '1000'))      # sensor_data events per session
+IMU_BUFFER_CAPACITY = int(os.getenv('IMU_BUFFER_CAPACITY', '60000'))           # IMU points per session
+APP_STATE_BUFFER_CAPACITY = int(os.getenv('APP_STATE_BUFFER_CAPACITY', '1000'))
+KEYFRAME_BUFFER_CAPACITY = int(os.getenv('KEYFRAME_BUFFER_CAPACITY', '100'))
+GAZE_BUFFER_CAPACITY = int(os.getenv('GAZE_BUFFER_CAPACITY', '1000'))
+SENSOR_ARCHIVE_ENABLED = os.getenv('SENSOR_ARCHIVE_ENABLED', 'True').lower() == 'true'
+SENSOR_ARCHIVE_DIR = os.getenv('SENSOR_ARCHIVE_DIR', os.path.join('data', 'archive'))
+SENSOR_ARCHIVE_SEGMENT_ROWS = int(os.getenv('SENSOR_ARCHIVE_SEGMENT_ROWS', '65536'))   # rows per .npy segment
+SENSOR_ARCHIVE_FLUSH_SECONDS = float(os.getenv('SENSOR_ARCHIVE_FLUSH_SECONDS', '60'))  # max age of unwritten rows
+TIMELINE_BASE_SECONDS = float(os.getenv('TIMELINE_BASE_SECONDS', '0.1'))  # finest pyramid bucket
+TIMELINE_FACTOR = int(os.getenv('TIMELINE_FACTOR', '4'))                  # buckets merged per coarser level
+TIMELINE_MAX_POINTS = int(os.getenv('TIMELINE_MAX_POINTS', '1000'))       # upper bound on buckets per response
+ARCHIVE_FINALIZE_WORKERS = int(os.getenv('ARCHIVE_FINALIZE_WORKERS', '2'))  # threads closing archives / building timelines
+ATTENTION_WINDOW_SECONDS = float(os.getenv('ATTENTION_WINDOW_SECONDS', '5'))
+ATTENTION_MAX_WINDOWS = int(os.getenv('ATTENTION_MAX_WINDOWS', '100000'))  # longer spans are rejected with 400
+SENSOR_ACK_INTERVAL = float(os.getenv('SENSOR_ACK_INTERVAL', '1.0'))          # seconds between coalesced batch acks
+# Sensor ingest backpressure
+FLOW_SESSION_RATE = float(os.getenv('FLOW_SESSION_RATE', '20'))          # sensor events per second per session when idle
+FLOW_SESSION_BURST = float(os.getenv('FLOW_SESSION_BURST', '40'))
+FLOW_MAX_INFLIGHT = int(os.getenv('FLOW_MAX_INFLIGHT', '64'))            # concurrent ingest handlers counted as full load
+FLOW_LATENCY_TARGET = float(os.getenv('FLOW_LATENCY_TARGET', '0.05'))    # seconds of average handling time counted as full load
+FLOW_LAG_TARGET = float(os.getenv('FLOW_LAG_TARGET', '0.1'))             # seconds of scheduling lag counted as full load
+FLOW_LAG_INTERVAL = float(os.getenv('FLOW_LAG_INTERVAL', '0.1'))         # period of the scheduling-lag probe
+FLOW_ELEVATED_LOAD = float(os.getenv('FLOW_ELEVATED_LOAD', '0.5'))       # load at which acks and debug telemetry are shed
+FLOW_LOG_QUEUE_LIMIT = int(os.getenv('FLOW_LOG_QUEUE_LIMIT', '10000'))   # queued log records counted as full load
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True').lower() == 'true'   # Prometheus text exposition at /metrics
+METRICS_SESSION_BUFFERS = os.getenv('METRICS_SESSION_BUFFERS', 'True').lower() == 'true'  # per-session buffer gauges (one series per live session)
 MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 100 * 1024 * 1024))  # 100MB default
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 1024 * 1024))  # resumable upload chunk size
+UPLOAD_SPOOL_DIR = os.getenv('UPLOAD_SPOOL_DIR', os.path.join(UPLOAD_DIR, 'spool'))
+UPLOAD_TTL = float(os.getenv('UPLOAD_TTL', 24 * 3600))  # seconds an unfinished resumable upload is kept
 MAX_PROMPT_LENGTH = int(os.getenv('MAX_PROMPT_LENGTH', 2000))  # 2000 chars default
 
+# Per-session token buckets scaled down by server load; clients are told to slow down via `throttle`
+flow_control = FlowController(
+    session_rate=FLOW_SESSION_RATE,
+    session_burst=FLOW_SESSION_BURST,
+    max_inflight=FLOW_MAX_INFLIGHT,
+    latency_target=FLOW_LATENCY_TARGET,
+    lag_target=FLOW_LAG_TARGET,
+    elevated_load=FLOW_ELEVATED_LOAD
+)
+flow_control.watch('log_queue', log_pipeline.queue.qsize, FLOW_LOG_QUEUE_LIMIT)
+
+# Prometheus metrics; hot-path histograms are sharded per thread and recorded without locks
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    'visisec_http_request_seconds', 'HTTP handling time until the response is returned, by route.',
+    ('method', 'route', 'status'))
+SOCKET_EVENT_SECONDS = METRICS.histogram(
+    'visisec_socketio_event_seconds', 'Socket.IO event handler time, by event.', ('event',))
+LLM_REQUEST_SECONDS = METRICS.histogram(
+    'visisec_llm_request_seconds', 'Upstream LLM call time (one attempt; streams until the last chunk).',
+    ('mode', 'status'), buckets=UPSTREAM_BUCKETS)
+LLM_TOKENS = METRICS.counter('visisec_llm_tokens_total', 'Tokens reported by the LLM provider.', ('kind',))
+
+
+def session_status_counts() -> Dict[tuple, int]:
+    counts: Dict[tuple, int] = {}
+    for session in list(active_sessions.values()):
+        key = (session.get('status') or 'active',)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def session_buffer_bytes() -> Dict[tuple, int]:
+    sizes = {}
+    for session in list(active_sessions.values()):
+        for name, buffer in session['buffers'].memory_stats()['buffers'].items():
+            sizes[(session['recording_id'], name)] = buffer['bytes']
+    return sizes
+
+
+if METRICS_ENABLED:
+    register_process_metrics(METRICS)
+    METRICS.callback('visisec_active_sessions', 'Live sessions this worker holds the lease for, by status.',
+                     session_status_counts, ('status',))
+    if METRICS_SESSION_BUFFERS:
+        METRICS.callback('visisec_session_buffer_bytes', 'Bytes held by each live session buffer.',
+                         session_buffer_bytes, ('recording_id', 'buffer'))
+    METRICS.callback('visisec_flow_load', 'Sensor ingest load (1.0 = overloaded).',
+                     lambda: flow_control.stats()['load'])
+    METRICS.callback('visisec_flow_rejected_total', 'Sensor events rejected by flow control.',
+                     lambda: flow_control.rejected, kind='counter')
+    METRICS.callback('visisec_flow_shed_total', 'Sensor events handled without acks under load.',
+                     lambda: flow_control.shed, kind='counter')
+    METRICS.callback('visisec_log_queue_depth', 'Log records waiting for the listener thread.',
+                     log_pipeline.queue.qsize)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_time(response):
+        started = g.get('request_started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, (request.method, route, str(response.status_code)))
+        return response
+
+
+def socket_event(message: str):
+    """注册 Socket.IO 事件处理器，并记录处理耗时"""
+    def decorator(handler):
+        if not METRICS_ENABLED:
+            return socketio.on(message)(handler)
+        labels = (message,)
+
+        @wraps(handler)
+        def timed(*args):
+            started = time.perf_counter()
+            try:
+                return handler(*args)
+            finally:
+                SOCKET_EVENT_SECONDS.observe(time.perf_counter() - started, labels)
+        socketio.on(message)(timed)
+        return handler
+    return decorator
+
+# Reject oversized bodies while they are being read, not after (multipart overhead allowance)
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE + 1024 * 1024
+
+# Resumable chunked uploads (init / put chunk / complete)
+chunked_uploads = ChunkedUploadManager(
+    UPLOAD_SPOOL_DIR,
+    max_size=MAX_FILE_SIZE,
+    chunk_size=UPLOAD_CHUNK_SIZE,
+    ttl=UPLOAD_TTL
+)
+
+# Keyframe images sent during live sessions, stored once per distinct slide
+keyframe_store = KeyframeStore(
+    KEYFRAME_STORE_DIR,
+    hamming_threshold=KEYFRAME_HASH_THRESHOLD,
+    thumbnail_width=KEYFRAME_THUMBNAIL_WIDTH,
+    max_bytes=KEYFRAME_MAX_IMAGE_BYTES
+)
+
+# Zoom-level pyramids for the Timeline view, built from the sensor archive at session end
+timeline_builder = TimelineBuilder(
+    base_seconds=TIMELINE_BASE_SECONDS,
+    factor=TIMELINE_FACTOR,
+    attention_window_seconds=ATTENTION_WINDOW_SECONDS,
+    max_attention_windows=ATTENTION_MAX_WINDOWS
+)
+
+# Archive compaction and timeline builds take hundreds of milliseconds, so they
+# run on native threads instead of the Socket.IO handler that ended the session
+archive_finalizer = native_executor(ARCHIVE_FINALIZE_WORKERS, thread_name_prefix='archive-finalize')
+atexit.register(archive_finalizer.shutdown)
+archive_finalizing: Dict[str, Future] = {}
+archive_finalizing_lock = threading.Lock()
+
+
+def _finalize_archive(recording_id: str, writer: Optional[SensorArchiveWriter]):
+    if writer is not None:
+        writer.close()
+    archive = open_archive(SENSOR_ARCHIVE_DIR, recording_id)
+    if archive is None:
+        return
+    try:
+        timeline_builder.build(archive)
+    except Exception as e:
+        # The timeline endpoint retries on demand
+        logger.error(f"❌ Timeline build failed for {recording_id}: {str(e)}", exc_info=True)
+
+
+def finalize_archive(recording_id: str, writer: Optional[SensorArchiveWriter] = None) -> Future:
+    """
+    Close the recording's archive (when ``writer`` is given) and build its
+    timeline in the background. Without a writer an in-flight job for the
+    same recording is reused, so concurrent timeline requests build once.
+    """
+    with archive_finalizing_lock:
+        # Swept here rather than in a done callback, which gevent runs in the hub
+        for done in [rid for rid, f in archive_finalizing.items() if f.done()]:
+            del archive_finalizing[done]
+        future = archive_finalizing.get(recording_id)
+        if future is None or writer is not None:
+            future = archive_finalizer.submit(_finalize_archive, recording_id, writer)
+            archive_finalizing[recording_id] = future
+        return future
+
+
+def wait_for_archive(recording_id: str):
+    """Block until a pending close/compaction of the recording's archive is done"""
+    with archive_finalizing_lock:
+        pending = archive_finalizing.get(recording_id)
+    if pending is not None:
+        pending.result()
+
 
 def async_route(f):
-    """Decorator to handle async routes in Flask"""
+    """
+    Decorator to handle async routes in Flask (and async Socket.IO handlers).
+    Runs the coroutine on the shared background loop instead of creating a
+    new event loop per request.
+    """
     @wraps(f)
     def wrapper(*args, **kwargs):
-        return asyncio.run(f(*args, **kwargs))
+        return background_loop.run(f(*args, **kwargs))
     return wrapper
 
 
-def create_jwt_token(username: str) -> str:
+def create_jwt_token(username: str, token_version: int = 0) -> str:
     """Create JWT token for user"""
     payload = {
         'username': username,
+        'ver': token_version,
         'exp': datetime.utcnow() + timedelta(hours=JWT_EXPIRATION_HOURS),
         'iat': datetime.utcnow()
     }
@@ -115,14 +506,38 @@ def create_jwt_token(username: str) -> str:
 
 
 def verify_jwt_token(token: str) -> Dict[str, Any]:
-    """Verify JWT token and return payload"""
+    """Verify JWT token and return payload (cached until exp / revocation)"""
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        return payload
     except jwt.ExpiredSignatureError:
         raise ValueError("Token has expired")
     except jwt.InvalidTokenError:
         raise ValueError("Invalid token")
+    if is_token_revoked(payload):
+        raise ValueError("Token has been revoked")
+    token_cache.put(token, payload)
+    return payload
+
+
+def is_token_revoked(payload: Dict[str, Any]) -> bool:
+    """Denylist check: tokens issued before the user's last revocation carry an old version"""
+    user = storage.get_user(payload.get('username', ''))
+    return user is None or payload.get('ver', 0) != user.get('token_version', 0)
+
+
+def revoke_user_tokens(username: str) -> int:
+    """Invalidate every token issued to ``username`` so far; returns the new token version"""
+    version = (storage.get_user(username) or {}).get('token_version', 0) + 1
+    storage.update_user(username, token_version=version)
+    token_cache.invalidate_user(username)
+    for sid, identity in list(socket_identities.items()):
+        if identity.get('username') == username:
+            socket_identities.pop(sid, None)
+    logger.info(f"🔒 Revoked existing tokens for user: {username}")
+    return version
 
 
 def require_auth(f):
@@ -143,17 +558,73 @@ def require_auth(f):
     return wrapper
 
 
-async def call_llm(messages: List[Dict[str, str]], temperature: float = 0.7) -> str:
+def hasher_busy_response():
+    """密码哈希线程池饱和时快速返回 503"""
+    response = jsonify({"error": "Authentication service busy, please retry"})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+def parse_retry_after(response: httpx.Response) -> Optional[float]:
+    """解析 Retry-After 响应头（秒）"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def get_request_identity() -> str:
+    """当前请求的用户标识（用于按用户限流）"""
+    user = getattr(request, 'user', None)
+    if user and user.get('username'):
+        return user['username']
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        try:
+            return verify_jwt_token(auth_header.split(' ')[1])['username']
+        except (ValueError, KeyError):
+            pass
+    return request.remote_addr or 'anonymous'
+
+
+def record_llm_usage(usage: Optional[Dict[str, Any]]):
+    """累计上游返回的 token 用量"""
+    for kind in ('prompt', 'completion'):
+        tokens = (usage or {}).get(f'{kind}_tokens')
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(tokens, (kind,))
+
+
+async def call_llm(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.7,
+    max_tokens: int = LLM_MAX_TOKENS,
+    use_cache: bool = True
+) -> str:
     """
     调用 Silicon Flow DeepSeek LLM API
+    相同 (model, messages, temperature, max_tokens) 的请求直接命中缓存；
+    上游调用经过网关（并发限制、相同请求合并、重试、熔断）
     """
     logger.info(f"🤖 Calling LLM API: {SILICON_FLOW_API_URL}")
-    logger.debug(f"Messages: {json.dumps(messages, ensure_ascii=False, indent=2)}")
+    logger.debug("Messages: %s", LazyJson(messages, indent=2))
     
     if not SILICON_FLOW_API_KEY:
         logger.error("❌ SILICON_FLOW_API_KEY is not configured!")
         raise ValueError("LLM API Key未配置")
     
+    request_key = make_cache_key(SILICON_FLOW_MODEL, messages, temperature, max_tokens)
+    cache_key = None
+    if use_cache and llm_cache is not None:
+        cache_key = request_key
+        cached = await llm_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ LLM cache hit: {cache_key[:12]} ({len(cached)} characters)")
+            return cached
+    
     headers = {
         "Authorization": f"Bearer {SILICON_FLOW_API_KEY}",
         "Content-Type": "application/json"
@@ -163,32 +634,47 @@ async def call_llm(messages: List[Dict[str, str]], temperature: float = 0.7) ->
         "model": SILICON_FLOW_MODEL,
         "messages": messages,
         "temperature": temperature,
-        "max_tokens": 2000
+        "max_tokens": max_tokens
     }
     
-    try:
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            logger.info(f"📤 Sending request to {SILICON_FLOW_API_URL}")
-            response = await client.post(
+    async def send() -> str:
+        logger.info(f"📤 Sending request to {SILICON_FLOW_API_URL}")
+        started = time.perf_counter()
+        try:
+            response = await llm_pool.post(
                 SILICON_FLOW_API_URL,
                 headers=headers,
                 json=payload
             )
-            
-            logger.info(f"📥 Response status: {response.status_code}")
-            
-            if response.status_code != 200:
-                logger.error(f"❌ LLM API error: {response.status_code}")
-                logger.error(f"Response: {response.text}")
-                raise Exception(f"LLM API returned {response.status_code}: {response.text}")
-            
-            result = response.json()
-            logger.debug(f"LLM Response: {json.dumps(result, ensure_ascii=False, indent=2)}")
-            
-            content = result['choices'][0]['message']['content']
-            logger.info(f"✅ LLM response received: {len(content)} characters")
-            
-            return content
+        except httpx.TimeoutException:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, ('request', 'timeout'))
+            raise
+        except Exception:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, ('request', 'error'))
+            raise
+        LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, ('request', str(response.status_code)))
+        
+        logger.info(f"📥 Response status: {response.status_code}")
+        
+        if response.status_code != 200:
+            logger.error(f"❌ LLM API error: {response.status_code}")
+            logger.error(f"Response: {response.text}")
+            raise UpstreamError(response.status_code, response.text, parse_retry_after(response))
+        
+        result = response.json()
+        logger.debug("LLM Response: %s", LazyJson(result, indent=2))
+        record_llm_usage(result.get('usage'))
+        
+        content = result['choices'][0]['message']['content']
+        logger.info(f"✅ LLM response received: {len(content)} characters")
+        
+        if cache_key is not None:
+            await llm_cache.aset(cache_key, content)
+        
+        return content
+    
+    try:
+        return await llm_gateway.call(request_key, send)
     
     except httpx.TimeoutException:
         logger.error("❌ LLM API request timeout")
@@ -198,6 +684,138 @@ async def call_llm(messages: List[Dict[str, str]], temperature: float = 0.7) ->
         raise
 
 
+async def call_llm_stream(
+    messages: List[Dict[str, str]],
+    temperature: float = 0.7,
+    max_tokens: int = LLM_MAX_TOKENS,
+    use_cache: bool = True
+) -> AsyncIterator[str]:
+    """
+    流式调用 Silicon Flow DeepSeek LLM API (stream: true)
+    逐个产出增量文本；完整结果在结束时写入缓存
+    """
+    logger.info(f"🤖 Streaming LLM API: {SILICON_FLOW_API_URL}")
+    
+    if not SILICON_FLOW_API_KEY:
+        logger.error("❌ SILICON_FLOW_API_KEY is not configured!")
+        raise ValueError("LLM API Key未配置")
+    
+    cache_key = None
+    if use_cache and llm_cache is not None:
+        cache_key = make_cache_key(SILICON_FLOW_MODEL, messages, temperature, max_tokens)
+        cached = await llm_cache.aget(cache_key)
+        if cached is not None:
+            logger.info(f"⚡ LLM cache hit: {cache_key[:12]} ({len(cached)} characters)")
+            yield cached
+            return
+    
+    headers = {
+        "Authorization": f"Bearer {SILICON_FLOW_API_KEY}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream"
+    }
+    
+    payload = {
+        "model": SILICON_FLOW_MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    
+    parts = []
+    usage = None
+    status = 'error'
+    started = None
+    try:
+        async with llm_gateway.stream_slot():
+            started = time.perf_counter()
+            async with llm_pool.stream(SILICON_FLOW_API_URL, headers=headers, json=payload) as response:
+                status = str(response.status_code)
+                logger.info(f"📥 Stream response status: {response.status_code}")
+                
+                if response.status_code != 200:
+                    body = (await response.aread()).decode('utf-8', errors='replace')
+                    logger.error(f"❌ LLM API error: {response.status_code}")
+                    logger.error(f"Response: {body}")
+                    raise UpstreamError(response.status_code, body, parse_retry_after(response))
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    chunk = json.loads(data)
+                    usage = chunk.get('usage') or usage
+                    choices = chunk.get('choices') or []
+                    if not choices:
+                        continue
+                    delta = (choices[0].get('delta') or {}).get('content')
+                    if delta:
+                        parts.append(delta)
+                        yield delta
+    
+    except httpx.TimeoutException:
+        status = 'timeout'
+        logger.error("❌ LLM API stream timeout")
+        raise Exception("LLM API请求超时")
+    finally:
+        if started is not None:
+            LLM_REQUEST_SECONDS.observe(time.perf_counter() - started, ('stream', status))
+    
+    record_llm_usage(usage)
+    content = ''.join(parts)
+    logger.info(f"✅ LLM stream completed: {len(content)} characters")
+    
+    if cache_key is not None and content:
+        await llm_cache.aset(cache_key, content)
+
+
+# Chunked summarization engine for long transcripts
+summarizer = MapReduceSummarizer(
+    call_llm,
+    max_concurrency=SUMMARY_MAX_CONCURRENCY,
+    single_pass_chars=SUMMARY_SINGLE_PASS_CHARS,
+    chunk_seconds=SUMMARY_CHUNK_SECONDS,
+    chunk_chars=SUMMARY_CHUNK_CHARS,
+    chunk_turns=SUMMARY_CHUNK_TURNS
+)
+
+
+def on_live_summary_update(recording_id: str, summary_text: str, final: bool):
+    """推送滚动摘要到录制房间并保存最新状态"""
+    generated_at = datetime.now().isoformat()
+    for session in list(active_sessions.values()):
+        if session.get('recording_id') == recording_id:
+            session['live_summary'] = summary_text
+            session['live_summary_updated_at'] = generated_at
+            session_store.update(
+                session['session_id'],
+                live_summary=summary_text,
+                live_summary_updated_at=generated_at,
+                live_summary_state=live_summarizer.checkpoint(recording_id)
+            )
+    store_meeting_summary(recording_id, summary_text)
+    socketio.emit('summary_update', {
+        'meeting_id': recording_id,
+        'live': not final,
+        'done': final,
+        'summary': summary_text,
+        'generated_at': generated_at
+    }, to=recording_id)
+
+
+# Rolling summarizer for meetings that are still being recorded
+live_summarizer = LiveSummarizer(
+    summarizer,
+    background_loop,
+    on_live_summary_update,
+    interval=LIVE_SUMMARY_INTERVAL,
+    segment_threshold=LIVE_SUMMARY_SEGMENT_THRESHOLD
+)
+
+
 @app.route('/')
 def root():
     """健康检查端点"""
@@ -240,17 +858,21 @@ def register():
             return jsonify({"error": "Password must be at least 6 characters"}), 400
         
         # Check if user exists
-        if username in users_db:
+        if storage.get_user(username) is not None:
             logger.warning(f"❌ Username already exists: {username}")
             return jsonify({"error": "Username already exists"}), 409
         
         # Hash password and create user
-        hashed_password = bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt()).decode('utf-8')
-        users_db[username] = {
+        hashed_password = password_hasher.hash(password)
+        created = storage.create_user({
             'username': username,
             'password': hashed_password,
             'created_at': datetime.now().isoformat()
-        }
+        })
+        if not created:
+            # Lost a race with a concurrent registration of the same name
+            logger.warning(f"❌ Username already exists: {username}")
+            return jsonify({"error": "Username already exists"}), 409
         
         # Create JWT token
         token = create_jwt_token(username)
@@ -267,6 +889,9 @@ def register():
             }
         }), 201
         
+    except HasherBusyError as e:
+        logger.warning(f"⚠️ Password hashing busy, rejecting registration: {str(e)}")
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"❌ Error during registration: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -289,19 +914,22 @@ def login():
             return jsonify({"error": "Username and password are required"}), 400
         
         # Check if user exists
-        if username not in users_db:
+        user = storage.get_user(username)
+        if user is None:
             logger.warning(f"❌ User not found: {username}")
             return jsonify({"error": "Invalid username or password"}), 401
         
-        user = users_db[username]
-        
-        # Verify password
-        if not bcrypt_lib.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+        # Verify password (and upgrade the hash if the bcrypt cost changed)
+        valid, new_hash = password_hasher.verify_and_update(password, user['password'])
+        if not valid:
             logger.warning(f"❌ Invalid password for user: {username}")
             return jsonify({"error": "Invalid username or password"}), 401
+        if new_hash is not None:
+            storage.update_user(username, password=new_hash)
+            logger.info(f"🔐 Password hash upgraded to cost {PASSWORD_HASH_ROUNDS} for user: {username}")
         
         # Create JWT token
-        token = create_jwt_token(username)
+        token = create_jwt_token(username, user.get('token_version', 0))
         
         logger.info(f"✅ User logged in successfully: {username}")
         logger.info("="*60)
@@ -315,6 +943,9 @@ def login():
             }
         })
         
+    except HasherBusyError as e:
+        logger.warning(f"⚠️ Password hashing busy, rejecting login: {str(e)}")
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"❌ Error during login: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -326,15 +957,79 @@ def get_current_user():
     """获取当前用户信息"""
     username = request.user['username']
     
-    if username not in users_db:
+    user = storage.get_user(username)
+    if user is None:
         return jsonify({"error": "User not found"}), 404
     
     return jsonify({
         "username": username,
-        "created_at": users_db[username].get('created_at')
+        "created_at": user.get('created_at')
+    })
+
+
+@app.route('/api/v1/auth/hasher', methods=['GET'])
+def password_hasher_stats():
+    """
+    密码哈希线程池状态（排队、拒绝次数、哈希耗时与排队等待）
+    """
+    return jsonify({
+        "status": "success",
+        "hasher": password_hasher.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/auth/token-cache', methods=['GET'])
+def token_cache_stats():
+    """
+    已验证令牌缓存统计
+    """
+    return jsonify({
+        "status": "success",
+        "token_cache": token_cache.stats(),
+        "socket_identities": len(socket_identities),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/logging', methods=['GET'])
+def logging_stats():
+    """
+    日志管道状态（队列积压、采样率、限速与丢弃计数）
+    """
+    return jsonify({
+        "status": "success",
+        "logging": {
+            "level": logging.getLevelName(logging.getLogger().level),
+            "format": LOG_FORMAT,
+            **log_pipeline.stats()
+        },
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/flow', methods=['GET'])
+def flow_control_stats():
+    """
+    传感器接入流控状态（负载等级、处理中事件、队列深度、拒绝与降级计数）
+    """
+    return jsonify({
+        "status": "success",
+        "flow_control": flow_control.stats(),
+        "timestamp": datetime.now().isoformat()
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus 指标（文本格式）：路由与 Socket.IO 事件延迟直方图、LLM 上游耗时与 token、bcrypt 耗时、会话与进程状态
+    """
+    if not METRICS_ENABLED:
+        return jsonify({"error": "Metrics are disabled"}), 404
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+
 @app.route('/api/v1/auth/change-password', methods=['POST'])
 @require_auth
 def change_password():
@@ -358,34 +1053,171 @@ def change_password():
             return jsonify({"error": "New password must be at least 6 characters"}), 400
         
         # Check if user exists
-        if username not in users_db:
+        user = storage.get_user(username)
+        if user is None:
             logger.warning(f"❌ User not found: {username}")
             return jsonify({"error": "User not found"}), 404
         
-        user = users_db[username]
-        
         # Verify current password
-        if not bcrypt_lib.checkpw(current_password.encode('utf-8'), user['password'].encode('utf-8')):
+        if not password_hasher.verify(current_password, user['password']):
             logger.warning(f"❌ Invalid current password for user: {username}")
             return jsonify({"error": "Current password is incorrect"}), 401
         
         # Hash and update new password
-        hashed_password = bcrypt_lib.hashpw(new_password.encode('utf-8'), bcrypt_lib.gensalt()).decode('utf-8')
-        users_db[username]['password'] = hashed_password
+        hashed_password = password_hasher.hash(new_password)
+        storage.update_user(username, password=hashed_password)
+        
+        # Old tokens stop working immediately; the caller gets a fresh one
+        token = create_jwt_token(username, revoke_user_tokens(username))
         
         logger.info(f"✅ Password changed successfully for user: {username}")
         logger.info("="*60)
         
         return jsonify({
             "status": "success",
-            "message": "Password changed successfully"
+            "message": "Password changed successfully",
+            "token": token
         })
         
+    except HasherBusyError as e:
+        logger.warning(f"⚠️ Password hashing busy, rejecting password change: {str(e)}")
+        return hasher_busy_response()
     except Exception as e:
         logger.error(f"❌ Error changing password: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
 
+UPLOAD_CATEGORIES = {'audio': 'audio', 'video': 'videos'}
+
+
+def upload_destination(kind: str, filename: str):
+    """New media id and its path under UPLOAD_DIR; returns (media_id, path)"""
+    media_id = str(uuid.uuid4())
+    extension = os.path.splitext(filename or '')[1].lower()[:10]
+    directory = os.path.join(UPLOAD_DIR, UPLOAD_CATEGORIES[kind])
+    os.makedirs(directory, exist_ok=True)
+    return media_id, os.path.join(directory, f"{media_id}{extension}")
+
+
+def upload_job_options(values) -> Dict[str, Any]:
+    """
+    Queue priority and notification room for an upload. Media attached to an
+    active recording (``recording_id``) jumps ahead of bulk/historical uploads
+    and its completion event goes to that recording's room.
+    """
+    recording_id = values.get('recording_id')
+    if recording_id and session_store.find(recording_id) is not None:
+        return {'priority': parse_priority(values.get('priority'), PRIORITIES['live']), 'notify_room': recording_id}
+    return {'priority': parse_priority(values.get('priority')), 'notify_room': None}
+
+
+def register_upload(
+    kind: str,
+    media_id: str,
+    filename: str,
+    path: str,
+    size: int,
+    sha256: str,
+    priority: int = PRIORITIES['normal'],
+    notify_room: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Record a stored upload and queue its media jobs; returns the response body"""
+    record = {
+        'filename': filename,
+        'path': path,
+        'size': size,
+        'sha256': sha256,
+        'uploaded_at': datetime.now().isoformat()
+    }
+    if kind == 'video':
+        videos_db[media_id] = {'video_id': media_id, **record}
+        logger.info(f"💾 Saved video {media_id} to {path} ({size} bytes)")
+        # Keyframe extraction runs in the media worker pool, not this request thread
+        job = enqueue_media_job('keyframes', media_id, path, priority=priority, notify_room=notify_room)
+        job_id = videos_db[media_id]['keyframes_job'] = job['job_id']
+        return {
+            "status": "success",
+            "video_id": media_id,
+            "job_id": job_id,
+            "filename": filename,
+            "sha256": sha256,
+            "message": "视频文件已接收并排队处理"
+        }
+
+    audio_db[media_id] = {'audio_id': media_id, **record}
+    logger.info(f"💾 Saved audio {media_id} to {path} ({size} bytes)")
+    # Feature extraction reads PCM WAV; other formats are stored for transcription only
+    job_id = None
+    if path.endswith('.wav'):
+        job = enqueue_media_job('audio_features', media_id, path, priority=priority, notify_room=notify_room)
+        job_id = audio_db[media_id]['features_job'] = job['job_id']
+    return {
+        "status": "success",
+        "audio_id": media_id,
+        "job_id": job_id,
+        "filename": filename,
+        "sha256": sha256,
+        "message": "音频文件已接收并排队处理"
+    }
+
+
+def save_upload(kind: str, file) -> Dict[str, Any]:
+    """Stream a multipart file part to disk (hashing as it goes) and register it"""
+    media_id, path = upload_destination(kind, file.filename)
+    size, sha256 = stream_to_file(file.stream, path, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE)
+    return register_upload(kind, media_id, file.filename, path, size, sha256, **upload_job_options(request.form))
+
+
+def enqueue_media_job(
+    kind: str,
+    media_id: str,
+    path: str,
+    start_time: float = 0.0,
+    end_time: Optional[float] = None,
+    priority: int = PRIORITIES['normal'],
+    notify_room: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Add a media job with the configured parameters for its kind to the durable queue"""
+    if kind == 'keyframes':
+        params = {
+            'extractor': dict(KEYFRAME_EXTRACTOR_PARAMS),
+            'save_dir': os.path.join(UPLOAD_DIR, 'keyframes', media_id) if KEYFRAME_SAVE_IMAGES else None
+        }
+    elif kind == 'thumbnails':
+        params = {
+            'interval': THUMBNAIL_INTERVAL_SECONDS,
+            'width': THUMBNAIL_WIDTH,
+            'save_dir': os.path.join(UPLOAD_DIR, 'thumbnails', media_id)
+        }
+    else:
+        params = {}
+    return media_queue.enqueue(
+        kind, media_id, path, params,
+        priority=priority, start_time=start_time, end_time=end_time, notify_room=notify_room
+    )
+
+
+def on_media_job_finished(job: Dict[str, Any]):
+    """Push job completion to subscribers of the job and to its recording room"""
+    payload = {'timestamp': datetime.now().isoformat(), **job}
+    payload.pop('notify_room', None)
+    socketio.emit('job_update', payload, room=f"job_{job['job_id']}")
+    if job.get('notify_room'):
+        socketio.emit('job_update', payload, room=job['notify_room'])
+    logger.info(f"📣 Media job {job['job_id']} {job['status']}")
+
+
+# Durable SQLite job queue draining into the media worker pool
+media_queue = create_job_queue(
+    MEDIA_QUEUE_DB,
+    media_jobs,
+    concurrency=MEDIA_QUEUE_CONCURRENCY,
+    lease_seconds=MEDIA_QUEUE_LEASE_SECONDS,
+    max_attempts=MEDIA_QUEUE_MAX_ATTEMPTS,
+    on_finish=on_media_job_finished
+)
+
+
 @app.route('/api/v1/upload/audio', methods=['POST'])
 def upload_audio():
     """
@@ -420,14 +1252,14 @@ def upload_audio():
         if request.content_length:
             logger.info(f"   Size: {request.content_length} bytes")
         
-        # In production: save file, process with Whisper, etc.
-        
-        return jsonify({
-            "status": "success",
-            "filename": file.filename,
-            "message": "音频文件已接收并排队处理"
-        })
+        return jsonify(save_upload('audio', file))
     
+    except UploadError as e:
+        logger.warning(f"❌ Audio upload rejected: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
+    except RequestEntityTooLarge:
+        logger.warning(f"❌ Audio upload exceeded {MAX_FILE_SIZE} bytes")
+        return jsonify({"error": f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"}), 413
     except Exception as e:
         logger.error(f"❌ Error uploading audio: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
@@ -467,119 +1299,389 @@ def upload_video():
         if request.content_length:
             logger.info(f"   Size: {request.content_length} bytes")
         
-        # In production: save file, extract keyframes with OpenCV, etc.
-        
-        return jsonify({
-            "status": "success",
-            "filename": file.filename,
-            "message": "视频文件已接收并排队处理"
-        })
+        return jsonify(save_upload('video', file))
     
+    except UploadError as e:
+        logger.warning(f"❌ Video upload rejected: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
+    except RequestEntityTooLarge:
+        logger.warning(f"❌ Video upload exceeded {MAX_FILE_SIZE} bytes")
+        return jsonify({"error": f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"}), 413
     except Exception as e:
         logger.error(f"❌ Error uploading video: {str(e)}", exc_info=True)
         return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route('/api/v1/analyze/attention', methods=['POST'])
-def analyze_attention():
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({"error": f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"}), 413
+
+
+@app.route('/api/v1/upload/<kind>/stream', methods=['POST', 'PUT'])
+def upload_stream(kind):
     """
-    分析传感器数据中的注意力模式
+    流式上传：请求体即文件内容，分块写盘并计算 SHA-256，超过大小限制立即中断
     
-    Expected data format:
-    {
-        "imu_data": [...],
-        "app_state": [...],
-        "gaze_data": [...]
-    }
+    Headers: Content-Type (audio/* 或 video/*), X-Filename
     """
     try:
-        logger.info("="*60)
-        logger.info("🧠 Attention analysis request received")
-        
-        data = request.get_json()
-        
-        if not data:
-            logger.warning("❌ No JSON data in request")
-            return jsonify({"error": "No data provided"}), 400
+        if kind not in UPLOAD_CATEGORIES:
+            return jsonify({"error": "kind must be audio or video"}), 404
         
-        logger.debug(f"Request data keys: {list(data.keys())}")
+        logger.info("="*60)
+        logger.info(f"📤 Streaming {kind} upload request received")
         
-        # Placeholder for attention analysis
-        # In production: use ML models to analyze IMU, app state, gaze data
+        if not request.mimetype.startswith(f"{kind}/"):
+            logger.warning(f"❌ Invalid file type: {request.mimetype}")
+            return jsonify({"error": f"Invalid file type. Must be {kind}."}), 400
         
-        result = {
-            "status": "success",
-            "attention_score": 0.85,
-            "low_attention_periods": [
-                {"start": 300, "end": 450, "reason": "设备切换"},
-                {"start": 1200, "end": 1380, "reason": "手机移动"}
-            ]
-        }
+        # Fail before reading a single byte when the client declares the size
+        if request.content_length and request.content_length > MAX_FILE_SIZE:
+            logger.warning(f"❌ File too large: {request.content_length} bytes")
+            return jsonify({"error": f"File too large. Maximum size is {MAX_FILE_SIZE} bytes"}), 413
         
-        logger.info(f"✅ Attention analysis complete: score={result['attention_score']}")
+        filename = request.headers.get('X-Filename') or request.args.get('filename') or f"upload.{request.mimetype.split('/')[1]}"
+        media_id, path = upload_destination(kind, filename)
+        size, sha256 = stream_to_file(request.stream, path, MAX_FILE_SIZE, UPLOAD_CHUNK_SIZE)
+        if size == 0:
+            os.remove(path)
+            return jsonify({"error": "Empty upload"}), 400
         
-        return jsonify(result)
+        return jsonify(register_upload(kind, media_id, filename, path, size, sha256, **upload_job_options(request.args)))
     
+    except UploadError as e:
+        logger.warning(f"❌ Streaming upload rejected: {str(e)}")
+        return jsonify({"error": str(e)}), e.status_code
     except Exception as e:
-        logger.error(f"❌ Error analyzing attention: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"❌ Error in streaming upload: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route('/api/v1/analyze/keyframes', methods=['POST'])
-def extract_keyframes():
+@app.route('/api/v1/uploads', methods=['POST'])
+def init_chunked_upload():
     """
-    从视频中提取关键帧（PPT变化、白板更新）
+    初始化断点续传上传
+    
+    Expected data format:
+    {"kind": "video", "filename": "...", "content_type": "video/mp4", "total_size": 12345, "sha256": "..."}
     """
     try:
-        logger.info("="*60)
-        logger.info("🖼️  Keyframe extraction request received")
-        
         data = request.get_json()
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
         
-        if not data or 'video_id' not in data:
-            logger.warning("❌ No video_id in request")
-            return jsonify({"error": "video_id is required"}), 400
-        
-        video_id = data['video_id']
-        logger.info(f"Extracting keyframes for video: {video_id}")
-        
-        # Placeholder for keyframe extraction
-        # In production: use OpenCV for scene detection
-        
-        result = {
-            "status": "success",
-            "video_id": video_id,
-            "keyframes": [
-                {"timestamp": 5.3, "frame_id": "frame_001", "change_type": "幻灯片变化"},
-                {"timestamp": 12.7, "frame_id": "frame_002", "change_type": "幻灯片变化"},
-                {"timestamp": 25.1, "frame_id": "frame_003", "change_type": "幻灯片变化"},
-            ]
-        }
-        
-        logger.info(f"✅ Extracted {len(result['keyframes'])} keyframes")
-        
-        return jsonify(result)
+        kind = data.get('kind')
+        content_type = data.get('content_type') or ''
+        if kind not in UPLOAD_CATEGORIES:
+            return jsonify({"error": "kind must be audio or video"}), 400
+        if not content_type.startswith(f"{kind}/"):
+            return jsonify({"error": f"Invalid file type. Must be {kind}."}), 400
+        
+        upload = chunked_uploads.init(
+            kind,
+            data.get('filename') or 'upload',
+            content_type,
+            int(data.get('total_size') or 0),
+            sha256=data.get('sha256')
+        )
+        return jsonify({"status": "success", **upload}), 201
     
+    except UploadError as e:
+        return jsonify({"error": str(e), **e.details}), e.status_code
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid data: {str(e)}"}), 400
     except Exception as e:
-        logger.error(f"❌ Error extracting keyframes: {str(e)}", exc_info=True)
-        return jsonify({"error": str(e)}), 500
+        logger.error(f"❌ Error initializing upload: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
 
 
-@app.route('/api/v1/meetings/<meeting_id>/summary', methods=['GET'])
-@async_route
-async def get_meeting_summary(meeting_id: str):
+@app.route('/api/v1/uploads/<upload_id>', methods=['GET'])
+def get_chunked_upload(upload_id):
     """
-    获取会议的AI生成摘要
-    使用 Silicon Flow DeepSeek LLM
+    查询上传进度（客户端据此从 next_chunk 继续）
+    """
+    try:
+        return jsonify({"status": "success", **chunked_uploads.status(upload_id)})
+    except UploadError as e:
+        return jsonify({"error": str(e), **e.details}), e.status_code
+
+
+@app.route('/api/v1/uploads/<upload_id>/chunks/<int:index>', methods=['PUT'])
+def put_upload_chunk(upload_id, index):
+    """
+    上传一个分块（请求体为原始字节，需按顺序；重复分块会被确认但不重复写入）
+    """
+    try:
+        return jsonify({"status": "success", **chunked_uploads.put_chunk(upload_id, index, request.stream)})
+    except UploadError as e:
+        return jsonify({"error": str(e), **e.details}), e.status_code
+    except Exception as e:
+        logger.error(f"❌ Error storing upload chunk: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/v1/uploads/<upload_id>/complete', methods=['POST'])
+def complete_chunked_upload(upload_id):
+    """
+    完成上传：校验大小与 SHA-256，入库并排队处理
+    """
+    try:
+        stored = chunked_uploads.complete(
+            upload_id,
+            lambda meta: upload_destination(meta['category'], meta['filename'])
+        )
+        return jsonify(register_upload(
+            stored['category'], stored['media_id'], stored['filename'],
+            stored['path'], stored['size'], stored['sha256'],
+            **upload_job_options(request.get_json(silent=True) or {})
+        ))
+    except UploadError as e:
+        return jsonify({"error": str(e), **e.details}), e.status_code
+    except Exception as e:
+        logger.error(f"❌ Error completing upload: {str(e)}", exc_info=True)
+        return jsonify({"error": "Internal server error"}), 500
+
+
+@app.route('/api/v1/uploads/<upload_id>', methods=['DELETE'])
+def abort_chunked_upload(upload_id):
+    """
+    放弃未完成的上传并删除临时文件
+    """
+    try:
+        chunked_uploads.abort(upload_id)
+        return jsonify({"status": "success"})
+    except UploadError as e:
+        return jsonify({"error": str(e), **e.details}), e.status_code
+
+
+@app.route('/api/v1/analyze/attention', methods=['POST'])
+def analyze_attention():
+    """
+    分析传感器数据中的注意力模式
+    
+    Expected data format:
+    {
+        "imu_data": [...],           # [{timestamp, acceleration: {x, y, z}}] or {"t": [...], "ax": [...], ...}
+        "app_state": [...],          # [{timestamp, state}] or {"t": [...], "foreground": [...]}
+        "gaze_data": [...],          # [{timestamp, on_screen}] or {"t": [...], "on_screen": [...]}
+        "window_seconds": 5          # optional
+    }
+    或 {"session_id": "..."} 直接分析活动会话的缓冲区数据
+    或 {"recording_id": "...", "start": ..., "end": ...} 从归档中读取（epoch 秒，可选）
     """
     try:
         logger.info("="*60)
-        logger.info(f"📝 Summary request for meeting: {meeting_id}")
+        logger.info("🧠 Attention analysis request received")
+        
+        data = request.get_json()
+        
+        if not data:
+            logger.warning("❌ No JSON data in request")
+            return jsonify({"error": "No data provided"}), 400
+        
+        logger.debug(f"Request data keys: {list(data.keys())}")
+        
+        window_seconds = float(data.get('window_seconds', ATTENTION_WINDOW_SECONDS))
+        if window_seconds <= 0:
+            return jsonify({"error": "window_seconds must be positive"}), 400
+        
+        session_id = data.get('session_id')
+        if session_id:
+            session = active_sessions.get(session_id)
+            if session is None:
+                # Live buffers only exist on the worker holding the session's lease
+                if session_store.get(session_id) is not None:
+                    return jsonify({"error": "Session is running on another worker"}), 409
+                return jsonify({"error": "Session not found"}), 404
+            buffers = session['buffers']
+            imu = buffers.imu.columns()
+            app_state = buffers.app_state.columns()
+            gaze = buffers.gaze.columns()
+        elif data.get('recording_id'):
+            # 事后重新分析：只映射所需的列和时间段
+            try:
+                wait_for_archive(data['recording_id'])
+                archive = open_archive(SENSOR_ARCHIVE_DIR, data['recording_id'])
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            if archive is None:
+                return jsonify({"error": "Recording archive not found"}), 404
+            start, end = data.get('start'), data.get('end')
+            imu = archive.columns('imu', ['t', 'ax', 'ay', 'az'], start, end)
+            app_state = archive.columns('app_state', ['t', 'foreground'], start, end)
+            gaze = archive.columns('gaze', ['t', 'on_screen'], start, end)
+        else:
+            imu = imu_columns(data.get('imu_data'))
+            app_state = app_state_columns(data.get('app_state'))
+            gaze = gaze_columns(data.get('gaze_data'))
+        
+        analysis = score_attention(
+            imu, app_state, gaze,
+            window_seconds=window_seconds,
+            max_windows=ATTENTION_MAX_WINDOWS
+        )
+        result = {"status": "success", **analysis}
+        
+        logger.info(
+            f"✅ Attention analysis complete: score={result['attention_score']} "
+            f"({result['stats']['samples']} samples, {result['stats']['elapsed_ms']} ms)"
+        )
+        
+        return jsonify(result)
+    
+    except (TypeError, ValueError) as e:
+        logger.warning(f"❌ Invalid attention data: {str(e)}")
+        return jsonify({"error": f"Invalid data: {str(e)}"}), 400
+    except Exception as e:
+        logger.error(f"❌ Error analyzing attention: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/analyze/keyframes', methods=['POST'])
+def extract_keyframes():
+    """
+    从视频中提取关键帧（PPT变化、白板更新）
+    """
+    try:
+        logger.info("="*60)
+        logger.info("🖼️  Keyframe extraction request received")
+        
+        data = request.get_json()
         
-        # In production: retrieve transcript and context from database
-        # For now, use mock data
+        if not data or 'video_id' not in data:
+            logger.warning("❌ No video_id in request")
+            return jsonify({"error": "video_id is required"}), 400
         
-        mock_transcript = """
+        video_id = data['video_id']
+        video = videos_db.get(video_id)
+        if video is None:
+            logger.warning(f"❌ Video not found: {video_id}")
+            return jsonify({"error": "Video not found"}), 404
+        
+        start_time = float(data.get('start_time', 0))
+        end_time = data.get('end_time')
+        end_time = float(end_time) if end_time is not None else None
+        logger.info(f"Extracting keyframes for video: {video_id}")
+        
+        # Reuse the job queued at upload time unless a sub-range was requested
+        job = None
+        if start_time == 0 and end_time is None:
+            job = media_queue.find(video_id, 'keyframes')
+        if job is None:
+            job = enqueue_media_job(
+                'keyframes', video_id, video['path'], start_time, end_time,
+                priority=parse_priority(data.get('priority'))
+            )
+        
+        if not data.get('wait', True):
+            return jsonify({"status": "queued", "video_id": video_id, "job": job}), 202
+        
+        # The worker processes do the decoding; this thread only waits
+        job = media_queue.wait(job['job_id'], KEYFRAME_WAIT_TIMEOUT)
+        if job['status'] in (JOB_QUEUED, JOB_RUNNING):
+            return jsonify({"status": job['status'], "video_id": video_id, "job": job}), 202
+        if job['status'] != JOB_COMPLETED:
+            return jsonify({"error": f"Keyframe job {job['status']}: {job['error']}", "job_id": job['job_id']}), 500
+        
+        result = {
+            "status": "success",
+            "video_id": video_id,
+            "job_id": job['job_id'],
+            **job['result']
+        }
+        
+        stats = job['result']['stats']
+        logger.info(
+            f"✅ Extracted {len(result['keyframes'])} keyframes "
+            f"({stats['frames_read']} frames in {stats['elapsed_seconds']}s across {stats['segments']} segment(s), "
+            f"{stats['frames_per_second']} frames/s, {stats['realtime_factor']}x real-time)"
+        )
+        
+        return jsonify(result)
+    
+    except (TypeError, ValueError) as e:
+        logger.warning(f"❌ Keyframe extraction failed: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error extracting keyframes: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/jobs', methods=['POST'])
+def create_media_job():
+    """
+    提交媒体处理作业（keyframes / thumbnails / audio_features）
+    
+    Expected data format:
+    {"kind": "thumbnails", "media_id": "...", "start_time": 0, "end_time": null, "priority": "bulk"}
+    """
+    try:
+        data = request.get_json()
+        if not data or not data.get('kind') or not data.get('media_id'):
+            return jsonify({"error": "kind and media_id are required"}), 400
+        
+        media_id = data['media_id']
+        media = videos_db.get(media_id) or audio_db.get(media_id)
+        if media is None:
+            return jsonify({"error": "Media not found"}), 404
+        
+        end_time = data.get('end_time')
+        job = enqueue_media_job(
+            data['kind'], media_id, media['path'],
+            start_time=float(data.get('start_time', 0)),
+            end_time=float(end_time) if end_time is not None else None,
+            priority=parse_priority(data.get('priority'))
+        )
+        return jsonify({"status": "queued", "job": job}), 202
+    
+    except (TypeError, ValueError) as e:
+        logger.warning(f"❌ Invalid media job: {str(e)}")
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.error(f"❌ Error submitting media job: {str(e)}", exc_info=True)
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/v1/jobs', methods=['GET'])
+def list_media_jobs():
+    """
+    列出最近的媒体处理作业及队列/工作进程池状态
+    """
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({
+        "status": "success",
+        "queue": media_queue.snapshot(),
+        "jobs": media_queue.recent(limit, status=request.args.get('status'))
+    })
+
+
+@app.route('/api/v1/jobs/<job_id>', methods=['GET'])
+def get_media_job(job_id):
+    """
+    查询媒体处理作业状态与结果
+    """
+    job = media_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"status": "success", "job": job})
+
+
+@app.route('/api/v1/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_media_job(job_id):
+    """
+    取消媒体处理作业
+    """
+    job = media_queue.get(job_id, include_result=False)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if not media_queue.cancel(job_id):
+        return jsonify({"error": f"Job already {job['status']}"}), 409
+    return jsonify({"status": "success", "job": media_queue.get(job_id, include_result=False)})
+
+
+# In production: retrieve transcript and context from database
+# For now, use mock data
+MOCK_TRANSCRIPT = """
         会议开始时间: 14:00
         
         张三: 大家好，今天我们讨论Q4的产品路线图。
@@ -589,75 +1691,272 @@ async def get_meeting_summary(meeting_id: str):
         李四: 我会在下周五前完成功能规格说明。
         王五: 预算方面，我们已经获得批准。
         """
+
+def build_summary_result(meeting_id: str, summary_text: str) -> Dict[str, Any]:
+    """将 LLM 摘要文本包装为响应结构"""
+    # Parse the summary (in production, use more sophisticated parsing)
+    return {
+        "meeting_id": meeting_id,
+        "summary": {
+            "title": "产品策略会议",
+            "generated_summary": summary_text,
+            "executive_summary": "团队审查了Q4路线图并最终确定了营销策略",
+            "key_points": [
+                "完成Q4功能优先级排序",
+                "预算分配已批准",
+                "调整了营销时间表"
+            ],
+            "action_items": [
+                {
+                    "task": "完成功能规格说明",
+                    "assignee": "李四",
+                    "due_date": "下周五",
+                    "timestamp": 754
+                }
+            ],
+            "generated_at": datetime.now().isoformat()
+        }
+    }
+
+
+def build_fallback_summary(meeting_id: str) -> Dict[str, Any]:
+    """LLM 不可用时的静态摘要"""
+    return {
+        "meeting_id": meeting_id,
+        "summary": {
+            "title": "产品策略会议",
+            "executive_summary": "团队审查了Q4路线图并最终确定了营销策略",
+            "key_points": [
+                "完成Q4功能优先级排序",
+                "预算分配已批准",
+                "调整了营销时间表"
+            ],
+            "action_items": [
+                {
+                    "task": "完成功能规格说明",
+                    "assignee": "李四",
+                    "due_date": "2026-02-05",
+                    "timestamp": 754
+                }
+            ],
+            "note": "LLM服务暂时不可用，显示静态摘要",
+            "generated_at": datetime.now().isoformat()
+        }
+    }
+
+
+def store_meeting_summary(meeting_id: str, summary_text: str):
+    """保存生成的摘要到会议记录（如果会议存在）"""
+    storage.update_meeting(
+        meeting_id,
+        generated_summary=summary_text,
+        summary_generated_at=datetime.now().isoformat()
+    )
+
+
+@app.route('/api/v1/meetings', methods=['GET'])
+@require_auth
+def list_meetings():
+    """
+    分页列出当前用户的会议（按开始时间倒序，游标分页）
+    
+    Query: from / to (ISO 时间，按 start_time 过滤), q (标题关键字), limit, cursor
+    """
+    try:
+        meetings, next_cursor = storage.list_meetings(
+            owner=request.user['username'],
+            start=request.args.get('from') or None,
+            end=request.args.get('to') or None,
+            title=request.args.get('q') or None,
+            limit=request.args.get('limit', 50, type=int),
+            cursor=request.args.get('cursor') or None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "status": "success",
+        "meetings": meetings,
+        "next_cursor": next_cursor,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/meetings/<meeting_id>', methods=['GET'])
+@require_auth
+def get_meeting(meeting_id: str):
+    """获取单个会议记录"""
+    meeting = storage.get_meeting(meeting_id)
+    if meeting is None or meeting.get('owner') not in (None, request.user['username']):
+        return jsonify({"error": "Meeting not found"}), 404
+    if 'archive' not in meeting:
+        # Archives are closed in the background after the meeting is saved
+        wait_for_archive(meeting_id)
+        archive = open_archive(SENSOR_ARCHIVE_DIR, meeting_id)
+        if archive is not None:
+            meeting['archive'] = archive.summary()
+    return jsonify({"status": "success", "meeting": meeting})
+
+
+@app.route('/api/v1/meetings/<meeting_id>/sensor-samples', methods=['GET'])
+@require_auth
+def get_meeting_sensor_samples(meeting_id: str):
+    """
+    会议的传感器事件记录（可选 start / end 为 epoch 秒）
+    """
+    meeting = storage.get_meeting(meeting_id)
+    if meeting is None or meeting.get('owner') not in (None, request.user['username']):
+        return jsonify({"error": "Meeting not found"}), 404
+    rows = storage.sensor_rows(
+        meeting_id,
+        start=request.args.get('start', type=float),
+        end=request.args.get('end', type=float)
+    )
+    return jsonify({"status": "success", "recording_id": meeting_id, "count": len(rows), "samples": rows})
+
+
+@app.route('/api/v1/meetings/<meeting_id>/archive', methods=['GET'])
+@require_auth
+def get_meeting_archive(meeting_id: str):
+    """
+    会议原始传感器归档的概要（各数据流行数、分段数、时间范围）
+    """
+    meeting = storage.get_meeting(meeting_id)
+    if meeting is None or meeting.get('owner') not in (None, request.user['username']):
+        return jsonify({"error": "Meeting not found"}), 404
+    wait_for_archive(meeting_id)
+    archive = open_archive(SENSOR_ARCHIVE_DIR, meeting_id)
+    if archive is None:
+        return jsonify({"error": "Recording archive not found"}), 404
+    return jsonify({"status": "success", "recording_id": meeting_id, "archive": archive.summary()})
+
+
+@app.route('/api/v1/meetings/<meeting_id>/timeline', methods=['GET'])
+@require_auth
+def get_meeting_timeline(meeting_id: str):
+    """
+    会议时间轴查询：指定时间段与分辨率的传感器/注意力曲线（min/max/mean）及关键帧
+    
+    Query: start / end (距录制开始的秒数), points (最多桶数), resolution (最小桶宽，秒),
+           series (逗号分隔: motion,rotation,foreground,gaze,attention), keyframes (true/false)
+    """
+    meeting = storage.get_meeting(meeting_id)
+    if meeting is None or meeting.get('owner') not in (None, request.user['username']):
+        return jsonify({"error": "Meeting not found"}), 404
+    wait_for_archive(meeting_id)
+    archive = open_archive(SENSOR_ARCHIVE_DIR, meeting_id)
+    if archive is None:
+        return jsonify({"error": "Recording archive not found"}), 404
+    
+    timeline = open_timeline(archive.path)
+    if timeline is None:
+        # Interrupted or pre-existing recordings: build on first use
+        finalize_archive(meeting_id).result()
+        timeline = open_timeline(archive.path)
+        if timeline is None:
+            return jsonify({"error": "Timeline build failed"}), 500
+    
+    series = request.args.get('series')
+    try:
+        result = timeline.query(
+            start=request.args.get('start', type=float),
+            end=request.args.get('end', type=float),
+            max_points=max(1, min(request.args.get('points', TIMELINE_MAX_POINTS, type=int), TIMELINE_MAX_POINTS)),
+            resolution=request.args.get('resolution', type=float),
+            series=series.split(',') if series else None,
+            keyframes=request.args.get('keyframes', 'true').lower() != 'false'
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "success", "recording_id": meeting_id, **result})
+
+
+def accessible_recording(recording_id: str) -> Optional[Dict[str, Any]]:
+    """当前用户可访问的会议记录，或进行中的同一录制会话"""
+    record = storage.get_meeting(recording_id)
+    if record is None:
+        record = session_store.find(recording_id)
+    if record is None or record.get('owner') not in (None, request.user['username']):
+        return None
+    return record
+
+
+@app.route('/api/v1/meetings/<meeting_id>/keyframes', methods=['GET'])
+@require_auth
+def list_meeting_keyframes(meeting_id: str):
+    """
+    会议中去重后的关键帧图像（首次/最后出现时间、重复次数）
+    """
+    if accessible_recording(meeting_id) is None:
+        return jsonify({"error": "Meeting not found"}), 404
+    try:
+        images = keyframe_store.images(meeting_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"status": "success", "recording_id": meeting_id, "count": len(images), "images": images})
+
+
+@app.route('/api/v1/meetings/<meeting_id>/keyframes/<digest>', methods=['GET'])
+@require_auth
+def get_meeting_keyframe(meeting_id: str, digest: str):
+    """
+    关键帧原图；thumbnail=true 返回缩略图（首次请求时生成并缓存）
+    """
+    if accessible_recording(meeting_id) is None:
+        return jsonify({"error": "Meeting not found"}), 404
+    try:
+        if not keyframe_store.has_image(meeting_id, digest):
+            return jsonify({"error": "Keyframe image not found"}), 404
+        if request.args.get('thumbnail', 'false').lower() == 'true':
+            return send_file(keyframe_store.thumbnail_path(digest), mimetype='image/jpeg', max_age=31536000)
+        path = keyframe_store.image_path(digest)
+        with open(path, 'rb') as f:
+            mimetype = image_mimetype(f.read(16))
+        # Content-addressed: the bytes behind a digest never change
+        return send_file(path, mimetype=mimetype, etag=digest, max_age=31536000)
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"error": str(e)}), 404
+
+
+@app.route('/api/v1/keyframes/store', methods=['GET'])
+def keyframe_store_stats():
+    """
+    关键帧图像存储统计（去重命中、写入次数、缩略图生成数）
+    """
+    return jsonify({
+        "status": "success",
+        "keyframe_store": keyframe_store.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/meetings/<meeting_id>/summary', methods=['GET'])
+@async_route
+async def get_meeting_summary(meeting_id: str):
+    """
+    获取会议的AI生成摘要
+    使用 Silicon Flow DeepSeek LLM
+    """
+    try:
+        logger.info("="*60)
+        logger.info(f"📝 Summary request for meeting: {meeting_id}")
         
-        logger.info("🤖 Calling LLM for summary generation...")
+        current_llm_user.set(get_request_identity())
         
-        messages = [
-            {
-                "role": "system",
-                "content": "你是一个专业的会议助手。请分析会议记录，生成结构化的摘要，包括：1) 执行摘要 2) 关键要点 3) 行动项（带负责人和截止日期）。请用中文回复，格式清晰。"
-            },
-            {
-                "role": "user",
-                "content": f"请为以下会议记录生成摘要：\n\n{mock_transcript}"
-            }
-        ]
+        logger.info("🤖 Calling LLM for summary generation...")
         
         try:
-            summary_text = await call_llm(messages)
+            summary_text = await summarizer.summarize(MOCK_TRANSCRIPT)
             
             logger.info("✅ LLM summary generated successfully")
             logger.debug(f"Summary: {summary_text}")
             
-            # Parse the summary (in production, use more sophisticated parsing)
-            result = {
-                "meeting_id": meeting_id,
-                "summary": {
-                    "title": "产品策略会议",
-                    "generated_summary": summary_text,
-                    "executive_summary": "团队审查了Q4路线图并最终确定了营销策略",
-                    "key_points": [
-                        "完成Q4功能优先级排序",
-                        "预算分配已批准",
-                        "调整了营销时间表"
-                    ],
-                    "action_items": [
-                        {
-                            "task": "完成功能规格说明",
-                            "assignee": "李四",
-                            "due_date": "下周五",
-                            "timestamp": 754
-                        }
-                    ],
-                    "generated_at": datetime.now().isoformat()
-                }
-            }
+            store_meeting_summary(meeting_id, summary_text)
+            result = build_summary_result(meeting_id, summary_text)
             
         except Exception as llm_error:
             logger.error(f"❌ LLM call failed: {str(llm_error)}")
             # Fallback to static summary if LLM fails
-            result = {
-                "meeting_id": meeting_id,
-                "summary": {
-                    "title": "产品策略会议",
-                    "executive_summary": "团队审查了Q4路线图并最终确定了营销策略",
-                    "key_points": [
-                        "完成Q4功能优先级排序",
-                        "预算分配已批准",
-                        "调整了营销时间表"
-                    ],
-                    "action_items": [
-                        {
-                            "task": "完成功能规格说明",
-                            "assignee": "李四",
-                            "due_date": "2026-02-05",
-                            "timestamp": 754
-                        }
-                    ],
-                    "note": "LLM服务暂时不可用，显示静态摘要",
-                    "generated_at": datetime.now().isoformat()
-                }
-            }
+            result = build_fallback_summary(meeting_id)
         
         return jsonify(result)
     
@@ -666,6 +1965,94 @@ async def get_meeting_summary(meeting_id: str):
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/v1/meetings/<meeting_id>/summary/stream', methods=['GET'])
+def stream_meeting_summary(meeting_id: str):
+    """
+    流式生成会议摘要（Server-Sent Events）
+    每个增量 token 同时推送到 Socket.IO 房间 (meeting_id) 的 summary_update 事件
+    """
+    logger.info("="*60)
+    logger.info(f"📡 Streaming summary request for meeting: {meeting_id}")
+    
+    events = queue.Queue()
+    identity = get_request_identity()
+    
+    async def pump():
+        current_llm_user.set(identity)
+        parts = []
+        try:
+            # Long transcripts run the map phase first; only the reduce is streamed
+            messages = await summarizer.prepare(MOCK_TRANSCRIPT)
+            async for delta in call_llm_stream(messages):
+                parts.append(delta)
+                events.put(('delta', delta))
+                socketio.emit('summary_update', {
+                    'meeting_id': meeting_id,
+                    'delta': delta,
+                    'done': False
+                }, to=meeting_id)
+            
+            summary_text = ''.join(parts)
+            store_meeting_summary(meeting_id, summary_text)
+            result = build_summary_result(meeting_id, summary_text)
+            events.put(('done', result))
+            socketio.emit('summary_update', {
+                'meeting_id': meeting_id,
+                'done': True,
+                'result': result
+            }, to=meeting_id)
+        except Exception as llm_error:
+            logger.error(f"❌ LLM streaming failed: {str(llm_error)}")
+            events.put(('fallback', build_fallback_summary(meeting_id)))
+    
+    def sse(event: str, payload: Dict[str, Any]) -> str:
+        return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+    
+    def generate():
+        future = background_loop.submit(pump())
+        try:
+            while True:
+                kind, value = events.get()
+                if kind == 'delta':
+                    yield sse('delta', {'delta': value})
+                else:
+                    yield sse(kind, value)
+                    break
+        finally:
+            # Client went away before completion: stop the upstream stream
+            if not future.done():
+                future.cancel()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/v1/meetings/<meeting_id>/live-summary', methods=['GET'])
+def get_live_summary(meeting_id: str):
+    """
+    获取录制中会议的滚动摘要
+    """
+    snapshot = live_summarizer.snapshot(meeting_id)
+    if snapshot is None:
+        meeting = storage.get_meeting(meeting_id)
+        if meeting is None:
+            return jsonify({"error": "Meeting not found"}), 404
+        snapshot = {
+            'recording_id': meeting_id,
+            'summary': meeting.get('generated_summary'),
+            'updated_at': meeting.get('summary_generated_at'),
+            'final': True
+        }
+    return jsonify({
+        "status": "success",
+        "live_summary": snapshot,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
 @app.route('/api/v1/test-llm', methods=['POST'])
 @async_route
 async def test_llm():
@@ -690,6 +2077,8 @@ async def test_llm():
         
         logger.info(f"Test prompt length: {len(prompt)} characters")
         
+        current_llm_user.set(get_request_identity())
+        
         messages = [
             {
                 "role": "user",
@@ -697,7 +2086,8 @@ async def test_llm():
             }
         ]
         
-        response = await call_llm(messages)
+        # Connection test must always reach the provider
+        response = await call_llm(messages, use_cache=False)
         
         logger.info("✅ LLM test successful!")
         
@@ -708,6 +2098,14 @@ async def test_llm():
             "timestamp": datetime.now().isoformat()
         })
     
+    except (CircuitOpenError, GatewayBusyError) as e:
+        # Provider unhealthy or gateway saturated: fail fast
+        logger.warning(f"⚠️ LLM gateway rejected request: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "error": "LLM service temporarily unavailable",
+            "timestamp": datetime.now().isoformat()
+        }), 503
     except ValueError as e:
         # LLM configuration error
         logger.error(f"❌ LLM configuration error: {str(e)}")
@@ -725,41 +2123,454 @@ async def test_llm():
         }), 500
 
 
+@app.route('/api/v1/llm/pool', methods=['GET'])
+def llm_pool_stats():
+    """
+    LLM 连接池统计（用于容量规划）
+    """
+    return jsonify({
+        "status": "success",
+        "pool": llm_pool.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/llm/gateway', methods=['GET'])
+def llm_gateway_state():
+    """
+    LLM 网关状态（熔断器、并发与排队深度、合并/重试计数）
+    """
+    return jsonify({
+        "status": "success",
+        "gateway": llm_gateway.snapshot(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/llm/cache', methods=['GET', 'DELETE'])
+def llm_cache_stats():
+    """
+    LLM 响应缓存统计 / 清空缓存
+    """
+    if llm_cache is None:
+        return jsonify({"status": "disabled", "timestamp": datetime.now().isoformat()})
+    
+    if request.method == 'DELETE':
+        llm_cache.clear()
+        logger.info("🗑️ LLM cache cleared")
+    
+    return jsonify({
+        "status": "success",
+        "cache": llm_cache.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/storage', methods=['GET'])
+def storage_stats():
+    """
+    存储层统计（后端类型、记录数、传感器批量写入情况）
+    """
+    return jsonify({
+        "status": "success",
+        "storage": storage.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/sessions/memory', methods=['GET'])
+def session_memory_stats():
+    """
+    活动会话的缓冲区内存占用
+    """
+    sessions = {}
+    for session_id, session in list(active_sessions.items()):
+        sessions[session_id] = {
+            'recording_id': session['recording_id'],
+            **session['buffers'].memory_stats()
+        }
+    return jsonify({
+        "status": "success",
+        "active_sessions": len(sessions),
+        "total_bytes": sum(s['total_bytes'] for s in sessions.values()),
+        "sessions": sessions,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/api/v1/sessions/state', methods=['GET'])
+def session_state_stats():
+    """
+    共享会话状态：写后批量落盘统计与各工作进程持有的会话
+    """
+    owners = {}
+    for state in session_store.list():
+        owner = state.get('worker') or 'unowned'
+        owners[owner] = owners.get(owner, 0) + 1
+    return jsonify({
+        "status": "success",
+        "worker": WORKER_TOKEN,
+        "local_sessions": len(active_sessions),
+        "sessions_by_worker": owners,
+        "session_state": session_store.stats(),
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+def socket_user(data: Dict[str, Any]) -> Optional[str]:
+    """会话所有者：连接时已验证的身份，其次是事件中携带的可选 JWT（token 字段）"""
+    identity = socket_identities.get(request.sid)
+    if identity is not None:
+        return identity['username']
+    token = (data or {}).get('token')
+    if not token:
+        return None
+    try:
+        return verify_jwt_token(token)['username']
+    except ValueError:
+        return None
+
+
+def keyframe_image_bytes(data: Dict[str, Any]) -> Optional[bytes]:
+    """关键帧图像：优先二进制附件（image 字段），兼容 base64 / data URL 字符串"""
+    image = data.get('image')
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+    encoded = data.get('base64')
+    if not encoded:
+        return None
+    if encoded.startswith('data:'):
+        encoded = encoded.split(',', 1)[-1]
+    if len(encoded) > KEYFRAME_MAX_IMAGE_BYTES * 4 // 3 + 4:
+        raise KeyframeImageError(f"Keyframe image exceeds {KEYFRAME_MAX_IMAGE_BYTES} bytes")
+    return base64.b64decode(encoded, validate=True)
+
+
+def admit_sensor_event(session_id: str):
+    """流控准入：超出会话预算的事件不做处理；负载等级变化或持续超额时下发 throttle 建议"""
+    admission = flow_control.admit(session_id)
+    if admission.throttle is not None:
+        emit('throttle', admission.throttle)
+    return admission
+
+
+def store_sensor_row(session: Dict[str, Any]):
+    """把最新一条传感器事件摘要交给存储层批量写入"""
+    samples = session['buffers'].samples
+    row = {name: samples.last(name) for name in samples.names}
+    storage.append_sensor_rows(session['recording_id'], [row])
+
+
+def record_meeting(session_data: Dict[str, Any], status: str) -> Dict[str, Any]:
+    """将结束（或中断）的会话写入会议存储"""
+    buffers = session_data.get('buffers')
+    sensor_data_count = session_data.get('sensor_data_count')
+    if sensor_data_count is None:
+        # Sessions stored before counters were kept in the session state
+        sensor_data_count = len(storage.sensor_rows(session_data['recording_id']))
+    meeting = {
+        'recording_id': session_data['recording_id'],
+        'owner': session_data.get('owner'),
+        'meeting_title': session_data['meeting_title'],
+        'start_time': session_data['start_time'],
+        'end_time': datetime.now().isoformat(),
+        'sensor_data_count': sensor_data_count,
+        'keyframe_count': session_data.get('keyframe_count') or 0,
+        'generated_summary': session_data.get('live_summary'),
+        'status': status
+    }
+    meeting['keyframe_images'] = keyframe_store.finish(session_data['recording_id'])
+    if buffers is not None and buffers.archive is not None:
+        # Registered before the meeting is visible, so a timeline request waits for it
+        finalize_archive(meeting['recording_id'], buffers.archive)
+    storage.save_meeting(meeting)
+    session_store.delete(session_data['session_id'])
+    return meeting
+
+
+def new_session_buffers(recording_id: str, resume: bool = False) -> SessionBuffers:
+    """会话的环形缓冲区与磁盘归档（resume 时续写已有归档）"""
+    return SessionBuffers(
+        sample_capacity=SENSOR_BUFFER_CAPACITY,
+        imu_capacity=IMU_BUFFER_CAPACITY,
+        app_state_capacity=APP_STATE_BUFFER_CAPACITY,
+        keyframe_capacity=KEYFRAME_BUFFER_CAPACITY,
+        gaze_capacity=GAZE_BUFFER_CAPACITY,
+        archive=SensorArchiveWriter(
+            archive_path(SENSOR_ARCHIVE_DIR, recording_id),
+            ARCHIVE_STREAMS,
+            segment_rows=SENSOR_ARCHIVE_SEGMENT_ROWS,
+            flush_seconds=SENSOR_ARCHIVE_FLUSH_SECONDS,
+            resume=resume
+        ) if SENSOR_ARCHIVE_ENABLED else None
+    )
+
+
+def attach_session(state: Dict[str, Any], resume: bool) -> Dict[str, Any]:
+    """在本进程为持有租约的会话建立运行时（缓冲区、确认合并状态、滚动摘要）"""
+    session = {
+        **state,
+        'buffers': new_session_buffers(state['recording_id'], resume=resume),
+        'batch_ack': {'last': 0.0, 'batches': 0, 'samples': 0, 'seq': None},
+        'sids': set()
+    }
+    active_sessions[state['session_id']] = session
+    checkpoint = state.get('live_summary_state')
+    if checkpoint is None and state.get('live_summary'):
+        # Sessions saved before checkpoints were kept: carry the summary as the first partial
+        checkpoint = {'partials': [state['live_summary']], 'summary': state['live_summary']}
+    live_summarizer.start(state['recording_id'], checkpoint)
+    return session
+
+
+def save_live_summary_state(session: Dict[str, Any], write_through: bool = False):
+    """把滚动摘要的中间结果（各段部分摘要与未处理的转录片段）写入共享会话状态"""
+    checkpoint = live_summarizer.checkpoint(session['recording_id'])
+    if checkpoint is None:
+        return
+    if write_through:
+        session_store.set(session['session_id'], live_summary_state=checkpoint)
+    else:
+        session_store.update(session['session_id'], live_summary_state=checkpoint)
+
+
+@contextmanager
+def adoption_lock(session_id: str):
+    """按会话串行化接管：等待移交只阻塞同一会话的事件，不影响其他会话"""
+    with session_adoption_lock:
+        entry = session_adoption_locks.setdefault(session_id, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with session_adoption_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                session_adoption_locks.pop(session_id, None)
+
+
+def adopt_session(session_id: str, wait: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    接管共享状态中的会话：租约过期（原进程已退出）时直接认领；
+    原持有进程的客户端已断开时请求其移交并等待释放（最多 SESSION_HANDOFF_TIMEOUT 秒）；
+    客户端仍连在原进程上（旧标签页、重复连接）时不抢占，抛出 SessionBusyError 由客户端稍后重试
+    """
+    state = session_store.get(session_id)
+    if state is None:
+        return None
+    previous = state.get('worker')
+    if not session_store.claim(session_id, WORKER_TOKEN, SESSION_LEASE_SECONDS):
+        if not wait:
+            return None
+        if state.get('status') != 'disconnected':
+            raise SessionBusyError(session_id, state['recording_id'])
+        session_store.set(session_id, handoff=WORKER_TOKEN)
+        deadline = time.monotonic() + SESSION_HANDOFF_TIMEOUT
+        while not session_store.claim(session_id, WORKER_TOKEN, SESSION_LEASE_SECONDS):
+            if time.monotonic() >= deadline:
+                logger.warning(f"⚠️ Worker {previous} did not hand over session {session_id}")
+                raise SessionBusyError(session_id, state['recording_id'])
+            socketio.sleep(0.2)
+        state = session_store.get(session_id)
+        if state is None:
+            return None
+    state.update(worker=WORKER_TOKEN, handoff=None)
+    session = attach_session(state, resume=True)
+    logger.info(f"🔁 Adopted session {session_id} (recording {state['recording_id']}) from {previous or 'no worker'}")
+    return session
+
+
+def live_session(session_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    事件所属的会话：本进程持有则直接返回，否则从共享状态接管；并把当前连接绑定到会话。
+    会话仍在其他进程上与客户端连接时抛出 SessionBusyError
+    """
+    if not session_id:
+        return None
+    session = active_sessions.get(session_id)
+    if session is None:
+        with adoption_lock(session_id):
+            session = active_sessions.get(session_id) or adopt_session(session_id)
+        if session is None:
+            return None
+    if request.sid not in session['sids']:
+        session['sids'].add(request.sid)
+        socket_sessions[request.sid] = session_id
+        join_room(session['recording_id'])
+    if session.get('status') != 'active':
+        session.update(status='active', disconnected_at=None)
+        session_store.set(session_id, status='active', disconnected_at=None)
+    return session
+
+
+def note_activity(session: Dict[str, Any], counter: Optional[str] = None):
+    """更新会话计数与最近活动时间（写后批量落盘，不阻塞事件处理）"""
+    fields = {'last_seen': time.time()}
+    if counter:
+        fields[counter] = (session.get(counter) or 0) + 1
+    session.update(fields)
+    session_store.update(session['session_id'], **fields)
+
+
+def finalize_session(session: Dict[str, Any], status: str) -> Dict[str, Any]:
+    """结束会话：移出本进程、写入会议存储并删除共享状态"""
+    active_sessions.pop(session['session_id'], None)
+    flow_control.forget(session['session_id'])
+    for sid in session['sids']:
+        socket_sessions.pop(sid, None)
+    return record_meeting(session, status)
+
+
+def release_session(session: Dict[str, Any]):
+    """把会话交还共享状态（归档落盘、释放租约），由请求移交的工作进程接管"""
+    if active_sessions.get(session['session_id']) is not session:
+        return
+    active_sessions.pop(session['session_id'])
+    flow_control.forget(session['session_id'])
+    for sid in session['sids']:
+        socket_sessions.pop(sid, None)
+    # The adopting worker resumes the rolling summary from this checkpoint
+    save_live_summary_state(session, write_through=True)
+    live_summarizer.discard(session['recording_id'])
+    if session['buffers'].archive is not None:
+        session['buffers'].archive.flush()
+    session_store.release(session['session_id'], WORKER_TOKEN)
+    logger.info(f"🔁 Released session {session['session_id']} (recording {session['recording_id']})")
+
+
+def reap_sessions():
+    """
+    续租本进程持有的会话、响应移交请求、结束超过 SESSION_RESUME_GRACE
+    仍未恢复的会话，并认领租约已过期的无主会话（原工作进程已退出）
+    """
+    local = list(active_sessions.items())
+    states = {state['session_id']: state for state in session_store.list()}
+    now = time.time()
+
+    renew = []
+    for session_id, session in local:
+        state = states.get(session_id)
+        if state is None:
+            continue  # ended meanwhile
+        if state.get('worker') != WORKER_TOKEN or state.get('handoff'):
+            release_session(session)
+        elif (not session['sids'] and session.get('status') == 'disconnected'
+                and now - (session.get('disconnected_at') or now) >= SESSION_RESUME_GRACE):
+            live_summarizer.discard(session['recording_id'])
+            finalize_session(session, 'interrupted')
+            logger.info(f"♻️ Session {session['recording_id']} was not resumed; recorded as interrupted")
+        else:
+            renew.append(session_id)
+    session_store.renew(renew, WORKER_TOKEN, SESSION_LEASE_SECONDS)
+
+    for session_id, state in states.items():
+        if session_id in active_sessions or (state.get('lease_until') or 0) >= now:
+            continue
+        idle_since = max(state.get('disconnected_at') or 0, state.get('last_seen') or 0)
+        if now - idle_since < SESSION_RESUME_GRACE:
+            continue  # its client may still resume it on any worker
+        with adoption_lock(session_id):
+            if session_id in active_sessions:
+                continue
+            if storage.get_meeting(state['recording_id']) is not None:
+                session_store.delete(session_id)
+                continue
+            session = adopt_session(session_id, wait=False)
+        if session is not None:
+            finalize_session(session, 'interrupted')
+            logger.info(f"♻️ Recovered interrupted session: {state['recording_id']}")
+
+
+def session_reaper():
+    while True:
+        try:
+            reap_sessions()
+        except Exception as e:
+            logger.error(f"❌ Session reaper failed: {str(e)}", exc_info=True)
+        socketio.sleep(SESSION_REAPER_INTERVAL)
+
+
+socketio.start_background_task(session_reaper)
+
+
+def scheduling_lag_probe():
+    """定时睡眠的超时量即事件循环（或 GIL）积压，计入流控负载"""
+    while True:
+        started = time.monotonic()
+        socketio.sleep(FLOW_LAG_INTERVAL)
+        flow_control.record_lag(time.monotonic() - started - FLOW_LAG_INTERVAL)
+
+
+socketio.start_background_task(scheduling_lag_probe)
+
+
 # ============================================================================
 # WebSocket Event Handlers
 # ============================================================================
 
-@socketio.on('connect')
-def handle_connect():
-    """处理WebSocket连接"""
+def emit_session_busy(error: SessionBusyError):
+    """会话仍由其他工作进程服务：通知客户端稍后重试（session_resume）"""
+    logger.warning(f"⚠️ {error}")
+    emit('session_busy', {
+        'sessionId': error.session_id,
+        'recordingId': error.recording_id,
+        'retryAfterMs': int(SESSION_REAPER_INTERVAL * 1000)
+    })
+
+
+@socket_event('connect')
+def handle_connect(auth=None):
+    """处理WebSocket连接（可选 auth.token / ?token= 在连接时验证一次）"""
+    token = (auth or {}).get('token') if isinstance(auth, dict) else None
+    token = token or request.args.get('token')
+    username = None
+    if token:
+        try:
+            identity = verify_jwt_token(token)
+        except ValueError as e:
+            logger.warning(f"❌ WebSocket connection rejected: {str(e)}")
+            return False
+        socket_identities[request.sid] = identity
+        username = identity['username']
+    
     logger.info("="*60)
     logger.info("🔌 WebSocket client connected")
     logger.info(f"   Session ID: {request.sid}")
+    logger.info(f"   User: {username or 'anonymous'}")
     logger.info("="*60)
     
     emit('connected', {
         'status': 'connected',
         'session_id': request.sid,
+        'user': username,
         'timestamp': datetime.now().isoformat()
     })
 
 
-@socketio.on('disconnect')
+@socket_event('disconnect')
 def handle_disconnect():
     """处理WebSocket断开"""
     logger.info("="*60)
     logger.info("🔌 WebSocket client disconnected")
     logger.info(f"   Session ID: {request.sid}")
+    socket_identities.pop(request.sid, None)
     
-    # 清理活动会话
-    if request.sid in active_sessions:
-        session_data = active_sessions.pop(request.sid)
-        logger.info(f"   Cleaned up session: {session_data.get('recording_id')}")
+    # 会话保留 SESSION_RESUME_GRACE 秒等待客户端重连（session_resume），超时后记为 interrupted
+    session = active_sessions.get(socket_sessions.pop(request.sid, None))
+    if session is not None:
+        session['sids'].discard(request.sid)
+        if not session['sids']:
+            session.update(status='disconnected', disconnected_at=time.time())
+            session_store.set(session['session_id'], status='disconnected', disconnected_at=session['disconnected_at'])
+            if session['buffers'].archive is not None:
+                session['buffers'].archive.flush()
+            logger.info(f"   Session {session['recording_id']} awaiting resume for {SESSION_RESUME_GRACE:.0f}s")
     
     logger.info("="*60)
 
 
-@socketio.on('session_start')
+@socket_event('session_start')
 def handle_session_start(data):
     """处理会话开始"""
     try:
@@ -768,21 +2579,32 @@ def handle_session_start(data):
         logger.info(f"   Client SID: {request.sid}")
         logger.info(f"   Meeting Title: {data.get('meetingTitle', 'Untitled')}")
         
-        # 生成会话和录制ID
-        session_id = request.sid
+        # 生成会话和录制ID（与连接无关，断线重连后可继续使用）
+        session_id = uuid.uuid4().hex
         recording_id = str(uuid.uuid4())
         
-        # 保存会话数据
-        active_sessions[session_id] = {
+        # 共享会话状态（任一工作进程均可读取与接管）
+        now = time.time()
+        state = {
+            'session_id': session_id,
             'recording_id': recording_id,
+            'owner': socket_user(data),
             'meeting_title': data.get('meetingTitle', 'Untitled Meeting'),
             'start_time': datetime.now().isoformat(),
-            'sensor_data': [],
-            'keyframes': []
+            'worker': WORKER_TOKEN,
+            'status': 'active',
+            'lease_until': now + SESSION_LEASE_SECONDS,
+            'handoff': None,
+            'sensor_data_count': 0,
+            'keyframe_count': 0,
+            'last_seen': now,
+            'live_summary': None
         }
+        session_store.create(state)
         
-        # 将客户端加入房间
-        join_room(recording_id)
+        # 本进程运行时（缓冲区、滚动摘要），并将客户端加入房间
+        attach_session(state, resume=False)
+        live_session(session_id)
         
         logger.info(f"✅ Session started successfully")
         logger.info(f"   Recording ID: {recording_id}")
@@ -803,33 +2625,91 @@ def handle_session_start(data):
         })
 
 
-@socketio.on('sensor_data')
+@socket_event('session_resume')
+def handle_session_resume(data):
+    """
+    断线重连（或切换到其他工作进程）后继续录制
+    
+    Expected data format:
+    {
+        "recordingId": "...",
+        "sessionId": "...",   # optional for the owner's own sessions
+        "token": "..."        # optional, when the socket was not authenticated at connect
+    }
+    """
+    try:
+        session_id = data.get('sessionId')
+        recording_id = data.get('recordingId')
+        
+        state = session_store.get(session_id) if session_id else None
+        if state is None and recording_id:
+            state = session_store.find(recording_id)
+        if state is None or (recording_id and state['recording_id'] != recording_id):
+            logger.warning(f"⚠️ Resume requested for unknown session: {recording_id or session_id}")
+            emit('error', {'message': 'Session not found', 'recordingId': recording_id})
+            return
+        
+        # sessionId 本身即凭证；只给出 recordingId 时需是会话所有者
+        owner = state.get('owner')
+        if session_id != state['session_id'] and (owner is None or socket_user(data) != owner):
+            logger.warning(f"⚠️ Resume of {state['recording_id']} refused")
+            emit('error', {'message': 'Not allowed to resume this session', 'recordingId': recording_id})
+            return
+        
+        session = live_session(state['session_id'])
+        if session is None:
+            emit('error', {'message': 'Session not found', 'recordingId': state['recording_id']})
+            return
+        
+        logger.info(f"▶️ Session resumed: {session['recording_id']} (client {request.sid})")
+        emit('session_resumed', {
+            'sessionId': session['session_id'],
+            'recordingId': session['recording_id'],
+            'sensor_data_count': session.get('sensor_data_count') or 0,
+            'keyframe_count': session.get('keyframe_count') or 0,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except SessionBusyError as e:
+        emit_session_busy(e)
+    except Exception as e:
+        logger.error(f"❌ Error resuming session: {str(e)}", exc_info=True)
+        emit('error', {
+            'message': 'Failed to resume session',
+            'error': str(e)
+        })
+
+
+@socket_event('sensor_data')
 def handle_sensor_data(data):
     """处理传感器数据"""
     try:
         session_id = data.get('sessionId')
+        session = live_session(session_id)
         
-        if session_id not in active_sessions:
+        if session is None:
             logger.warning(f"⚠️ Sensor data received for inactive session: {session_id}")
             emit('error', {'message': 'Invalid session'})
             return
         
-        # 限制内存使用：最多保存1000个数据点
-        MAX_DATA_POINTS = 1000
-        session_data = active_sessions[session_id]['sensor_data']
+        admission = admit_sensor_event(session_id)
+        if not admission.admitted:
+            return
         
-        # 保存传感器数据
-        session_data.append({
-            'timestamp': datetime.now().isoformat(),
-            'data': data
-        })
+        # 保存到定长环形缓冲区（超出容量时 O(1) 覆盖最旧数据）
+        with flow_control.track():
+            buffers = session['buffers']
+            new_points = buffers.add_sensor_event(data)
+            store_sensor_row(session)
+            note_activity(session, 'sensor_data_count')
         
-        # 如果超过限制，删除最旧的数据
-        if len(session_data) > MAX_DATA_POINTS:
-            removed = session_data.pop(0)
-            logger.debug(f"📦 Removed oldest sensor data point to maintain memory limit")
+        # 负载升高时先省掉确认与调试日志
+        if admission.level != NORMAL:
+            return
         
-        logger.debug(f"📊 Sensor data received for session {session_id} (total: {len(session_data)})")
+        logger.debug("📊 Sensor data received for session %s (total: %d, new IMU points: %d)",
+                     session_id, len(buffers.samples), new_points,
+                     extra={'event': 'sensor_data', 'session_id': session_id})
         
         # 发送处理确认
         emit('sensor_data_received', {
@@ -837,6 +2717,8 @@ def handle_sensor_data(data):
             'timestamp': datetime.now().isoformat()
         })
         
+    except SessionBusyError as e:
+        emit_session_busy(e)
     except Exception as e:
         logger.error(f"❌ Error handling sensor data: {str(e)}", exc_info=True)
         emit('error', {
@@ -845,52 +2727,119 @@ def handle_sensor_data(data):
         })
 
 
-@socketio.on('keyframe')
-def handle_keyframe(data):
-    """处理关键帧"""
+@socket_event('sensor_batch')
+def handle_sensor_batch(data):
+    """
+    处理批量二进制传感器数据
+    
+    Expected data format:
+    {
+        "sessionId": "...",
+        "format": "imu-f32-v1",
+        "payload": <bytes: packed little-endian rows of t(f64 ms), ax, ay, az, ra, rb, rg (f32)>,
+        "appState": [{"timestamp": ..., "state": "active|background"}],  # optional
+        "seq": 42,                                                         # optional
+        "ack": false                                                       # optional, force an ack
+    }
+    """
     try:
         session_id = data.get('sessionId')
-        recording_id = data.get('recordingId')
+        session = live_session(session_id)
         
-        if session_id not in active_sessions:
-            logger.warning(f"⚠️ Keyframe received for inactive session: {session_id}")
+        if session is None:
+            logger.warning(f"⚠️ Sensor batch received for inactive session: {session_id}")
             emit('error', {'message': 'Invalid session'})
             return
         
-        logger.info("="*60)
-        logger.info("🖼️ Keyframe received")
-        logger.info(f"   Session: {session_id}")
-        logger.info(f"   Recording: {recording_id}")
+        if data.get('format', IMU_BATCH_FORMAT) != IMU_BATCH_FORMAT:
+            emit('error', {'message': f"Unsupported sensor batch format: {data.get('format')}"})
+            return
         
-        # 限制内存使用：最多保存100个关键帧
-        MAX_KEYFRAMES = 100
-        keyframes = active_sessions[session_id]['keyframes']
+        payload = data.get('payload') or b''
+        if not isinstance(payload, (bytes, bytearray, memoryview)):
+            emit('error', {'message': 'Sensor batch payload must be binary'})
+            return
         
-        # 保存关键帧
-        keyframe_data = {
-            'timestamp': datetime.now().isoformat(),
-            'source': data.get('source', 'REAR'),
-            'change_detected': data.get('sceneChange', {}).get('changed', False),
-            'attention_score': data.get('attention', {}).get('score', 0)
-        }
+        admission = admit_sensor_event(session_id)
+        if not admission.admitted:
+            return
         
-        keyframes.append(keyframe_data)
+        with flow_control.track():
+            new_points = session['buffers'].add_imu_batch(bytes(payload), data.get('appState'), gaze=data.get('gaze'))
+            store_sensor_row(session)
+            note_activity(session, 'sensor_data_count')
+        
+        # 合并确认：每个时间窗口最多发送一次 ack；负载升高时只回应客户端明确要求的 ack
+        ack = session['batch_ack']
+        ack['batches'] += 1
+        ack['samples'] += new_points
+        ack['seq'] = data.get('seq', ack['seq'])
+        now = time.monotonic()
+        if data.get('ack') or (admission.level == NORMAL and now - ack['last'] >= SENSOR_ACK_INTERVAL):
+            emit('sensor_batch_received', {
+                'status': 'received',
+                'batches': ack['batches'],
+                'samples': ack['samples'],
+                'lastSeq': ack['seq'],
+                'timestamp': time.time()
+            })
+            ack['last'] = now
+            ack['batches'] = 0
+            ack['samples'] = 0
+        
+    except BatchFormatError as e:
+        logger.warning(f"⚠️ Malformed sensor batch: {str(e)}")
+        emit('error', {'message': 'Malformed sensor batch', 'error': str(e)})
+    except SessionBusyError as e:
+        emit_session_busy(e)
+    except Exception as e:
+        logger.error(f"❌ Error handling sensor batch: {str(e)}", exc_info=True)
+        emit('error', {
+            'message': 'Failed to process sensor batch',
+            'error': str(e)
+        })
+
+
+@socket_event('keyframe')
+def handle_keyframe(data):
+    """处理关键帧"""
+    try:
+        session_id = data.get('sessionId')
+        session = live_session(session_id)
         
-        # 如果超过限制，删除最旧的关键帧
-        if len(keyframes) > MAX_KEYFRAMES:
-            removed = keyframes.pop(0)
-            logger.debug(f"📦 Removed oldest keyframe to maintain memory limit")
+        if session is None:
+            logger.warning(f"⚠️ Keyframe received for inactive session: {session_id}")
+            emit('error', {'message': 'Invalid session'})
+            return
         
-        logger.info(f"✅ Keyframe saved (total: {len(keyframes)})")
-        logger.info("="*60)
+        # 图像去重后存入内容寻址存储（重复幻灯片只保存一次）
+        received_at = time.time()
+        recording_id = session['recording_id']
+        image = keyframe_image_bytes(data)
+        stored = keyframe_store.add(recording_id, image, received_at) if image else None
+        
+        # 保存关键帧元数据到环形缓冲区
+        buffers = session['buffers']
+        buffers.add_keyframe(data, received_at=received_at, duplicate=bool(stored and stored['duplicate']))
+        note_activity(session, 'keyframe_count')
+        
+        logger.info("🖼️ Keyframe saved for %s (total: %d, image: %s)", recording_id, len(buffers.keyframes),
+                    stored and ('duplicate' if stored['duplicate'] else 'new'),
+                    extra={'event': 'keyframe', 'session_id': session_id})
         
         # 发送处理确认
         emit('keyframe_received', {
             'status': 'received',
-            'keyframe_count': len(keyframes),
+            'keyframe_count': len(buffers.keyframes),
+            'image': stored,
             'timestamp': datetime.now().isoformat()
         })
         
+    except (KeyframeImageError, binascii.Error) as e:
+        logger.warning(f"⚠️ Rejected keyframe image: {str(e)}")
+        emit('error', {'message': 'Invalid keyframe image', 'error': str(e)})
+    except SessionBusyError as e:
+        emit_session_busy(e)
     except Exception as e:
         logger.error(f"❌ Error handling keyframe: {str(e)}", exc_info=True)
         emit('error', {
@@ -899,47 +2848,129 @@ def handle_keyframe(data):
         })
 
 
-@socketio.on('session_end')
+@socket_event('transcript_segment')
+def handle_transcript_segment(data):
+    """处理转录片段（用于滚动摘要）"""
+    try:
+        session_id = data.get('sessionId')
+        session = live_session(session_id)
+        
+        if session is None:
+            logger.warning(f"⚠️ Transcript received for inactive session: {session_id}")
+            emit('error', {'message': 'Invalid session'})
+            return
+        
+        # 支持单条片段或 segments 列表
+        segments = data.get('segments')
+        if segments is None:
+            segments = [{
+                'start': data.get('start'),
+                'speaker': data.get('speaker'),
+                'text': data.get('text', '')
+            }]
+        
+        recording_id = session['recording_id']
+        accepted = live_summarizer.add_segments(recording_id, segments)
+        if accepted:
+            save_live_summary_state(session)
+        note_activity(session)
+        
+        logger.debug("🗣️ %d transcript segment(s) buffered for %s", accepted, recording_id,
+                     extra={'event': 'transcript_segment', 'session_id': session_id})
+        
+        emit('transcript_received', {
+            'status': 'received',
+            'accepted': accepted,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+    except SessionBusyError as e:
+        emit_session_busy(e)
+    except Exception as e:
+        logger.error(f"❌ Error handling transcript segment: {str(e)}", exc_info=True)
+        emit('error', {
+            'message': 'Failed to process transcript segment',
+            'error': str(e)
+        })
+
+
+@socket_event('subscribe_job')
+def handle_subscribe_job(data):
+    """订阅媒体处理作业完成事件（job_update）"""
+    try:
+        job_ids = data.get('jobIds') or [data.get('jobId')]
+        for job_id in [j for j in job_ids if j]:
+            # Join before reading the status so a completion in between is not missed
+            join_room(f"job_{job_id}")
+            job = media_queue.get(job_id)
+            if job is None:
+                leave_room(f"job_{job_id}")
+                emit('error', {'message': 'Job not found', 'jobId': job_id})
+                continue
+            # Already finished before the client subscribed: answer right away
+            if job['status'] not in (JOB_QUEUED, JOB_RUNNING):
+                job.pop('notify_room', None)
+                emit('job_update', {'timestamp': datetime.now().isoformat(), **job})
+        
+    except Exception as e:
+        logger.error(f"❌ Error subscribing to job: {str(e)}", exc_info=True)
+        emit('error', {
+            'message': 'Failed to subscribe to job',
+            'error': str(e)
+        })
+
+
+@socket_event('session_end')
 def handle_session_end(data):
     """处理会话结束"""
     try:
         session_id = data.get('sessionId')
-        recording_id = data.get('recordingId')
+        session_data = live_session(session_id)
         
-        if session_id not in active_sessions:
+        if session_data is None:
             logger.warning(f"⚠️ Session end for inactive session: {session_id}")
             emit('error', {'message': 'Invalid session'})
             return
         
+        # 以会话状态中的录制 ID 为准，不信任客户端传来的 recordingId
+        recording_id = session_data['recording_id']
+        
         logger.info("="*60)
         logger.info("🛑 Session end request received")
         logger.info(f"   Session: {session_id}")
         logger.info(f"   Recording: {recording_id}")
         
-        # 获取会话数据
-        session_data = active_sessions[session_id]
+        buffers = session_data['buffers']
         
-        # 保存到数据库（这里保存到内存中的meetings_db）
-        meetings_db[recording_id] = {
-            'recording_id': recording_id,
-            'meeting_title': session_data['meeting_title'],
-            'start_time': session_data['start_time'],
-            'end_time': datetime.now().isoformat(),
-            'sensor_data_count': len(session_data['sensor_data']),
-            'keyframe_count': len(session_data['keyframes']),
-            'status': 'completed'
-        }
+        # 保存到持久化存储
+        meeting = finalize_session(session_data, 'completed')
+        storage.flush()
         
         logger.info(f"✅ Session data saved to database")
-        logger.info(f"   Sensor data points: {len(session_data['sensor_data'])}")
-        logger.info(f"   Keyframes: {len(session_data['keyframes'])}")
+        logger.info(f"   Sensor data points: {len(buffers.samples)} (IMU points: {len(buffers.imu)})")
+        logger.info(f"   Keyframes: {len(buffers.keyframes)}")
+        
+        # 最终摘要只需对剩余片段做一次小规模 reduce，异步完成后推送给客户端
+        final_future = live_summarizer.finish(recording_id)
+        if final_future is not None:
+            client_sid = request.sid
+            
+            def _send_final(future):
+                if future.cancelled() or future.exception() is not None or not future.result():
+                    return
+                socketio.emit('summary_update', {
+                    'meeting_id': recording_id,
+                    'live': False,
+                    'done': True,
+                    'summary': future.result(),
+                    'generated_at': datetime.now().isoformat()
+                }, to=client_sid)
+            
+            final_future.add_done_callback(_send_final)
         
         # 离开房间
         leave_room(recording_id)
         
-        # 清理活动会话
-        active_sessions.pop(session_id)
-        
         logger.info("="*60)
         
         # 发送会话结束确认
@@ -947,34 +2978,18 @@ def handle_session_end(data):
             'status': 'completed',
             'recordingId': recording_id,
             'summary': {
-                'sensor_data_count': meetings_db[recording_id]['sensor_data_count'],
-                'keyframe_count': meetings_db[recording_id]['keyframe_count'],
+                'sensor_data_count': meeting['sensor_data_count'],
+                'keyframe_count': meeting['keyframe_count'],
                 'duration': 'calculated_duration'
             },
             'timestamp': datetime.now().isoformat()
         })
         
+    except SessionBusyError as e:
+        emit_session_busy(e)
     except Exception as e:
         logger.error(f"❌ Error ending session: {str(e)}", exc_info=True)
         emit('error', {
             'message': 'Failed to end session',
             'error': str(e)
         })
-
-
-if __name__ == "__main__":
-    logger.info("="*80)
-    logger.info("🚀 Starting Flask server with WebSocket support...")
-    logger.info(f"   Host: {FLASK_HOST}")
-    logger.info(f"   Port: {FLASK_PORT}")
-    logger.info(f"   Debug: {FLASK_DEBUG}")
-    logger.info("="*80)
-    
-    # Use socketio.run instead of app.run for WebSocket support
-    socketio.run(
-        app,
-        host=FLASK_HOST,
-        port=FLASK_PORT,
-        debug=FLASK_DEBUG,
-        allow_unsafe_werkzeug=True  # For development only
-    )
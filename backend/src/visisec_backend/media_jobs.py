@@ -0,0 +1,516 @@
+"""
+VisiSec Media Job Executor
+CPU 密集型媒体处理（关键帧提取、缩略图、音频特征）的多进程作业池，按时间分段并行
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import atexit
+import logging
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import wave
+
+import cv2
+import numpy as np
+
+from .keyframes import KeyframeExtractor
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+FINISHED_STATES = (JOB_COMPLETED, JOB_FAILED, JOB_CANCELLED)
+
+AUDIO_WINDOW_SECONDS = 0.5
+AUDIO_SPEECH_DB = -35.0     # windows louder than this (dBFS) count as speech
+
+
+# ----------------------------------------------------------------------
+# Segment tasks (run inside worker processes)
+#
+# Each task processes [start, end) seconds of one media file and returns a
+# plain dict; ``cancel_path`` is a marker file whose existence asks the
+# task to stop early.
+# ----------------------------------------------------------------------
+
+def _cancel_requested(cancel_path: str) -> Callable[[], bool]:
+    return lambda: os.path.exists(cancel_path)
+
+
+def _keyframes_segment(path: str, start: float, end: Optional[float], params: Dict[str, Any], cancel_path: str) -> Dict[str, Any]:
+    extractor = KeyframeExtractor(**params['extractor'])
+    # Later segments start one stride early so their first frame is only a
+    # reference for diffing, not a spurious "initial" keyframe
+    first = start <= params.get('job_start', 0.0)
+    return extractor.extract(
+        path,
+        start_time=start if first else max(0.0, start - params.get('warmup', 0.0)),
+        end_time=end,
+        save_dir=params.get('save_dir'),
+        emit_initial=first,
+        should_stop=_cancel_requested(cancel_path)
+    )
+
+
+def _thumbnails_segment(path: str, start: float, end: Optional[float], params: Dict[str, Any], cancel_path: str) -> Dict[str, Any]:
+    interval = params.get('interval', 10.0)
+    width = params.get('width', 320)
+    save_dir = params['save_dir']
+    os.makedirs(save_dir, exist_ok=True)
+    should_stop = _cancel_requested(cancel_path)
+
+    thumbnails = []
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        timestamp = math.ceil(start / interval) * interval
+        while end is None or timestamp < end:
+            if should_stop():
+                return {'thumbnails': thumbnails, 'cancelled': True}
+            capture.set(cv2.CAP_PROP_POS_FRAMES, int(round(timestamp * fps)))
+            ok, frame = capture.read()
+            if not ok:
+                break
+            height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+            small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            image_path = os.path.join(save_dir, f"thumb_{int(timestamp * 1000):09d}.jpg")
+            cv2.imwrite(image_path, small, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            thumbnails.append({
+                'timestamp': round(timestamp, 3),
+                'image_path': image_path,
+                'width': width,
+                'height': height
+            })
+            timestamp += interval
+    finally:
+        capture.release()
+    return {'thumbnails': thumbnails, 'cancelled': False}
+
+
+def _audio_features_segment(path: str, start: float, end: Optional[float], params: Dict[str, Any], cancel_path: str) -> Dict[str, Any]:
+    window_seconds = params.get('window_seconds', AUDIO_WINDOW_SECONDS)
+    should_stop = _cancel_requested(cancel_path)
+
+    with wave.open(path, 'rb') as wav:
+        rate = wav.getframerate()
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        if width not in (1, 2, 4):
+            raise ValueError(f"Unsupported sample width: {width * 8} bit")
+        first = int(round(start * rate))
+        last = wav.getnframes() if end is None else min(wav.getnframes(), int(round(end * rate)))
+        window = max(1, int(round(window_seconds * rate)))
+        wav.setpos(min(first, wav.getnframes()))
+
+        rms_db: List[np.ndarray] = []
+        zcr: List[np.ndarray] = []
+        position = first
+        # Read ~60 s at a time so memory stays flat on long recordings
+        block = window * max(1, int(60 / window_seconds))
+        while position < last:
+            if should_stop():
+                return {'rms_db': [], 'zcr': [], 'cancelled': True}
+            count = min(block, last - position)
+            raw = wav.readframes(count)
+            if not raw:
+                break
+            dtype = {1: np.uint8, 2: '<i2', 4: '<i4'}[width]
+            samples = np.frombuffer(raw, dtype=dtype).astype(np.float32)
+            if width == 1:
+                samples = samples - 128.0
+            samples /= float(2 ** (8 * width - 1))
+            samples = samples.reshape(-1, channels).mean(axis=1)
+
+            n_windows = int(math.ceil(len(samples) / window))
+            padded = np.zeros(n_windows * window, dtype=np.float32)
+            padded[:len(samples)] = samples
+            frames = padded.reshape(n_windows, window)
+            rms = np.sqrt(np.mean(frames * frames, axis=1))
+            rms_db.append(20 * np.log10(np.maximum(rms.astype(np.float64), 1e-6)))
+            signs = np.signbit(frames)
+            zcr.append(np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / window)
+            position += len(samples)
+
+    return {
+        'rms_db': np.round(np.concatenate(rms_db), 2).tolist() if rms_db else [],
+        'zcr': np.round(np.concatenate(zcr), 4).tolist() if zcr else [],
+        'cancelled': False
+    }
+
+
+def _merge_keyframes(parts: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    min_interval = params['extractor'].get('min_interval_seconds', 0.0)
+    keyframes: List[Dict[str, Any]] = []
+    for part in parts:
+        for keyframe in part['keyframes']:
+            # Segments are independent, so re-apply the spacing rule across boundaries
+            if keyframes and keyframe['timestamp'] - keyframes[-1]['timestamp'] < min_interval:
+                continue
+            keyframes.append(keyframe)
+    stats = [part['stats'] for part in parts]
+    return {
+        'keyframes': keyframes,
+        'stats': {
+            'fps': stats[0]['fps'] if stats else None,
+            'frames_read': sum(s['frames_read'] for s in stats),
+            'frames_analyzed': sum(s['frames_analyzed'] for s in stats),
+            'cpu_seconds': round(sum(s['elapsed_seconds'] for s in stats), 3)
+        }
+    }
+
+
+def _merge_thumbnails(parts: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    return {'thumbnails': [thumb for part in parts for thumb in part['thumbnails']]}
+
+
+def _merge_audio_features(parts: List[Dict[str, Any]], params: Dict[str, Any]) -> Dict[str, Any]:
+    rms_db = [value for part in parts for value in part['rms_db']]
+    zcr = [value for part in parts for value in part['zcr']]
+    speech = np.asarray(rms_db) > AUDIO_SPEECH_DB
+    return {
+        'window_seconds': params.get('window_seconds', AUDIO_WINDOW_SECONDS),
+        'rms_db': rms_db,
+        'zcr': zcr,
+        'speech_ratio': round(float(speech.mean()), 4) if speech.size else 0.0,
+        'mean_db': round(float(np.mean(rms_db)), 2) if rms_db else None
+    }
+
+
+# kind -> (segment task, merge function)
+TASKS: Dict[str, Tuple[Callable[..., Dict[str, Any]], Callable[..., Dict[str, Any]]]] = {
+    'keyframes': (_keyframes_segment, _merge_keyframes),
+    'thumbnails': (_thumbnails_segment, _merge_thumbnails),
+    'audio_features': (_audio_features_segment, _merge_audio_features),
+}
+
+
+def probe_duration(path: str, kind: str) -> Optional[float]:
+    """Media duration in seconds (None if the container does not say)"""
+    if kind == 'audio_features':
+        try:
+            with wave.open(path, 'rb') as wav:
+                return wav.getnframes() / float(wav.getframerate())
+        except (wave.Error, EOFError) as e:
+            raise ValueError(f"Audio features require PCM WAV input: {str(e)}")
+    capture = cv2.VideoCapture(path)
+    try:
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {path}")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+        frames = capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0.0
+        return frames / fps if fps and frames else None
+    finally:
+        capture.release()
+
+
+# ----------------------------------------------------------------------
+# Parent-side job tracking
+# ----------------------------------------------------------------------
+
+class MediaJob:
+    """One submitted job, split into time segments"""
+
+    def __init__(self, kind: str, media_id: str, path: str, params: Dict[str, Any], segments: List[Tuple[float, Optional[float]]], cancel_dir: str):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.media_id = media_id
+        self.path = path
+        self.params = params
+        self.segments = segments
+        self.cancel_path = os.path.join(cancel_dir, self.job_id)
+        self.status = JOB_QUEUED
+        self.results: List[Optional[Dict[str, Any]]] = [None] * len(segments)
+        self.futures: List[Future] = []
+        self.completed_segments = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.duration: Optional[float] = None
+        self.done = threading.Event()
+
+    def to_dict(self, include_result: bool = True) -> Dict[str, Any]:
+        status = self.status
+        if status == JOB_QUEUED and any(f.running() for f in self.futures):
+            status = JOB_RUNNING
+        data = {
+            'job_id': self.job_id,
+            'kind': self.kind,
+            'media_id': self.media_id,
+            'status': status,
+            'segments': len(self.segments),
+            'completed_segments': self.completed_segments,
+            'progress': round(self.completed_segments / len(self.segments), 4) if self.segments else 1.0,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'error': self.error
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class MediaJobExecutor:
+    """
+    Process-pool executor for CPU-heavy media work.
+
+    Work runs in separate processes, so decoding never holds the GIL of the
+    Flask/Socket.IO server. Long inputs are split into ``segment_seconds``
+    segments that run in parallel; results are merged in time order once
+    every segment finishes. The pool is created lazily on first use.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, segment_seconds: float = 300.0, max_history: int = 500):
+        self.max_workers = max(1, max_workers or os.cpu_count() or 1)
+        self.segment_seconds = max(1.0, segment_seconds)
+        self.max_history = max_history
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._jobs: Dict[str, MediaJob] = {}
+        self._lock = threading.Lock()
+        self._cancel_dir = tempfile.mkdtemp(prefix='visisec-jobs-')
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a multi-threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                logger.info(f"⚙️  Media worker pool started with {self.max_workers} processes")
+            return self._pool
+
+    def _split(
+        self, kind: str, start: float, end: Optional[float], params: Dict[str, Any]
+    ) -> List[Tuple[float, Optional[float]]]:
+        if end is None or end - start <= self.segment_seconds:
+            return [(start, end)]
+        length = self.segment_seconds
+        # Align segment boundaries to the sampling grid so the merged result
+        # covers the same frames/windows as a single pass would
+        if kind == 'keyframes':
+            grid = params['extractor'].get('stride_seconds', 0.5)
+        elif kind == 'audio_features':
+            grid = params.get('window_seconds', AUDIO_WINDOW_SECONDS)
+        else:
+            grid = params.get('interval', 10.0)
+        length = math.ceil(length / grid) * grid
+        count = int(math.ceil((end - start) / length))
+        return [(start + i * length, min(end, start + (i + 1) * length)) for i in range(count)]
+
+    def submit(
+        self,
+        kind: str,
+        media_id: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        start_time: float = 0.0,
+        end_time: Optional[float] = None,
+    ) -> MediaJob:
+        """Probe the input, split ``[start_time, end_time)`` into segments and queue them"""
+        if kind not in TASKS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        params = dict(params or {})
+        duration = probe_duration(path, kind)
+        if kind == 'keyframes':
+            params.setdefault('extractor', {})
+            params['warmup'] = params['extractor'].get('stride_seconds', 0.5)
+            params['job_start'] = max(0.0, start_time)
+
+        start_time = max(0.0, start_time)
+        if duration is not None:
+            end_time = duration if end_time is None else min(end_time, duration)
+        if end_time is not None and end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+
+        job = MediaJob(kind, media_id, path, params, self._split(kind, start_time, end_time, params), self._cancel_dir)
+        job.duration = (end_time - start_time) if end_time is not None else None
+        job.started_at = time.time()
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim_history()
+
+        task, _ = TASKS[kind]
+        try:
+            pool = self._get_pool()
+            for index, (start, end) in enumerate(job.segments):
+                future = pool.submit(task, path, start, end, params, job.cancel_path)
+                job.futures.append(future)
+                future.add_done_callback(lambda f, i=index: self._on_segment_done(job, i, f))
+        except BrokenProcessPool as e:
+            self._reset_pool()
+            self._finish(job, JOB_FAILED, error=f"Worker pool unavailable: {str(e)}")
+        if job.status in FINISHED_STATES:
+            # A segment failed while later ones were still being queued
+            for future in job.futures:
+                future.cancel()
+
+        logger.info(
+            f"⚙️  Queued {kind} job {job.job_id} for {media_id}: "
+            f"{len(job.segments)} segment(s), duration={duration}"
+        )
+        return job
+
+    def _reset_pool(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _on_segment_done(self, job: MediaJob, index: int, future: Future):
+        if job.status in FINISHED_STATES:
+            self._clear_cancel(job)
+            return
+        if future.cancelled():
+            self._finish(job, JOB_CANCELLED)
+            return
+        error = future.exception()
+        if error is not None:
+            if isinstance(error, BrokenProcessPool):
+                self._reset_pool()
+            logger.error(f"❌ Media job {job.job_id} segment {index} failed: {str(error)}")
+            self._finish(job, JOB_FAILED, error=str(error))
+            return
+
+        part = future.result()
+        with self._lock:
+            job.results[index] = part
+            job.completed_segments += 1
+            if job.status == JOB_QUEUED:
+                job.status = JOB_RUNNING
+            all_done = job.completed_segments == len(job.segments)
+        if part.get('cancelled'):
+            self._finish(job, JOB_CANCELLED)
+        elif all_done:
+            self._complete(job)
+
+    def _complete(self, job: MediaJob):
+        _, merge = TASKS[job.kind]
+        try:
+            result = merge(job.results, job.params)
+        except Exception as e:
+            logger.error(f"❌ Failed to merge media job {job.job_id}: {str(e)}", exc_info=True)
+            self._finish(job, JOB_FAILED, error=str(e))
+            return
+
+        elapsed = time.time() - job.started_at
+        stats = result.setdefault('stats', {})
+        stats.update({
+            'duration': job.duration,
+            'segments': len(job.segments),
+            'workers': self.max_workers,
+            'elapsed_seconds': round(elapsed, 3),
+            'realtime_factor': round(job.duration / elapsed, 1) if job.duration and elapsed > 0 else None
+        })
+        if 'frames_read' in stats:
+            stats['frames_per_second'] = round(stats['frames_read'] / elapsed, 1) if elapsed > 0 else None
+        job.result = result
+        self._finish(job, JOB_COMPLETED)
+        logger.info(f"✅ Media job {job.job_id} ({job.kind}) completed in {elapsed:.2f}s")
+
+    def _finish(self, job: MediaJob, status: str, error: Optional[str] = None):
+        with self._lock:
+            if job.status in FINISHED_STATES:
+                return
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            job.results = [None] * len(job.segments)
+        if status != JOB_COMPLETED:
+            # Stop sibling segments that are still queued or running
+            for future in job.futures:
+                future.cancel()
+            self._mark_cancel(job)
+        job.done.set()
+        self._clear_cancel(job)
+
+    def _mark_cancel(self, job: MediaJob):
+        try:
+            with open(job.cancel_path, 'w'):
+                pass
+        except OSError:
+            pass
+
+    def _clear_cancel(self, job: MediaJob):
+        # Running segments poll the marker; remove it only once none are left
+        if all(f.done() for f in job.futures):
+            try:
+                os.remove(job.cancel_path)
+            except OSError:
+                pass
+
+    def _trim_history(self):
+        if len(self._jobs) <= self.max_history:
+            return
+        for job_id in [j.job_id for j in self._jobs.values() if j.status in FINISHED_STATES]:
+            if len(self._jobs) <= self.max_history:
+                break
+            del self._jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[MediaJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def recent(self, limit: int = 50) -> List[MediaJob]:
+        """Most recent jobs first"""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        return sorted(jobs, key=lambda j: j.created_at, reverse=True)[:limit]
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel queued segments and signal running ones; False if already finished"""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED_STATES:
+            return False
+        self._mark_cancel(job)
+        self._finish(job, JOB_CANCELLED)
+        logger.info(f"🛑 Media job {job_id} cancelled")
+        return True
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[MediaJob]:
+        job = self.get(job_id)
+        if job is not None:
+            job.done.wait(timeout)
+        return job
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            status = job.to_dict(include_result=False)['status']
+            counts[status] = counts.get(status, 0) + 1
+        return {
+            'workers': self.max_workers,
+            'pool_started': self._pool is not None,
+            'segment_seconds': self.segment_seconds,
+            'jobs': counts
+        }
+
+    def shutdown(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        shutil.rmtree(self._cancel_dir, ignore_errors=True)
+
+
+def create_media_job_executor(max_workers: Optional[int], segment_seconds: float) -> MediaJobExecutor:
+    """Create the process-wide executor and register its shutdown hook"""
+    executor = MediaJobExecutor(max_workers=max_workers, segment_seconds=segment_seconds)
+    atexit.register(executor.shutdown)
+    return executor
@@ -0,0 +1,246 @@
+"""
+VisiSec Metrics
+Prometheus 文本格式指标：按线程分片的无锁计数器与延迟直方图、抓取时回调取值的仪表，以及进程内存/CPU 指标
+"""
+
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import math
+import os
+import threading
+import time
+
+from .native_threads import native_get_ident
+
+Labels = Tuple[str, ...]
+
+# Seconds; covers in-process handlers from sub-millisecond to a slow request
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPSTREAM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+HASH_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Resolved once: the backend is imported after gevent has patched threading
+_thread_ident = native_get_ident()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Shards:
+    """
+    One dict per OS thread, written by that thread only. Recording is a
+    plain dict update with no lock; a scrape copies every shard and sums
+    them, which may miss an increment still in progress but never loses one.
+    Under gevent all greenlets of a worker share the hub's thread and only
+    switch on I/O, so they can share its shard too.
+    """
+
+    def __init__(self):
+        self._by_thread: Dict[int, Dict[Labels, Any]] = {}
+
+    def local(self) -> Dict[Labels, Any]:
+        ident = _thread_ident()
+        shard = self._by_thread.get(ident)
+        if shard is None:
+            # setdefault is atomic under the GIL, so no lock even here
+            shard = self._by_thread.setdefault(ident, {})
+        return shard
+
+    def all(self) -> List[Dict[Labels, Any]]:
+        return [dict(shard) for shard in list(self._by_thread.values())]
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {_escape(self.documentation)}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._shards = _Shards()
+
+    def inc(self, amount: float = 1.0, labels: Labels = ()):
+        shard = self._shards.local()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def values(self) -> Dict[Labels, float]:
+        totals: Dict[Labels, float] = {}
+        for shard in self._shards.all():
+            for labels, value in shard.items():
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def samples(self):
+        for labels, value in sorted(self.values().items()):
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}'
+
+
+class Histogram(Metric):
+    """Per-bucket counts (not cumulative) plus the sum; bucket ``i`` holds values <= ``buckets[i]``"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._shards = _Shards()
+
+    def observe(self, value: float, labels: Labels = ()):
+        shard = self._shards.local()
+        row = shard.get(labels)
+        if row is None:
+            # len(buckets) finite buckets, the +Inf bucket, then the sum
+            row = shard[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def totals(self) -> Dict[Labels, List[float]]:
+        merged: Dict[Labels, List[float]] = {}
+        for shard in self._shards.all():
+            for labels, row in shard.items():
+                total = merged.get(labels)
+                if total is None:
+                    merged[labels] = list(row)
+                else:
+                    for i, value in enumerate(row):
+                        total[i] += value
+        return merged
+
+    def samples(self):
+        bounds = [_format_value(b) for b in self.buckets] + ['+Inf']
+        for labels, row in sorted(self.totals().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                le = 'le="' + bound + '"'
+                yield f'{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(row[-1])}'
+            yield f'{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Callback(Metric):
+    """
+    Value read at scrape time: ``fn()`` returns a number, or a dict of
+    label-value tuples to numbers; None leaves the metric empty.
+    """
+
+    def __init__(self, name, documentation, fn: Callable[[], Any], labelnames=(), kind: str = 'gauge'):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for labels, v in items:
+            yield f'{self.name}{_format_labels(self.labelnames, labels)} {_format_value(v)}'
+
+
+class Registry:
+    """Named metrics rendered together; registering a name again returns the existing metric"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Any:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric):
+                    raise ValueError(f"Metric {metric.name} already registered as {existing.kind}")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, fn: Callable[[], Any],
+                 labelnames: Sequence[str] = (), kind: str = 'gauge') -> Callback:
+        """Replaces an earlier callback of the same name (its closure may be stale)"""
+        metric = Callback(name, documentation, fn, labelnames, kind)
+        with self._lock:
+            self._metrics[name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        blocks = []
+        for metric in metrics:
+            try:
+                blocks.append(metric.render())
+            except Exception as e:
+                # One broken collector must not take the whole scrape down
+                blocks.append(f'# {metric.name} unavailable: {_escape(str(e))}')
+        return '\n'.join(blocks) + '\n'
+
+
+def _resident_bytes() -> Optional[float]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _open_fds() -> Optional[float]:
+    try:
+        return len(os.listdir('/proc/self/fd'))
+    except OSError:
+        return None
+
+
+def register_process_metrics(registry: Registry):
+    """Standard ``process_*`` metrics (memory and descriptors from /proc where available)"""
+    started = time.time()
+    registry.callback('process_resident_memory_bytes', 'Resident memory size in bytes.', _resident_bytes)
+    registry.callback('process_cpu_seconds_total', 'Total user and system CPU time spent in seconds.',
+                      lambda: sum(os.times()[:2]), kind='counter')
+    registry.callback('process_open_fds', 'Number of open file descriptors.', _open_fds)
+    registry.callback('process_start_time_seconds', 'Start time of the process since unix epoch in seconds.',
+                      lambda: started)
+
+
+# Process-wide registry; modules register their metrics at import time
+REGISTRY = Registry()
@@ -0,0 +1,60 @@
+"""
+VisiSec Native Threads
+gevent 猴子补丁下仍需真实系统线程的组件（bcrypt 线程池、asyncio 后台事件循环）所用的工具
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Optional
+import _thread
+import selectors
+import threading
+
+
+def green_threads() -> bool:
+    """True when gevent has monkey-patched ``threading`` (production server mode)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def native_get_ident() -> Callable[[], int]:
+    """``get_ident`` of the OS thread (the patched one returns a per-greenlet id under gevent)"""
+    if green_threads():
+        from gevent import monkey
+        return monkey.get_original('_thread', 'get_ident')
+    return _thread.get_ident
+
+
+def native_executor(max_workers: int, thread_name_prefix: str = '') -> Executor:
+    """
+    Thread pool whose workers are OS threads even under gevent. Its futures
+    are greenlet-friendly there, so waiting on them only blocks the caller.
+    """
+    if green_threads():
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+
+
+def start_native_thread(target: Callable[..., Any], *args, name: Optional[str] = None) -> Optional[threading.Thread]:
+    """
+    Run ``target`` on a daemon OS thread. Under gevent the thread comes from
+    the hub's native pool and no joinable handle is returned.
+    """
+    if green_threads():
+        from gevent import get_hub
+        get_hub().threadpool.spawn(target, *args)
+        return None
+    thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+    thread.start()
+    return thread
+
+
+def native_selector() -> selectors.BaseSelector:
+    """The stdlib's own selector (gevent swaps ``selectors.DefaultSelector`` for a cooperative one)"""
+    if green_threads():
+        from gevent import monkey
+        return monkey.get_original('selectors', 'DefaultSelector')()
+    return selectors.DefaultSelector()
@@ -0,0 +1,183 @@
+"""
+VisiSec Password Hasher
+bcrypt 哈希/校验的专用有界线程池（排队上限、饱和快速拒绝、可配置 cost、登录时透明升级、耗时统计）
+"""
+
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+import atexit
+import logging
+import threading
+import time
+
+import bcrypt as bcrypt_lib
+
+from .metrics import HASH_BUCKETS, REGISTRY
+from .native_threads import native_executor
+
+logger = logging.getLogger(__name__)
+
+HASH_SECONDS = REGISTRY.histogram(
+    'visisec_password_hash_seconds', 'bcrypt hash/verify time on the hashing pool.', buckets=HASH_BUCKETS)
+HASH_QUEUE_SECONDS = REGISTRY.histogram(
+    'visisec_password_hash_queue_seconds', 'Time a bcrypt call waited for a hashing thread.', buckets=HASH_BUCKETS)
+HASH_REJECTED = REGISTRY.counter(
+    'visisec_password_hash_rejected_total', 'bcrypt calls refused because the hashing pool was saturated.')
+
+
+class HasherBusyError(Exception):
+    """Raised without queueing when the hashing pool and its queue are full"""
+
+
+class _Timings:
+    """Recent durations (seconds) for percentile reporting"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {'count': 0}
+
+        def pick(q: float) -> float:
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 2),
+            'p50_ms': pick(0.5),
+            'p95_ms': pick(0.95),
+            'max_ms': round(samples[-1] * 1000, 2)
+        }
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Cost factor of a ``$2b$12$...`` hash, or None if it can't be parsed"""
+    try:
+        return int(hashed.split('$')[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """
+    bcrypt on a dedicated pool of ``max_workers`` threads.
+
+    bcrypt releases the GIL while hashing, so the pool uses real cores
+    without stalling request and Socket.IO threads, but each call still
+    costs 100-300 ms of CPU by design. At most ``max_workers + max_queue``
+    calls are admitted; beyond that ``HasherBusyError`` is raised at once so
+    a login burst gets quick 503s instead of ever-growing latency.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 2, max_queue: int = 32, timeout: float = 10.0):
+        self.rounds = rounds
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+
+        self._executor = native_executor(self.max_workers, thread_name_prefix='bcrypt')
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.hash_time = _Timings()
+        self.queue_wait = _Timings()
+
+    def _run(self, fn: Callable[..., Any], *args) -> Any:
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                HASH_REJECTED.inc()
+                raise HasherBusyError("Password hashing is saturated")
+            self._admitted += 1
+        submitted = time.perf_counter()
+
+        def task():
+            started = time.perf_counter()
+            HASH_QUEUE_SECONDS.observe(started - submitted)
+            with self._lock:
+                self._running += 1
+                self.queue_wait.add(started - submitted)
+            try:
+                return fn(*args)
+            finally:
+                elapsed = time.perf_counter() - started
+                HASH_SECONDS.observe(elapsed)
+                with self._lock:
+                    self._running -= 1
+                    self._admitted -= 1
+                    self.hash_time.add(elapsed)
+
+        future = self._executor.submit(task)
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # A task that never started gives its admission back here
+            if future.cancel():
+                with self._lock:
+                    self._admitted -= 1
+            raise HasherBusyError(f"Password hashing timed out after {self.timeout}s")
+
+    def _hash(self, password: str) -> str:
+        return bcrypt_lib.hashpw(password.encode('utf-8'), bcrypt_lib.gensalt(rounds=self.rounds)).decode('utf-8')
+
+    def _verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        if not bcrypt_lib.checkpw(password.encode('utf-8'), hashed.encode('utf-8')):
+            return False, None
+        if hash_rounds(hashed) != self.rounds:
+            return True, self._hash(password)
+        return True, None
+
+    def hash(self, password: str) -> str:
+        return self._run(self._hash, password)
+
+    def verify(self, password: str, hashed: str) -> bool:
+        return self._run(lambda: bcrypt_lib.checkpw(password.encode('utf-8'), hashed.encode('utf-8')))
+
+    def verify_and_update(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        """
+        Check a password; if it matches but was hashed with a different cost
+        factor, also return a fresh hash at the current cost (one admission,
+        same worker) so the caller can store it.
+        """
+        ok, new_hash = self._run(self._verify_and_update, password, hashed)
+        if new_hash is not None:
+            with self._lock:
+                self.rehashed += 1
+        return ok, new_hash
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._admitted - self._running,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'hash_time': self.hash_time.snapshot(),
+                'queue_wait': self.queue_wait.snapshot()
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def create_password_hasher(rounds: int, max_workers: int, max_queue: int, timeout: float) -> PasswordHasher:
+    """Create the process-wide hashing pool and register shutdown"""
+    hasher = PasswordHasher(rounds=rounds, max_workers=max_workers, max_queue=max_queue, timeout=timeout)
+    atexit.register(hasher.shutdown)
+    logger.info(f"🔐 Password hasher ready: bcrypt cost {rounds}, {hasher.max_workers} workers, queue {hasher.max_queue}")
+    return hasher
@@ -0,0 +1,326 @@
+"""
+VisiSec Sensor Archive
+按录制保存原始传感器流的列式磁盘归档（.npy 分段 + 时间索引，可按列/时间段内存映射读取）
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_VERSION = 1
+INDEX_FILE = 'index.json'
+_RECORDING_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def archive_path(root: str, recording_id: str) -> str:
+    if not _RECORDING_ID.match(recording_id or ''):
+        raise ValueError(f"Invalid recording id: {recording_id!r}")
+    return os.path.join(root, recording_id)
+
+
+def _write_index(path: str, index: Dict[str, Any]):
+    partial = os.path.join(path, f"{INDEX_FILE}.tmp")
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(partial, os.path.join(path, INDEX_FILE))
+
+
+class SensorArchiveWriter:
+    """
+    Append-only columnar archive for one recording.
+
+    Layout::
+
+        <root>/<recording_id>/index.json
+        <root>/<recording_id>/<stream>/<segment>/<column>.npy
+
+    Rows are buffered per stream and written as a new segment (one ``.npy``
+    per column) once ``segment_rows`` rows are pending or the oldest pending
+    row is ``flush_seconds`` old, so a crash loses at most that much. The
+    index records each segment's row count and time span and is replaced
+    atomically after every flush. ``close()`` merges the small age-flushed
+    segments into ``segment_rows``-sized ones.
+
+    Every stream must have a ``t`` column (epoch seconds) appended in
+    non-decreasing order; readers rely on it for range lookups.
+
+    With ``resume=True`` an existing index is picked up and new segments
+    continue after its last one, so a recording handed over to another
+    worker (or resumed after a restart) keeps a single archive.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schemas: Dict[str, List[Tuple[str, Any]]],
+        segment_rows: int = 65536,
+        flush_seconds: float = 60.0,
+        resume: bool = False,
+    ):
+        self.path = path
+        self.schemas = {
+            stream: [(name, np.dtype(dtype)) for name, dtype in columns]
+            for stream, columns in schemas.items()
+        }
+        self.segment_rows = max(1, segment_rows)
+        self.flush_seconds = flush_seconds
+        self.closed = False
+
+        self._lock = threading.Lock()
+        self._pending: Dict[str, List[Dict[str, np.ndarray]]] = {s: [] for s in self.schemas}
+        self._pending_rows: Dict[str, int] = {s: 0 for s in self.schemas}
+        self._pending_since: Dict[str, Optional[float]] = {s: None for s in self.schemas}
+
+        os.makedirs(path, exist_ok=True)
+        existing = self._existing_index() if resume else None
+        if existing is not None:
+            existing['closed'] = False
+            existing.pop('closed_at', None)
+            self._index = existing
+            return
+        self._index = {
+            'version': ARCHIVE_VERSION,
+            'created_at': time.time(),
+            'closed': False,
+            'next_segment': 0,
+            'streams': {
+                stream: {
+                    'columns': {name: dtype.str for name, dtype in columns},
+                    'rows': 0,
+                    'segments': []
+                }
+                for stream, columns in self.schemas.items()
+            }
+        }
+        _write_index(path, self._index)
+
+    def _existing_index(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.path, INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if set(index.get('streams', {})) != set(self.schemas):
+            logger.warning(f"⚠️ Archive {self.path} has different streams; starting a new index")
+            return None
+        return index
+
+    def last_t(self, stream: str) -> Optional[float]:
+        """Timestamp of the newest row of ``stream`` (pending or written), None when empty"""
+        with self._lock:
+            if self._pending[stream]:
+                return float(self._pending[stream][-1]['t'][-1])
+            segments = self._index['streams'][stream]['segments']
+            return segments[-1]['t_max'] if segments else None
+
+    def append(self, stream: str, columns: Dict[str, Any]):
+        """Queue rows given as equal-length column arrays (or scalars for one row)"""
+        chunk = {name: np.atleast_1d(np.asarray(columns.get(name, 0), dtype=dtype))
+                 for name, dtype in self.schemas[stream]}
+        rows = len(chunk['t'])
+        if rows == 0:
+            return
+        with self._lock:
+            if self.closed:
+                return
+            self._pending[stream].append(chunk)
+            self._pending_rows[stream] += rows
+            if self._pending_since[stream] is None:
+                self._pending_since[stream] = time.monotonic()
+            if (self._pending_rows[stream] >= self.segment_rows
+                    or time.monotonic() - self._pending_since[stream] >= self.flush_seconds):
+                self._flush_stream(stream)
+                _write_index(self.path, self._index)
+
+    def _take(self, stream: str) -> Optional[Dict[str, np.ndarray]]:
+        chunks = self._pending[stream]
+        if not chunks:
+            return None
+        self._pending[stream] = []
+        self._pending_rows[stream] = 0
+        self._pending_since[stream] = None
+        if len(chunks) == 1:
+            return chunks[0]
+        return {name: np.concatenate([c[name] for c in chunks]) for name, _ in self.schemas[stream]}
+
+    def _write_segment(self, stream: str, columns: Dict[str, np.ndarray]) -> Dict[str, Any]:
+        segment_id = self._index['next_segment']
+        self._index['next_segment'] += 1
+        name = f"{segment_id:06d}"
+        directory = os.path.join(self.path, stream, name)
+        partial = f"{directory}.tmp"
+        os.makedirs(partial, exist_ok=True)
+        for column, values in columns.items():
+            np.save(os.path.join(partial, f"{column}.npy"), values)
+        os.replace(partial, directory)
+        t = columns['t']
+        return {'name': name, 'rows': int(len(t)), 't_min': float(t[0]), 't_max': float(t[-1])}
+
+    def _flush_stream(self, stream: str):
+        columns = self._take(stream)
+        if columns is None:
+            return
+        # Write in segment_rows pieces so one huge append never makes one huge file
+        info = self._index['streams'][stream]
+        for offset in range(0, len(columns['t']), self.segment_rows):
+            piece = {name: values[offset:offset + self.segment_rows] for name, values in columns.items()}
+            info['segments'].append(self._write_segment(stream, piece))
+            info['rows'] += len(piece['t'])
+
+    def flush(self):
+        with self._lock:
+            for stream in self.schemas:
+                self._flush_stream(stream)
+            _write_index(self.path, self._index)
+
+    def _compact(self, stream: str):
+        info = self._index['streams'][stream]
+        segments = info['segments']
+        if len(segments) < 2 or all(s['rows'] >= self.segment_rows for s in segments[:-1]):
+            return
+        reader = SensorArchive(self.path, index=self._index)
+        merged, old = [], [s['name'] for s in segments]
+        for offset in range(0, info['rows'], self.segment_rows):
+            columns = reader.slice_rows(stream, offset, offset + self.segment_rows)
+            merged.append(self._write_segment(stream, {k: np.ascontiguousarray(v) for k, v in columns.items()}))
+        info['segments'] = merged
+        _write_index(self.path, self._index)
+        for name in old:
+            shutil.rmtree(os.path.join(self.path, stream, name), ignore_errors=True)
+
+    def close(self) -> Dict[str, Any]:
+        """Flush, compact and mark the archive complete; returns the index summary"""
+        with self._lock:
+            if not self.closed:
+                for stream in self.schemas:
+                    self._flush_stream(stream)
+                    self._compact(stream)
+                self._index['closed'] = True
+                self._index['closed_at'] = time.time()
+                _write_index(self.path, self._index)
+                self.closed = True
+            return summarize(self._index)
+
+
+def summarize(index: Dict[str, Any]) -> Dict[str, Any]:
+    streams = {}
+    for stream, info in index['streams'].items():
+        segments = info['segments']
+        streams[stream] = {
+            'rows': info['rows'],
+            'segments': len(segments),
+            'columns': list(info['columns']),
+            'start': segments[0]['t_min'] if segments else None,
+            'end': segments[-1]['t_max'] if segments else None
+        }
+    return {'closed': index.get('closed', False), 'streams': streams}
+
+
+class SensorArchive:
+    """
+    Read side of a recording archive. Columns are memory-mapped, and only
+    the segments overlapping the requested time range are touched, so
+    reading one column of a ten-minute window of an hour-long recording
+    never loads the rest of the session.
+    """
+
+    def __init__(self, path: str, index: Optional[Dict[str, Any]] = None):
+        self.path = path
+        if index is None:
+            with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        self.index = index
+
+    @property
+    def streams(self) -> List[str]:
+        return list(self.index['streams'])
+
+    def summary(self) -> Dict[str, Any]:
+        return summarize(self.index)
+
+    def _segments(self, stream: str) -> List[Dict[str, Any]]:
+        if stream not in self.index['streams']:
+            raise KeyError(f"Unknown stream: {stream}")
+        return self.index['streams'][stream]['segments']
+
+    def _load(self, stream: str, segment: Dict[str, Any], column: str) -> np.ndarray:
+        return np.load(os.path.join(self.path, stream, segment['name'], f"{column}.npy"), mmap_mode='r')
+
+    def columns(
+        self,
+        stream: str,
+        names: Optional[Iterable[str]] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Dict[str, np.ndarray]:
+        """
+        Columns of ``stream`` for rows with ``start <= t < end``. A range
+        inside one segment comes back as read-only memmap slices; ranges
+        spanning segments are concatenated (only the selected rows are read).
+        """
+        names = list(names) if names is not None else list(self.index['streams'][stream]['columns'])
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        for segment in self._segments(stream):
+            if start is not None and segment['t_max'] < start:
+                continue
+            if end is not None and segment['t_min'] >= end:
+                break
+            t = self._load(stream, segment, 't')
+            lo = int(np.searchsorted(t, start, side='left')) if start is not None else 0
+            hi = int(np.searchsorted(t, end, side='left')) if end is not None else len(t)
+            if hi <= lo:
+                continue
+            for name in names:
+                values = t if name == 't' else self._load(stream, segment, name)
+                parts[name].append(values[lo:hi])
+
+        dtypes = self.index['streams'][stream]['columns']
+        out = {}
+        for name in names:
+            chunks = parts[name]
+            if not chunks:
+                out[name] = np.empty(0, dtype=np.dtype(dtypes[name]))
+            elif len(chunks) == 1:
+                out[name] = chunks[0]
+            else:
+                out[name] = np.concatenate(chunks)
+        return out
+
+    def column(self, stream: str, name: str, start: Optional[float] = None, end: Optional[float] = None) -> np.ndarray:
+        return self.columns(stream, [name], start, end)[name]
+
+    def slice_rows(self, stream: str, first: int, last: int) -> Dict[str, np.ndarray]:
+        """Rows ``[first, last)`` by position across segments"""
+        names = list(self.index['streams'][stream]['columns'])
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        offset = 0
+        for segment in self._segments(stream):
+            rows = segment['rows']
+            lo, hi = max(first - offset, 0), min(last - offset, rows)
+            if hi > lo:
+                for name in names:
+                    parts[name].append(self._load(stream, segment, name)[lo:hi])
+            offset += rows
+            if offset >= last:
+                break
+        return {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=np.dtype(self.index['streams'][stream]['columns'][name]))
+            for name, chunks in parts.items()
+        }
+
+
+def open_archive(root: str, recording_id: str) -> Optional[SensorArchive]:
+    """The archive of ``recording_id``, or None if there is none"""
+    path = archive_path(root, recording_id)
+    if not os.path.exists(os.path.join(path, INDEX_FILE)):
+        return None
+    return SensorArchive(path)
@@ -0,0 +1,395 @@
+"""
+VisiSec Sensor Ring Buffers
+会话级传感器数据/关键帧的定长环形缓冲区（NumPy 列式存储，O(1) 追加/淘汰）
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+
+import numpy as np
+
+# Column layouts: (name, dtype)
+SAMPLE_COLUMNS = [
+    ('t', np.float64),              # server receive time, epoch seconds
+    ('client_t', np.float64),       # client timestamp, epoch seconds (NaN if absent)
+    ('avg_accel', np.float32),      # client-side IMU motion analysis
+    ('imu_points', np.int32),       # new IMU points carried by this event
+    ('app_foreground', np.int8),    # 1 active, 0 background, -1 unknown
+    ('app_switches', np.int32),
+    ('distracted', np.int8),
+]
+
+IMU_COLUMNS = [
+    ('t', np.float64),
+    ('ax', np.float32),
+    ('ay', np.float32),
+    ('az', np.float32),
+    ('ra', np.float32),             # rotationRate.alpha
+    ('rb', np.float32),             # rotationRate.beta
+    ('rg', np.float32),             # rotationRate.gamma
+]
+
+APP_STATE_COLUMNS = [
+    ('t', np.float64),
+    ('foreground', np.int8),
+]
+
+GAZE_COLUMNS = [
+    ('t', np.float64),
+    ('on_screen', np.float32),      # 1.0 looking at the screen/content, 0.0 looking away
+]
+
+KEYFRAME_COLUMNS = [
+    ('t', np.float64),
+    ('source', np.int8),            # 0 REAR, 1 FRONT
+    ('change_detected', np.int8),
+    ('attention_score', np.float32),
+    ('duplicate', np.int8),         # image matched an earlier keyframe of the recording
+]
+
+KEYFRAME_SOURCES = {'REAR': 0, 'FRONT': 1}
+
+# Streams written to the per-recording on-disk archive (see sensor_archive)
+ARCHIVE_STREAMS = {
+    'samples': SAMPLE_COLUMNS,
+    'imu': IMU_COLUMNS,
+    'app_state': APP_STATE_COLUMNS,
+    'gaze': GAZE_COLUMNS,
+    'keyframes': KEYFRAME_COLUMNS,
+}
+
+# Binary sensor_batch frame: little-endian packed rows, no header.
+# t is the client timestamp in epoch milliseconds (JS Date.now()).
+IMU_BATCH_FORMAT = 'imu-f32-v1'
+IMU_BATCH_DTYPE = np.dtype([
+    ('t', '<f8'),
+    ('ax', '<f4'), ('ay', '<f4'), ('az', '<f4'),
+    ('ra', '<f4'), ('rb', '<f4'), ('rg', '<f4'),
+])
+
+
+class BatchFormatError(ValueError):
+    """Malformed binary sensor batch"""
+
+
+class RingBuffer:
+    """
+    Fixed-capacity columnar ring buffer.
+
+    Each column is a preallocated NumPy array; appending overwrites the
+    oldest row once full, so append and evict are both O(1).
+    """
+
+    def __init__(self, capacity: int, columns: List[Tuple[str, Any]]):
+        self.capacity = max(1, capacity)
+        self.names = [name for name, _ in columns]
+        self._columns = {name: np.zeros(self.capacity, dtype=dtype) for name, dtype in columns}
+        self._head = 0          # next write position
+        self._size = 0
+        self.total_appended = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def evicted(self) -> int:
+        return self.total_appended - self._size
+
+    def append(self, **values):
+        """Append one row; missing columns are written as zero"""
+        index = self._head
+        for name, column in self._columns.items():
+            column[index] = values.get(name, 0)
+        self._head = (index + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+        self.total_appended += 1
+
+    def extend(self, rows: Dict[str, np.ndarray]):
+        """Append many rows given as equal-length column arrays"""
+        count = len(next(iter(rows.values()))) if rows else 0
+        if count == 0:
+            return
+        if count > self.capacity:
+            # Only the newest `capacity` rows survive anyway
+            rows = {name: values[-self.capacity:] for name, values in rows.items()}
+            self.total_appended += count - self.capacity
+            count = self.capacity
+
+        first = min(count, self.capacity - self._head)
+        for name, column in self._columns.items():
+            values = rows.get(name)
+            if values is None:
+                column[self._head:self._head + first] = 0
+                column[:count - first] = 0
+            else:
+                column[self._head:self._head + first] = values[:first]
+                column[:count - first] = values[first:]
+        self._head = (self._head + count) % self.capacity
+        self._size = min(self.capacity, self._size + count)
+        self.total_appended += count
+
+    def _order(self) -> np.ndarray:
+        start = (self._head - self._size) % self.capacity
+        return (start + np.arange(self._size)) % self.capacity
+
+    def column(self, name: str) -> np.ndarray:
+        """One column in chronological order (copy)"""
+        if self._size < self.capacity:
+            return self._columns[name][:self._size].copy()
+        return np.roll(self._columns[name], -self._head)
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """All columns in chronological order (copies)"""
+        return {name: self.column(name) for name in self.names}
+
+    def last(self, name: str, default: float = 0.0) -> float:
+        if self._size == 0:
+            return default
+        return self._columns[name][(self._head - 1) % self.capacity].item()
+
+    def rows(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Newest-last rows as plain dicts (for JSON responses)"""
+        order = self._order()
+        if limit is not None:
+            order = order[-limit:]
+        return [
+            {name: self._columns[name][i].item() for name in self.names}
+            for i in order
+        ]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column.nbytes for column in self._columns.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'size': self._size,
+            'capacity': self.capacity,
+            'total_appended': self.total_appended,
+            'evicted': self.evicted,
+            'bytes': self.nbytes
+        }
+
+
+def _ms_to_seconds(value: Any) -> float:
+    try:
+        return float(value) / 1000.0
+    except (TypeError, ValueError):
+        return float('nan')
+
+
+def _num(value: Any, default: float = 0.0) -> float:
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+
+class SessionBuffers:
+    """
+    All per-session sensor storage.
+
+    ``sensor_data`` events from the client carry a snapshot of the whole
+    client-side IMU / app-state history; only points newer than the last
+    one seen are appended, so the same sample is never stored twice.
+
+    The ring buffers only keep the newest rows; with an ``archive``
+    (a SensorArchiveWriter over ARCHIVE_STREAMS) every new row is also
+    appended to the recording's on-disk archive.
+    """
+
+    def __init__(
+        self,
+        sample_capacity: int = 1000,
+        imu_capacity: int = 60000,
+        app_state_capacity: int = 1000,
+        keyframe_capacity: int = 100,
+        gaze_capacity: int = 1000,
+        archive=None,
+    ):
+        self.samples = RingBuffer(sample_capacity, SAMPLE_COLUMNS)
+        self.imu = RingBuffer(imu_capacity, IMU_COLUMNS)
+        self.app_state = RingBuffer(app_state_capacity, APP_STATE_COLUMNS)
+        self.gaze = RingBuffer(gaze_capacity, GAZE_COLUMNS)
+        self.keyframes = RingBuffer(keyframe_capacity, KEYFRAME_COLUMNS)
+        self.archive = archive
+        self._last_imu_t = float('-inf')
+        self._last_app_t = float('-inf')
+        self._last_gaze_t = float('-inf')
+        if archive is not None:
+            # A resumed archive already holds the client's earlier history
+            self._last_imu_t = self._archived_t('imu')
+            self._last_app_t = self._archived_t('app_state')
+            self._last_gaze_t = self._archived_t('gaze')
+        self._lock = threading.Lock()
+
+    def _archived_t(self, stream: str) -> float:
+        last = self.archive.last_t(stream)
+        return float('-inf') if last is None else last
+
+    def _append_row(self, stream: str, **values):
+        getattr(self, stream).append(**values)
+        if self.archive is not None:
+            self.archive.append(stream, values)
+
+    def _extend(self, stream: str, columns: Dict[str, np.ndarray]):
+        getattr(self, stream).extend(columns)
+        if self.archive is not None:
+            self.archive.append(stream, columns)
+
+    def add_sensor_event(self, data: Dict[str, Any], received_at: Optional[float] = None) -> int:
+        """Store one sensor_data payload; returns the number of new IMU points"""
+        received_at = received_at if received_at is not None else time.time()
+        imu = data.get('imu') or {}
+        app = data.get('appState') or {}
+        imu_analysis = imu.get('analysis') or {}
+        app_analysis = app.get('analysis') or {}
+
+        with self._lock:
+            new_imu = self._append_imu(imu.get('data') or [])
+            self._append_app_states(app.get('history') or [])
+            self._append_gaze(data.get('gaze') or [])
+
+            state = app_analysis.get('currentState')
+            self._append_row(
+                'samples',
+                t=received_at,
+                client_t=_ms_to_seconds(data.get('timestamp')),
+                avg_accel=_num(imu_analysis.get('averageAcceleration')),
+                imu_points=new_imu,
+                app_foreground=1 if state == 'active' else 0 if state == 'background' else -1,
+                app_switches=int(_num(app_analysis.get('switches'))),
+                distracted=1 if app_analysis.get('distracted') else 0
+            )
+        return new_imu
+
+    def _append_imu(self, points: List[Dict[str, Any]]) -> int:
+        fresh = []
+        for point in points:
+            t = _ms_to_seconds(point.get('timestamp'))
+            if t > self._last_imu_t:
+                fresh.append((t, point))
+        if not fresh:
+            return 0
+        fresh.sort(key=lambda item: item[0])
+
+        count = len(fresh)
+        columns = {name: np.empty(count, dtype=dtype) for name, dtype in IMU_COLUMNS}
+        for i, (t, point) in enumerate(fresh):
+            accel = point.get('acceleration') or {}
+            rotation = point.get('rotationRate') or {}
+            columns['t'][i] = t
+            columns['ax'][i] = _num(accel.get('x'))
+            columns['ay'][i] = _num(accel.get('y'))
+            columns['az'][i] = _num(accel.get('z'))
+            columns['ra'][i] = _num(rotation.get('alpha'))
+            columns['rb'][i] = _num(rotation.get('beta'))
+            columns['rg'][i] = _num(rotation.get('gamma'))
+        self._extend('imu', columns)
+        self._last_imu_t = fresh[-1][0]
+        return count
+
+    def _append_app_states(self, history: List[Dict[str, Any]]):
+        t_values, foreground = [], []
+        for record in history:
+            t = _ms_to_seconds(record.get('timestamp'))
+            if t > self._last_app_t:
+                t_values.append(t)
+                foreground.append(0 if record.get('state') == 'background' else 1)
+                self._last_app_t = t
+        if t_values:
+            self._extend('app_state', {
+                't': np.asarray(t_values, dtype=np.float64),
+                'foreground': np.asarray(foreground, dtype=np.int8)
+            })
+
+    def _append_gaze(self, points: List[Dict[str, Any]]):
+        """Gaze samples: [{timestamp (ms), on_screen (0..1)}]"""
+        t_values, on_screen = [], []
+        for point in points:
+            t = _ms_to_seconds(point.get('timestamp'))
+            if t > self._last_gaze_t:
+                t_values.append(t)
+                on_screen.append(min(1.0, max(0.0, _num(point.get('on_screen'), 1.0))))
+                self._last_gaze_t = t
+        if t_values:
+            self._extend('gaze', {
+                't': np.asarray(t_values, dtype=np.float64),
+                'on_screen': np.asarray(on_screen, dtype=np.float32)
+            })
+
+    def add_imu_batch(
+        self,
+        payload: bytes,
+        app_states: Optional[List[Dict[str, Any]]] = None,
+        received_at: Optional[float] = None,
+        gaze: Optional[List[Dict[str, Any]]] = None
+    ) -> int:
+        """
+        Store a packed ``imu-f32-v1`` frame (see IMU_BATCH_DTYPE) without
+        per-sample Python work; returns the number of new IMU points.
+        """
+        if len(payload) % IMU_BATCH_DTYPE.itemsize:
+            raise BatchFormatError(
+                f"Batch size {len(payload)} is not a multiple of {IMU_BATCH_DTYPE.itemsize} bytes"
+            )
+        rows = np.frombuffer(payload, dtype=IMU_BATCH_DTYPE)
+        received_at = received_at if received_at is not None else time.time()
+
+        with self._lock:
+            t = rows['t'] / 1000.0
+            fresh = t > self._last_imu_t
+            count = int(np.count_nonzero(fresh))
+            if count:
+                columns = {name: rows[name][fresh] for name in IMU_BATCH_DTYPE.names}
+                columns['t'] = t[fresh]
+                if count > 1 and np.any(np.diff(columns['t']) < 0):
+                    # Keep time order (the archive's range lookups depend on it)
+                    order = np.argsort(columns['t'], kind='stable')
+                    columns = {name: values[order] for name, values in columns.items()}
+                self._extend('imu', columns)
+                self._last_imu_t = float(columns['t'].max())
+            if app_states:
+                self._append_app_states(app_states)
+            if gaze:
+                self._append_gaze(gaze)
+
+            self._append_row(
+                'samples',
+                t=received_at,
+                client_t=float(t[-1]) if len(t) else float('nan'),
+                avg_accel=float(np.sqrt(rows['ax'] ** 2 + rows['ay'] ** 2 + rows['az'] ** 2).mean()) if len(rows) else 0.0,
+                imu_points=count,
+                app_foreground=self.app_state.last('foreground', -1) if len(self.app_state) else -1,
+                app_switches=0,
+                distracted=0
+            )
+        return count
+
+    def add_keyframe(self, data: Dict[str, Any], received_at: Optional[float] = None, duplicate: bool = False):
+        """Store keyframe metadata"""
+        with self._lock:
+            self._append_row(
+                'keyframes',
+                t=received_at if received_at is not None else time.time(),
+                source=KEYFRAME_SOURCES.get(data.get('source', 'REAR'), 0),
+                change_detected=1 if (data.get('sceneChange') or {}).get('changed') else 0,
+                attention_score=_num((data.get('attention') or {}).get('score')),
+                duplicate=1 if duplicate else 0
+            )
+
+    def memory_stats(self) -> Dict[str, Any]:
+        """Per-buffer sizes and total bytes held by this session"""
+        buffers = {
+            'samples': self.samples.stats(),
+            'imu': self.imu.stats(),
+            'app_state': self.app_state.stats(),
+            'gaze': self.gaze.stats(),
+            'keyframes': self.keyframes.stats()
+        }
+        return {
+            'buffers': buffers,
+            'total_bytes': sum(b['bytes'] for b in buffers.values())
+        }
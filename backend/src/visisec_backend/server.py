@@ -0,0 +1,147 @@
+"""
+VisiSec Server Entry Point
+启动入口：开发模式（Werkzeug 线程）与生产模式（gevent 事件循环、多工作进程、跨进程消息队列）
+"""
+
+from typing import List, Optional
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+MODES = ('development', 'production')
+PRODUCTION_ASYNC_MODES = ('gevent', 'eventlet')
+RESTART_BACKOFF_SECONDS = 5.0   # delay before restarting a worker that crashed this soon after start
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='visisec-server', description='Run the VisiSec backend')
+    parser.add_argument('--mode', choices=MODES, default=os.getenv('SERVER_MODE', 'development'))
+    parser.add_argument('--host', default=os.getenv('FLASK_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('FLASK_PORT', '5124')),
+                        help='port of the first worker; worker i listens on port + i')
+    parser.add_argument('--workers', type=int, default=int(os.getenv('SERVER_WORKERS', '1')))
+    parser.add_argument('--async-mode', choices=PRODUCTION_ASYNC_MODES,
+                        default=os.getenv('SERVER_ASYNC_MODE', 'gevent'),
+                        help='event loop used in production mode')
+    return parser.parse_args(argv)
+
+
+def serve(mode: str, host: str, port: int, async_mode: str = 'gevent'):
+    """Run one server process in the foreground"""
+    if mode == 'production':
+        # Must patch before the backend (and its sockets, locks, threads) is imported
+        if async_mode == 'gevent':
+            from gevent import monkey
+            monkey.patch_all()
+        else:
+            import eventlet
+            eventlet.monkey_patch()
+        os.environ['SOCKETIO_ASYNC_MODE'] = async_mode
+    else:
+        os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+
+    from . import main as backend
+
+    worker_id = os.getenv('SERVER_WORKER_ID', '0')
+    logger.info("="*80)
+    logger.info(f"🚀 Starting VisiSec server ({mode}, {backend.socketio.async_mode}) worker {worker_id}")
+    logger.info(f"   Listening on {host}:{port}")
+    logger.info(f"   Message queue: {backend.SOCKETIO_MESSAGE_QUEUE or 'none (single process)'}")
+    logger.info("="*80)
+
+    if mode == 'production':
+        backend.socketio.run(backend.app, host=host, port=port, log_output=False)
+    else:
+        backend.socketio.run(
+            backend.app,
+            host=host,
+            port=port,
+            debug=backend.FLASK_DEBUG,
+            allow_unsafe_werkzeug=True  # For development only
+        )
+
+
+def supervise(args: argparse.Namespace) -> int:
+    """
+    Start ``args.workers`` single-process servers on consecutive ports and
+    restart any that exits. A sticky load balancer (e.g. nginx ``ip_hash``)
+    in front keeps each client on one worker; room emits cross workers via
+    ``SOCKETIO_MESSAGE_QUEUE``.
+    """
+    queue_url = os.getenv('SOCKETIO_MESSAGE_QUEUE', '')
+    if not queue_url or queue_url == 'local':
+        logger.error("❌ Multiple workers need a shared SOCKETIO_MESSAGE_QUEUE (e.g. redis://localhost:6379/0)")
+        return 2
+
+    stopping = False
+    workers = {}
+
+    def start(index: int) -> subprocess.Popen:
+        env = dict(os.environ, SERVER_WORKER_ID=str(index))
+        return subprocess.Popen([
+            sys.executable, '-m', 'visisec_backend.server',
+            '--mode', args.mode, '--host', args.host, '--port', str(args.port + index),
+            '--async-mode', args.async_mode, '--workers', '1'
+        ], env=env)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for process in workers.values():
+            if process.poll() is None:
+                process.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for index in range(args.workers):
+        workers[index] = start(index)
+    logger.info(f"👷 {args.workers} workers on ports {args.port}-{args.port + args.workers - 1}")
+
+    started = {index: time.monotonic() for index in workers}
+    restart_at = {}
+    while not stopping:
+        time.sleep(1.0)
+        now = time.monotonic()
+        for index, process in list(workers.items()):
+            if stopping or process.poll() is None:
+                continue
+            if index not in restart_at:
+                # Back off a worker that keeps crashing right after start, without
+                # holding up reaping the others or reacting to a shutdown signal
+                delay = RESTART_BACKOFF_SECONDS if now - started[index] < RESTART_BACKOFF_SECONDS else 0.0
+                restart_at[index] = now + delay
+                logger.warning(f"⚠️ Worker {index} exited with {process.returncode}; restarting in {delay:.0f}s")
+            if now >= restart_at[index]:
+                del restart_at[index]
+                started[index] = now
+                workers[index] = start(index)
+
+    for process in workers.values():
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+    if args.mode == 'production' and args.workers > 1:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        return supervise(args)
+    serve(args.mode, args.host, args.port, args.async_mode)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,269 @@
+"""
+VisiSec Session State
+录制会话状态的可外置后端（进程内存 / 共享存储 + 写后批量落盘），含工作进程租约与接管
+"""
+
+from typing import Any, Dict, List, Optional
+import abc
+import atexit
+import logging
+import threading
+import time
+
+from .storage import MemoryStorage, Storage
+
+logger = logging.getLogger(__name__)
+
+
+class SessionBusyError(Exception):
+    """The session is held by another worker whose client is still connected"""
+
+    def __init__(self, session_id: str, recording_id: str):
+        super().__init__(f"Session {session_id} is live on another worker")
+        self.session_id = session_id
+        self.recording_id = recording_id
+
+
+class SessionStore(abc.ABC):
+    """
+    State of live recording sessions, kept apart from the process that
+    happens to run them so a session can outlive its socket and its worker.
+
+    Each session is owned by one worker at a time through a lease
+    (``worker`` / ``lease_until``). The owner keeps the in-memory runtime
+    (sensor buffers, archive writer) and renews the lease; another worker
+    may ``claim`` it once the lease runs out, or sooner after setting
+    ``handoff`` and waiting for the owner to ``release`` it.
+
+    ``update`` is for hot-path bookkeeping (counters, last_seen) and may be
+    written behind; ``set`` is written through before it returns.
+    """
+
+    @abc.abstractmethod
+    def create(self, session: Dict[str, Any]):
+        """Store a new session's state"""
+
+    @abc.abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's state (with unflushed updates applied), or None"""
+
+    @abc.abstractmethod
+    def find(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """The live session recording ``recording_id``, or None"""
+
+    @abc.abstractmethod
+    def list(self) -> List[Dict[str, Any]]:
+        """Every live session, owned or not"""
+
+    @abc.abstractmethod
+    def update(self, session_id: str, **fields):
+        """Merge hot-path fields; may be written behind"""
+
+    @abc.abstractmethod
+    def set(self, session_id: str, **fields):
+        """Merge fields and write them through before returning"""
+
+    @abc.abstractmethod
+    def claim(self, session_id: str, worker: str, lease_seconds: float) -> bool:
+        """Take the lease for ``lease_seconds`` if it is free, expired or already ours"""
+
+    @abc.abstractmethod
+    def release(self, session_id: str, worker: str) -> bool:
+        """Give up the lease, but only if ``worker`` still holds it"""
+
+    @abc.abstractmethod
+    def renew(self, session_ids: List[str], worker: str, lease_seconds: float):
+        """Extend the leases ``worker`` still holds by ``lease_seconds``"""
+
+    @abc.abstractmethod
+    def delete(self, session_id: str):
+        """Forget a session that ended"""
+
+    def flush(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self):
+        self.flush()
+
+
+class MemorySessionStore(SessionStore):
+    """Single-process state: nothing survives a restart and workers cannot share it"""
+
+    def __init__(self):
+        self._storage = MemoryStorage()
+
+    def create(self, session):
+        self._storage.save_session(session)
+
+    def get(self, session_id):
+        return self._storage.get_session(session_id)
+
+    def find(self, recording_id):
+        return self._storage.find_session(recording_id)
+
+    def list(self):
+        return self._storage.list_sessions()
+
+    def update(self, session_id, **fields):
+        self._storage.update_sessions({session_id: fields})
+
+    def set(self, session_id, **fields):
+        self._storage.update_sessions({session_id: fields})
+
+    def claim(self, session_id, worker, lease_seconds):
+        now = time.time()
+        return self._storage.claim_session(session_id, worker, now + lease_seconds, now)
+
+    def release(self, session_id, worker):
+        return self._storage.release_session(session_id, worker)
+
+    def renew(self, session_ids, worker, lease_seconds):
+        self._storage.renew_sessions(session_ids, worker, time.time() + lease_seconds)
+
+    def delete(self, session_id):
+        self._storage.delete_session(session_id)
+
+    def stats(self):
+        return {'backend': 'memory', 'sessions': len(self._storage.list_sessions())}
+
+
+class SharedSessionStore(SessionStore):
+    """
+    Session state in the shared Storage backend (the SQLite database every
+    worker opens), so any worker can resume a session after a reconnect or
+    restart.
+
+    ``update`` only merges the fields into a per-session pending dict;
+    a background thread writes all pending sessions in one transaction
+    every ``flush_interval`` seconds, so a busy session costs one row write
+    per interval however many events it sees. Reads overlay the pending
+    fields, and anything that changes ownership flushes that session first.
+    """
+
+    def __init__(self, storage: Storage, flush_interval: float = 1.0):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._updates = 0
+        self._flushes = 0
+        self._rows_written = 0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._flusher is None and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-state-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Session state flush failed: {e}")
+
+    def _overlay(self, session: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if session is None:
+            return None
+        with self._lock:
+            pending = self._pending.get(session['session_id'])
+            return {**session, **pending} if pending else session
+
+    def _flush_one(self, session_id: str):
+        with self._lock:
+            fields = self._pending.pop(session_id, None)
+        if fields:
+            self.storage.update_sessions({session_id: fields})
+
+    def create(self, session):
+        self.storage.save_session(session)
+
+    def get(self, session_id):
+        return self._overlay(self.storage.get_session(session_id))
+
+    def find(self, recording_id):
+        return self._overlay(self.storage.find_session(recording_id))
+
+    def list(self):
+        return [self._overlay(s) for s in self.storage.list_sessions()]
+
+    def update(self, session_id, **fields):
+        with self._lock:
+            self._pending.setdefault(session_id, {}).update(fields)
+            self._updates += 1
+        if self._flusher is None:
+            self.flush()
+
+    def set(self, session_id, **fields):
+        with self._lock:
+            pending = self._pending.pop(session_id, {})
+        self.storage.update_sessions({session_id: {**pending, **fields}})
+
+    def claim(self, session_id, worker, lease_seconds):
+        self._flush_one(session_id)
+        now = time.time()
+        return self.storage.claim_session(session_id, worker, now + lease_seconds, now)
+
+    def release(self, session_id, worker):
+        self._flush_one(session_id)
+        return self.storage.release_session(session_id, worker)
+
+    def renew(self, session_ids, worker, lease_seconds):
+        self.storage.renew_sessions(session_ids, worker, time.time() + lease_seconds)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._pending.pop(session_id, None)
+        self.storage.delete_session(session_id)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            self.storage.update_sessions(pending)
+        except Exception:
+            # Put them back under anything written meanwhile
+            with self._lock:
+                for session_id, fields in pending.items():
+                    self._pending[session_id] = {**fields, **self._pending.get(session_id, {})}
+            raise
+        with self._lock:
+            self._flushes += 1
+            self._rows_written += len(pending)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'storage',
+                'flush_interval': self.flush_interval,
+                'pending_sessions': len(self._pending),
+                'updates': self._updates,
+                'flushes': self._flushes,
+                'rows_written': self._rows_written
+            }
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+        self.flush()
+
+
+def create_session_store(backend: str, storage: Storage, flush_interval: float = 1.0) -> SessionStore:
+    """Create the session state backend ("storage" or "memory") and register shutdown"""
+    if backend == 'memory':
+        store: SessionStore = MemorySessionStore()
+    elif backend == 'storage':
+        store = SharedSessionStore(storage, flush_interval=flush_interval)
+        store.start()
+    else:
+        raise ValueError(f"Unknown session state backend: {backend}")
+    atexit.register(store.close)
+    logger.info(f"🗂️ Session state backend: {backend}")
+    return store
@@ -0,0 +1,72 @@
+"""
+VisiSec Socket.IO Message Queue
+多进程部署时跨进程房间广播的可插拔消息队列（Redis/Kafka/AMQP 等 URL，或进程内替身 local）
+"""
+
+from typing import Any, Dict, List, Optional
+import queue
+import threading
+
+import socketio
+
+
+class LocalMessageBus:
+    """
+    In-process fan-out used as a stand-in for Redis/AMQP: every published
+    message is delivered to every subscriber of the channel, the publisher
+    included (pub/sub managers skip their own messages by ``host_id``).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List["queue.Queue[Dict[str, Any]]"]] = {}
+
+    def subscribe(self, channel: str) -> "queue.Queue[Dict[str, Any]]":
+        inbox: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(inbox)
+        return inbox
+
+    def publish(self, channel: str, message: Dict[str, Any]):
+        with self._lock:
+            inboxes = list(self._subscribers.get(channel, ()))
+        for inbox in inboxes:
+            inbox.put(message)
+
+
+default_bus = LocalMessageBus()
+
+
+class LocalPubSubManager(socketio.PubSubManager):
+    """
+    Socket.IO client manager over a ``LocalMessageBus``. Several servers in
+    one process (tests, the single-process development server) behave as
+    if they were separate workers sharing a message queue.
+    """
+
+    name = 'local'
+
+    def __init__(self, bus: Optional[LocalMessageBus] = None, channel: str = 'socketio', write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.bus = bus or default_bus
+        self._inbox = None if write_only else self.bus.subscribe(channel)
+
+    def _publish(self, data: Dict[str, Any]):
+        self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        while True:
+            yield self._inbox.get()
+
+
+def message_queue_options(url: str, channel: str) -> Dict[str, Any]:
+    """
+    Keyword arguments for ``SocketIO(...)``: nothing for a single process,
+    an in-process manager for ``local``, otherwise the URL is handed to
+    Flask-SocketIO (``redis://``, ``kafka://``, ``zmq+tcp://``, any Kombu URL).
+    """
+    if not url:
+        return {}
+    if url == 'local':
+        return {'client_manager': LocalPubSubManager(channel=channel)}
+    return {'message_queue': url, 'channel': channel}
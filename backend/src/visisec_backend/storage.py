@@ -0,0 +1,680 @@
+"""
+VisiSec Storage Engine
+用户、会议、会话与传感器记录的持久化存储（可插拔接口：内存 / SQLite WAL）
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import abc
+import atexit
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Columns stored for each meeting; anything else goes into the ``extra`` JSON blob
+MEETING_FIELDS = (
+    'recording_id', 'owner', 'meeting_title', 'start_time', 'end_time', 'status',
+    'sensor_data_count', 'keyframe_count', 'generated_summary', 'summary_generated_at',
+)
+# Columns stored for each live session; counters, summary and timestamps go into ``extra``
+SESSION_FIELDS = (
+    'session_id', 'recording_id', 'owner', 'meeting_title', 'start_time',
+    'worker', 'status', 'lease_until', 'handoff',
+)
+# Per-event sensor summary rows (see sensor_buffers.SAMPLE_COLUMNS)
+SENSOR_FIELDS = ('t', 'client_t', 'avg_accel', 'imu_points', 'app_foreground', 'app_switches', 'distracted')
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(start_time: str, recording_id: str) -> str:
+    """Opaque keyset cursor: the (start_time, recording_id) of the last row of a page"""
+    raw = json.dumps([start_time, recording_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_time, recording_id = json.loads(base64.urlsafe_b64decode(padded))
+        return str(start_time), str(recording_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+class Storage(abc.ABC):
+    """
+    Storage interface used by the API layer.
+
+    Meetings are paged newest first with keyset cursors, so page N costs
+    the same as page 1 no matter how many meetings an owner has.
+    ``start``/``end`` bound ``start_time`` (ISO strings, compared as text).
+    """
+
+    # Users
+    @abc.abstractmethod
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        """The user record, or None"""
+
+    @abc.abstractmethod
+    def create_user(self, user: Dict[str, Any]) -> bool:
+        """Insert a new user; False if the username is taken"""
+
+    @abc.abstractmethod
+    def update_user(self, username: str, **fields) -> bool:
+        """Set fields on an existing user; False if there is none"""
+
+    # Meetings
+    @abc.abstractmethod
+    def save_meeting(self, meeting: Dict[str, Any]):
+        """Insert or replace a meeting record"""
+
+    @abc.abstractmethod
+    def update_meeting(self, recording_id: str, **fields) -> bool:
+        """Set fields on an existing meeting; False if there is none"""
+
+    @abc.abstractmethod
+    def get_meeting(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """The meeting record, or None"""
+
+    @abc.abstractmethod
+    def list_meetings(
+        self,
+        owner: Optional[str] = None,
+        start: Optional[str] = None,
+        end: Optional[str] = None,
+        title: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return (meetings, next_cursor); next_cursor is None on the last page"""
+
+    # Active recording sessions (state only; buffers stay with the owning worker)
+    @abc.abstractmethod
+    def save_session(self, session: Dict[str, Any]):
+        """Insert or replace a live session's state"""
+
+    @abc.abstractmethod
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The live session's state, or None"""
+
+    @abc.abstractmethod
+    def find_session(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        """The live session recording ``recording_id``, if any"""
+
+    @abc.abstractmethod
+    def update_sessions(self, updates: Dict[str, Dict[str, Any]]):
+        """Merge ``{session_id: fields}`` into existing sessions in one transaction"""
+
+    @abc.abstractmethod
+    def claim_session(self, session_id: str, worker: str, lease_until: float, now: float) -> bool:
+        """
+        Make ``worker`` the owner if the session is unowned, already its own
+        or its owner's lease ran out before ``now``; clears any handoff request.
+        """
+
+    @abc.abstractmethod
+    def release_session(self, session_id: str, worker: str) -> bool:
+        """Drop ownership, but only if ``worker`` still holds it"""
+
+    @abc.abstractmethod
+    def renew_sessions(self, session_ids: List[str], worker: str, lease_until: float):
+        """Extend the leases ``worker`` still holds"""
+
+    @abc.abstractmethod
+    def delete_session(self, session_id: str):
+        """Forget a live session (ended or recorded as interrupted)"""
+
+    @abc.abstractmethod
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        """Every live session, owned or not"""
+
+    # High-volume sensor rows
+    @abc.abstractmethod
+    def append_sensor_rows(self, recording_id: str, rows: List[Dict[str, Any]]):
+        """Queue rows for a batched write"""
+
+    @abc.abstractmethod
+    def sensor_rows(self, recording_id: str, start: Optional[float] = None, end: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Rows with ``start <= t < end`` in time order, pending ones included"""
+
+    def flush(self):
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {}
+
+    def close(self):
+        self.flush()
+
+
+def _page(
+    meetings: List[Dict[str, Any]],
+    limit: int,
+    cursor: Optional[str],
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Keyset paging over meetings already sorted newest first"""
+    if cursor:
+        after = decode_cursor(cursor)
+        meetings = [m for m in meetings if (m['start_time'], m['recording_id']) < after]
+    page = meetings[:limit]
+    next_cursor = None
+    if len(meetings) > limit:
+        next_cursor = encode_cursor(page[-1]['start_time'], page[-1]['recording_id'])
+    return page, next_cursor
+
+
+def _limit(limit: Optional[int]) -> int:
+    return max(1, min(int(limit or DEFAULT_PAGE_SIZE), MAX_PAGE_SIZE))
+
+
+class MemoryStorage(Storage):
+    """Dict-backed storage; nothing survives a restart (development / tests)"""
+
+    def __init__(self):
+        self._users: Dict[str, Dict[str, Any]] = {}
+        self._meetings: Dict[str, Dict[str, Any]] = {}
+        self._sessions: Dict[str, Dict[str, Any]] = {}
+        self._sensor_rows: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        user = self._users.get(username)
+        return dict(user) if user is not None else None
+
+    def create_user(self, user: Dict[str, Any]) -> bool:
+        with self._lock:
+            if user['username'] in self._users:
+                return False
+            self._users[user['username']] = dict(user)
+            return True
+
+    def update_user(self, username: str, **fields) -> bool:
+        with self._lock:
+            if username not in self._users:
+                return False
+            self._users[username].update(fields)
+            return True
+
+    def save_meeting(self, meeting: Dict[str, Any]):
+        with self._lock:
+            self._meetings[meeting['recording_id']] = dict(meeting)
+
+    def update_meeting(self, recording_id: str, **fields) -> bool:
+        with self._lock:
+            if recording_id not in self._meetings:
+                return False
+            self._meetings[recording_id].update(fields)
+            return True
+
+    def get_meeting(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        meeting = self._meetings.get(recording_id)
+        return dict(meeting) if meeting is not None else None
+
+    def list_meetings(self, owner=None, start=None, end=None, title=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        with self._lock:
+            meetings = [dict(m) for m in self._meetings.values()]
+        title = title.lower() if title else None
+        meetings = [
+            m for m in meetings
+            if (owner is None or m.get('owner') == owner)
+            and (start is None or m['start_time'] >= start)
+            and (end is None or m['start_time'] < end)
+            and (title is None or title in (m.get('meeting_title') or '').lower())
+        ]
+        meetings.sort(key=lambda m: (m['start_time'], m['recording_id']), reverse=True)
+        return _page(meetings, _limit(limit), cursor)
+
+    def save_session(self, session: Dict[str, Any]):
+        with self._lock:
+            self._sessions[session['session_id']] = {**{k: None for k in SESSION_FIELDS}, **session}
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return dict(session) if session else None
+
+    def find_session(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for session in self._sessions.values():
+                if session['recording_id'] == recording_id:
+                    return dict(session)
+        return None
+
+    def update_sessions(self, updates: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            for session_id, fields in updates.items():
+                if session_id in self._sessions:
+                    self._sessions[session_id].update(fields)
+
+    def claim_session(self, session_id: str, worker: str, lease_until: float, now: float) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            if session['worker'] not in (None, worker) and (session['lease_until'] or 0) >= now:
+                return False
+            session.update(worker=worker, lease_until=lease_until, handoff=None)
+            return True
+
+    def release_session(self, session_id: str, worker: str) -> bool:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session['worker'] != worker:
+                return False
+            session.update(worker=None, lease_until=None)
+            return True
+
+    def renew_sessions(self, session_ids: List[str], worker: str, lease_until: float):
+        with self._lock:
+            for session_id in session_ids:
+                session = self._sessions.get(session_id)
+                if session is not None and session['worker'] == worker:
+                    session['lease_until'] = lease_until
+
+    def delete_session(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(s) for s in self._sessions.values()]
+
+    def append_sensor_rows(self, recording_id: str, rows: List[Dict[str, Any]]):
+        with self._lock:
+            self._sensor_rows.setdefault(recording_id, []).extend(rows)
+
+    def sensor_rows(self, recording_id: str, start=None, end=None) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = list(self._sensor_rows.get(recording_id, []))
+        return [
+            r for r in rows
+            if (start is None or r['t'] >= start) and (end is None or r['t'] < end)
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'backend': 'memory',
+            'users': len(self._users),
+            'meetings': len(self._meetings),
+            'sessions': len(self._sessions),
+            'sensor_rows': sum(len(rows) for rows in self._sensor_rows.values())
+        }
+
+
+class SQLiteStorage(Storage):
+    """
+    SQLite storage in WAL mode over one reused connection.
+
+    Readers never block the writer in WAL mode, so the lock only
+    serialises use of the shared connection. Sensor rows are buffered and
+    written with ``executemany`` in a single transaction once
+    ``sensor_batch_size`` rows are pending or ``sensor_flush_interval``
+    seconds have passed, instead of one commit per event.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        sensor_batch_size: int = 500,
+        sensor_flush_interval: float = 2.0,
+    ):
+        self.db_path = db_path
+        self.sensor_batch_size = max(1, sensor_batch_size)
+        self.sensor_flush_interval = sensor_flush_interval
+
+        self._lock = threading.Lock()
+        self._pending: List[Tuple[Any, ...]] = []
+        self._last_flush = time.monotonic()
+        self._rows_written = 0
+        self._flushes = 0
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA busy_timeout=5000')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS users ('
+            ' username TEXT PRIMARY KEY,'
+            ' password TEXT NOT NULL,'
+            ' created_at TEXT,'
+            ' extra TEXT);'
+            'CREATE TABLE IF NOT EXISTS meetings ('
+            ' recording_id TEXT PRIMARY KEY,'
+            ' owner TEXT,'
+            ' meeting_title TEXT,'
+            ' start_time TEXT NOT NULL,'
+            ' end_time TEXT,'
+            ' status TEXT,'
+            ' sensor_data_count INTEGER,'
+            ' keyframe_count INTEGER,'
+            ' generated_summary TEXT,'
+            ' summary_generated_at TEXT,'
+            ' extra TEXT);'
+            'CREATE INDEX IF NOT EXISTS idx_meetings_owner_start ON meetings (owner, start_time DESC, recording_id DESC);'
+            'CREATE INDEX IF NOT EXISTS idx_meetings_start ON meetings (start_time DESC, recording_id DESC);'
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            ' session_id TEXT PRIMARY KEY,'
+            ' recording_id TEXT NOT NULL,'
+            ' owner TEXT,'
+            ' meeting_title TEXT,'
+            ' start_time TEXT,'
+            ' worker TEXT,'
+            ' status TEXT,'
+            ' lease_until REAL,'
+            ' handoff TEXT,'
+            ' extra TEXT,'
+            ' updated_at REAL);'
+            'CREATE INDEX IF NOT EXISTS idx_sessions_recording ON sessions (recording_id);'
+            'CREATE TABLE IF NOT EXISTS sensor_samples ('
+            ' recording_id TEXT NOT NULL,'
+            ' t REAL NOT NULL,'
+            ' client_t REAL,'
+            ' avg_accel REAL,'
+            ' imu_points INTEGER,'
+            ' app_foreground INTEGER,'
+            ' app_switches INTEGER,'
+            ' distracted INTEGER);'
+            'CREATE INDEX IF NOT EXISTS idx_sensor_samples_recording_t ON sensor_samples (recording_id, t);'
+        )
+        # Databases created before sessions carried their worker, lease and extra state
+        columns = {row['name'] for row in self._db.execute('PRAGMA table_info(sessions)')}
+        for column, kind in (('worker', 'TEXT'), ('status', 'TEXT'), ('lease_until', 'REAL'),
+                             ('handoff', 'TEXT'), ('extra', 'TEXT')):
+            if column not in columns:
+                self._db.execute(f"ALTER TABLE sessions ADD COLUMN {column} {kind}")
+        logger.info(f"💾 SQLite storage ready: {db_path}")
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _execute(self, sql: str, params: Tuple = ()) -> int:
+        with self._lock:
+            return self._db.execute(sql, params).rowcount
+
+    @staticmethod
+    def _split(record: Dict[str, Any], fields: Tuple[str, ...]) -> Tuple[List[Any], Optional[str]]:
+        values = [record.get(name) for name in fields]
+        extra = {k: v for k, v in record.items() if k not in fields}
+        return values, json.dumps(extra, ensure_ascii=False) if extra else None
+
+    @staticmethod
+    def _merge(row: sqlite3.Row) -> Dict[str, Any]:
+        record = {k: row[k] for k in row.keys() if k != 'extra'}
+        if row['extra']:
+            record.update(json.loads(row['extra']))
+        return record
+
+    # Users
+    def get_user(self, username: str) -> Optional[Dict[str, Any]]:
+        rows = self._query('SELECT * FROM users WHERE username = ?', (username,))
+        return self._merge(rows[0]) if rows else None
+
+    def create_user(self, user: Dict[str, Any]) -> bool:
+        values, extra = self._split(user, ('username', 'password', 'created_at'))
+        return self._execute(
+            'INSERT OR IGNORE INTO users (username, password, created_at, extra) VALUES (?, ?, ?, ?)',
+            (*values, extra)
+        ) == 1
+
+    def update_user(self, username: str, **fields) -> bool:
+        user = self.get_user(username)
+        if user is None:
+            return False
+        user.update(fields)
+        values, extra = self._split(user, ('username', 'password', 'created_at'))
+        return self._execute(
+            'UPDATE users SET password = ?, created_at = ?, extra = ? WHERE username = ?',
+            (values[1], values[2], extra, username)
+        ) == 1
+
+    # Meetings
+    def save_meeting(self, meeting: Dict[str, Any]):
+        values, extra = self._split(meeting, MEETING_FIELDS)
+        self._execute(
+            f"INSERT OR REPLACE INTO meetings ({', '.join(MEETING_FIELDS)}, extra) "
+            f"VALUES ({', '.join('?' * (len(MEETING_FIELDS) + 1))})",
+            (*values, extra)
+        )
+
+    def update_meeting(self, recording_id: str, **fields) -> bool:
+        columns = {k: v for k, v in fields.items() if k in MEETING_FIELDS and k != 'recording_id'}
+        if len(columns) != len(fields):
+            # Fields outside the fixed columns live in the JSON blob
+            meeting = self.get_meeting(recording_id)
+            if meeting is None:
+                return False
+            meeting.update(fields)
+            self.save_meeting(meeting)
+            return True
+        if not columns:
+            return self.get_meeting(recording_id) is not None
+        assignments = ', '.join(f"{k} = ?" for k in columns)
+        return self._execute(
+            f"UPDATE meetings SET {assignments} WHERE recording_id = ?",
+            (*columns.values(), recording_id)
+        ) == 1
+
+    def get_meeting(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query('SELECT * FROM meetings WHERE recording_id = ?', (recording_id,))
+        return self._merge(rows[0]) if rows else None
+
+    def list_meetings(self, owner=None, start=None, end=None, title=None, limit=DEFAULT_PAGE_SIZE, cursor=None):
+        limit = _limit(limit)
+        clauses, params = [], []
+        if owner is not None:
+            clauses.append('owner = ?')
+            params.append(owner)
+        if start is not None:
+            clauses.append('start_time >= ?')
+            params.append(start)
+        if end is not None:
+            clauses.append('start_time < ?')
+            params.append(end)
+        if title:
+            clauses.append("meeting_title LIKE ? ESCAPE '\\'")
+            escaped = title.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f"%{escaped}%")
+        if cursor:
+            clauses.append('(start_time, recording_id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        # One extra row tells whether another page exists
+        rows = self._query(
+            f"SELECT * FROM meetings {where} ORDER BY start_time DESC, recording_id DESC LIMIT ?",
+            (*params, limit + 1)
+        )
+        meetings = [self._merge(row) for row in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor(meetings[-1]['start_time'], meetings[-1]['recording_id'])
+        return meetings, next_cursor
+
+    # Sessions
+    def save_session(self, session: Dict[str, Any]):
+        values, extra = self._split(session, SESSION_FIELDS)
+        self._execute(
+            f"INSERT OR REPLACE INTO sessions ({', '.join(SESSION_FIELDS)}, extra, updated_at) "
+            f"VALUES ({', '.join('?' * (len(SESSION_FIELDS) + 2))})",
+            (*values, extra, time.time())
+        )
+
+    def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query('SELECT * FROM sessions WHERE session_id = ?', (session_id,))
+        return self._merge(rows[0]) if rows else None
+
+    def find_session(self, recording_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(
+            'SELECT * FROM sessions WHERE recording_id = ? ORDER BY updated_at DESC LIMIT 1', (recording_id,)
+        )
+        return self._merge(rows[0]) if rows else None
+
+    def update_sessions(self, updates: Dict[str, Dict[str, Any]]):
+        if not updates:
+            return
+        assignments = ', '.join(f"{k} = ?" for k in SESSION_FIELDS[1:])
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so the read-merge-write
+            # cannot interleave with another worker's update
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                for session_id, fields in updates.items():
+                    row = self._db.execute('SELECT * FROM sessions WHERE session_id = ?', (session_id,)).fetchone()
+                    if row is None:
+                        continue
+                    session = {**self._merge(row), **fields}
+                    session.pop('updated_at', None)
+                    values, extra = self._split(session, SESSION_FIELDS)
+                    self._db.execute(
+                        f"UPDATE sessions SET {assignments}, extra = ?, updated_at = ? WHERE session_id = ?",
+                        (*values[1:], extra, now, session_id)
+                    )
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def claim_session(self, session_id: str, worker: str, lease_until: float, now: float) -> bool:
+        return self._execute(
+            'UPDATE sessions SET worker = ?, lease_until = ?, handoff = NULL, updated_at = ? '
+            'WHERE session_id = ? AND (worker IS NULL OR worker = ? OR lease_until IS NULL OR lease_until < ?)',
+            (worker, lease_until, now, session_id, worker, now)
+        ) == 1
+
+    def release_session(self, session_id: str, worker: str) -> bool:
+        return self._execute(
+            'UPDATE sessions SET worker = NULL, lease_until = NULL, updated_at = ? WHERE session_id = ? AND worker = ?',
+            (time.time(), session_id, worker)
+        ) == 1
+
+    def renew_sessions(self, session_ids: List[str], worker: str, lease_until: float):
+        if not session_ids:
+            return
+        with self._lock:
+            try:
+                self._db.execute('BEGIN')
+                self._db.executemany(
+                    'UPDATE sessions SET lease_until = ? WHERE session_id = ? AND worker = ?',
+                    [(lease_until, session_id, worker) for session_id in session_ids]
+                )
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def delete_session(self, session_id: str):
+        self._execute('DELETE FROM sessions WHERE session_id = ?', (session_id,))
+
+    def list_sessions(self) -> List[Dict[str, Any]]:
+        return [self._merge(row) for row in self._query('SELECT * FROM sessions ORDER BY updated_at')]
+
+    # Sensor rows
+    def append_sensor_rows(self, recording_id: str, rows: List[Dict[str, Any]]):
+        flush = False
+        with self._lock:
+            self._pending.extend((recording_id, *(row.get(k) for k in SENSOR_FIELDS)) for row in rows)
+            if (len(self._pending) >= self.sensor_batch_size
+                    or time.monotonic() - self._last_flush >= self.sensor_flush_interval):
+                flush = True
+        if flush:
+            self.flush()
+
+    def flush(self):
+        """Write all pending sensor rows in one transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, []
+            try:
+                self._db.execute('BEGIN')
+                self._db.executemany(
+                    f"INSERT INTO sensor_samples (recording_id, {', '.join(SENSOR_FIELDS)}) "
+                    f"VALUES ({', '.join('?' * (len(SENSOR_FIELDS) + 1))})",
+                    pending
+                )
+                self._db.execute('COMMIT')
+            except sqlite3.Error:
+                self._db.execute('ROLLBACK')
+                self._pending[:0] = pending
+                raise
+            self._rows_written += len(pending)
+            self._flushes += 1
+
+    def sensor_rows(self, recording_id: str, start=None, end=None) -> List[Dict[str, Any]]:
+        self.flush()
+        rows = self._query(
+            f"SELECT {', '.join(SENSOR_FIELDS)} FROM sensor_samples "
+            'WHERE recording_id = ? AND t >= ? AND t < ? ORDER BY t',
+            (recording_id, start if start is not None else float('-inf'), end if end is not None else float('inf'))
+        )
+        return [dict(row) for row in rows]
+
+    def start(self):
+        """Background flusher so a quiet session's last rows still get written"""
+        def run():
+            while not self._stop.wait(self.sensor_flush_interval):
+                try:
+                    self.flush()
+                except sqlite3.Error as e:
+                    logger.error(f"❌ Sensor row flush failed: {str(e)}")
+
+        self._flusher = threading.Thread(target=run, name='storage-flusher', daemon=True)
+        self._flusher.start()
+
+    def stats(self) -> Dict[str, Any]:
+        counts = {
+            table: self._query(f"SELECT COUNT(*) FROM {table}")[0][0]
+            for table in ('users', 'meetings', 'sessions')
+        }
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            'backend': 'sqlite',
+            'db_path': self.db_path,
+            **counts,
+            'sensor_rows_written': self._rows_written,
+            'sensor_rows_pending': pending,
+            'sensor_flushes': self._flushes
+        }
+
+    def close(self):
+        self._stop.set()
+        self.flush()
+        with self._lock:
+            self._db.close()
+
+
+def create_storage(
+    backend: str,
+    db_path: str,
+    sensor_batch_size: int = 500,
+    sensor_flush_interval: float = 2.0,
+) -> Storage:
+    """Create the process-wide storage backend ("sqlite" or "memory") and register shutdown"""
+    if backend == 'memory':
+        logger.warning("⚠️ Using in-memory storage: users and meetings are lost on restart")
+        return MemoryStorage()
+    if backend != 'sqlite':
+        raise ValueError(f"Unknown storage backend: {backend}")
+    storage = SQLiteStorage(
+        db_path,
+        sensor_batch_size=sensor_batch_size,
+        sensor_flush_interval=sensor_flush_interval
+    )
+    storage.start()
+    atexit.register(storage.close)
+    return storage
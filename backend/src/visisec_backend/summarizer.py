@@ -0,0 +1,281 @@
+"""
+VisiSec Map-Reduce Summarizer
+长会议记录的分块并行摘要（按时间/发言人分块 → 并发 map → 合并 reduce）
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+LLMCall = Callable[[List[Dict[str, str]]], Awaitable[str]]
+
+SUMMARY_SYSTEM_PROMPT = "你是一个专业的会议助手。请分析会议记录，生成结构化的摘要，包括：1) 执行摘要 2) 关键要点 3) 行动项（带负责人和截止日期）。请用中文回复，格式清晰。"
+
+# The chunk prompt deliberately omits the chunk index/count: an edit that
+# changes the number of chunks must not invalidate the cached map results
+# of the chunks that did not change.
+CHUNK_SYSTEM_PROMPT = "你是一个专业的会议助手。以下是一场较长会议中某个时间段的记录。请提取本段的关键讨论、已做出的决定和行动项（负责人、截止日期），保持简洁，用中文回复。"
+
+COMBINE_SYSTEM_PROMPT = "你是一个专业的会议助手。以下是同一场会议若干连续时间段的分段摘要。请将它们合并为一份更精炼的分段摘要，保留所有决定和行动项（负责人、截止日期），用中文回复。"
+
+_TIME_PREFIX = re.compile(r'^\s*\[?(\d{1,2}:\d{2}(?::\d{2})?)\]?\s*')
+_SPEAKER_LINE = re.compile(r'^([^:：\s][^:：]{0,30})[:：]\s*(.*)$')
+
+
+def build_summary_messages(transcript: str) -> List[Dict[str, str]]:
+    """构造会议摘要的 LLM 消息（单次完整摘要）"""
+    return [
+        {
+            "role": "system",
+            "content": SUMMARY_SYSTEM_PROMPT
+        },
+        {
+            "role": "user",
+            "content": f"请为以下会议记录生成摘要：\n\n{transcript}"
+        }
+    ]
+
+
+def _parse_clock(value: str) -> float:
+    parts = [int(p) for p in value.split(':')]
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return parts[0] * 60 + parts[1]
+
+
+def _format_clock(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def parse_transcript(transcript: Any) -> List[Dict[str, Any]]:
+    """
+    Normalize a transcript into segments ``{start, speaker, text}``.
+
+    Accepts either a list of segment dicts (``start``/``speaker``/``text``)
+    or plain text with one ``[hh:mm:ss] 发言人: 内容`` turn per line; the
+    timestamp prefix is optional and continuation lines are appended to the
+    previous turn.
+    """
+    if isinstance(transcript, list):
+        return [
+            {
+                'start': float(seg['start']) if seg.get('start') is not None else None,
+                'speaker': seg.get('speaker') or '',
+                'text': str(seg.get('text', '')).strip()
+            }
+            for seg in transcript
+            if str(seg.get('text', '')).strip()
+        ]
+
+    segments: List[Dict[str, Any]] = []
+    for raw_line in str(transcript).splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        start = None
+        match = _TIME_PREFIX.match(line)
+        if match and _SPEAKER_LINE.match(line[match.end():]):
+            start = float(_parse_clock(match.group(1)))
+            line = line[match.end():]
+
+        speaker_match = _SPEAKER_LINE.match(line)
+        if speaker_match:
+            segments.append({
+                'start': start,
+                'speaker': speaker_match.group(1).strip(),
+                'text': speaker_match.group(2).strip()
+            })
+        elif segments:
+            segments[-1]['text'] += '\n' + line
+        else:
+            segments.append({'start': start, 'speaker': '', 'text': line})
+    return segments
+
+
+def chunk_segments(
+    segments: List[Dict[str, Any]],
+    chunk_seconds: float,
+    chunk_chars: int,
+    chunk_turns: int
+) -> List[List[Dict[str, Any]]]:
+    """
+    Split segments into chunks on speaker-turn boundaries.
+
+    Timed transcripts are bucketed by fixed time windows and untimed ones
+    by fixed turn counts, so editing one part of a transcript leaves the
+    boundaries (and therefore cached map results) of other chunks intact.
+    Oversized buckets are further split greedily by ``chunk_chars``.
+    """
+    has_times = any(seg['start'] is not None for seg in segments)
+
+    buckets: List[List[Dict[str, Any]]] = []
+    current_key = None
+    last_start = 0.0
+    for index, seg in enumerate(segments):
+        if has_times:
+            if seg['start'] is not None:
+                last_start = seg['start']
+            key = int(last_start // chunk_seconds)
+        else:
+            key = index // chunk_turns
+        if key != current_key:
+            buckets.append([])
+            current_key = key
+        buckets[-1].append(seg)
+
+    chunks: List[List[Dict[str, Any]]] = []
+    for bucket in buckets:
+        current: List[Dict[str, Any]] = []
+        size = 0
+        for seg in bucket:
+            seg_size = len(seg['speaker']) + len(seg['text']) + 2
+            if current and size + seg_size > chunk_chars:
+                chunks.append(current)
+                current, size = [], 0
+            current.append(seg)
+            size += seg_size
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def render_segments(segments: List[Dict[str, Any]]) -> str:
+    """Render segments back into transcript lines"""
+    lines = []
+    for seg in segments:
+        prefix = f"[{_format_clock(seg['start'])}] " if seg['start'] is not None else ''
+        speaker = f"{seg['speaker']}: " if seg['speaker'] else ''
+        lines.append(f"{prefix}{speaker}{seg['text']}")
+    return '\n'.join(lines)
+
+
+def _chunk_label(chunk: List[Dict[str, Any]]) -> str:
+    starts = [seg['start'] for seg in chunk if seg['start'] is not None]
+    if not starts:
+        return ''
+    return f"{_format_clock(min(starts))}–{_format_clock(max(starts))}"
+
+
+class MapReduceSummarizer:
+    """
+    Chunked summarization engine.
+
+    Short transcripts go through a single pass with the original prompt.
+    Long ones are chunked, each chunk is summarized concurrently (bounded by
+    ``max_concurrency``), and the partial summaries are reduced into the
+    final structured summary. Per-chunk caching comes from the
+    content-addressed LLM cache: an unchanged chunk produces identical
+    messages and is served without an upstream call.
+    """
+
+    def __init__(
+        self,
+        llm: LLMCall,
+        max_concurrency: int = 4,
+        single_pass_chars: int = 8000,
+        chunk_seconds: float = 600.0,
+        chunk_chars: int = 6000,
+        chunk_turns: int = 50,
+    ):
+        self.llm = llm
+        self.max_concurrency = max(1, max_concurrency)
+        self.single_pass_chars = single_pass_chars
+        self.chunk_seconds = chunk_seconds
+        self.chunk_chars = chunk_chars
+        self.chunk_turns = chunk_turns
+
+    def _is_short(self, transcript: Any) -> bool:
+        return isinstance(transcript, str) and len(transcript) <= self.single_pass_chars
+
+    async def map_chunk(self, chunk: List[Dict[str, Any]]) -> str:
+        """Summarize one chunk; the result is prefixed with its time range"""
+        label = _chunk_label(chunk)
+        header = f"时间段 {label}\n\n" if label else ''
+        messages = [
+            {"role": "system", "content": CHUNK_SYSTEM_PROMPT},
+            {"role": "user", "content": f"{header}{render_segments(chunk)}"}
+        ]
+        partial = await self.llm(messages)
+        return f"[{label}]\n{partial}" if label else partial
+
+    async def _map(self, chunks: List[List[Dict[str, Any]]]) -> List[str]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded(chunk: List[Dict[str, Any]]) -> str:
+            async with semaphore:
+                return await self.map_chunk(chunk)
+
+        return list(await asyncio.gather(*(bounded(c) for c in chunks)))
+
+    async def _combine(self, labelled: List[str]) -> List[str]:
+        """Hierarchically merge partial summaries until they fit one reduce call"""
+        while len(labelled) > 1 and sum(len(p) for p in labelled) > self.single_pass_chars:
+            groups: List[List[str]] = [[]]
+            size = 0
+            for part in labelled:
+                if groups[-1] and size + len(part) > self.single_pass_chars:
+                    groups.append([])
+                    size = 0
+                groups[-1].append(part)
+                size += len(part)
+            if len(groups) == len(labelled):
+                # Every partial is already larger than the budget; stop merging
+                break
+
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def combine_group(group: List[str]) -> str:
+                if len(group) == 1:
+                    return group[0]
+                messages = [
+                    {"role": "system", "content": COMBINE_SYSTEM_PROMPT},
+                    {"role": "user", "content": '\n\n'.join(group)}
+                ]
+                async with semaphore:
+                    return await self.llm(messages)
+
+            labelled = list(await asyncio.gather(*(combine_group(g) for g in groups)))
+        return labelled
+
+    async def prepare(self, transcript: Any) -> List[Dict[str, str]]:
+        """
+        Run the map phase and return the messages for the final reduce call.
+        Lets callers choose how to run the reduce (blocking or streaming).
+        """
+        if self._is_short(transcript):
+            return build_summary_messages(transcript)
+
+        segments = parse_transcript(transcript)
+        chunks = chunk_segments(segments, self.chunk_seconds, self.chunk_chars, self.chunk_turns)
+        if len(chunks) <= 1:
+            return build_summary_messages(render_segments(segments))
+
+        started = time.perf_counter()
+        logger.info(f"🧩 Map-reduce summary: {len(segments)} segments in {len(chunks)} chunks")
+        partials = await self._map(chunks)
+        logger.info(f"🧩 Map phase finished in {time.perf_counter() - started:.2f}s")
+        return await self.reduce_messages(partials)
+
+    async def reduce_messages(self, partials: List[str]) -> List[Dict[str, str]]:
+        """Messages for the final reduce over ordered partial summaries"""
+        partials = await self._combine(partials)
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {
+                "role": "user",
+                "content": "以下是一场会议按时间顺序的分段摘要，请据此生成完整的会议摘要：\n\n" + '\n\n'.join(partials)
+            }
+        ]
+
+    async def summarize(self, transcript: Any) -> str:
+        """Full summary: map (if needed) then reduce"""
+        messages = await self.prepare(transcript)
+        return await self.llm(messages)
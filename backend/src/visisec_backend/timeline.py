@@ -0,0 +1,296 @@
+"""
+VisiSec Timeline Pyramid
+会议时间轴的多分辨率降采样金字塔（min/max/mean）与关键帧时间戳索引
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import shutil
+import time
+
+import numpy as np
+
+from .attention import MAX_WINDOWS, score_attention
+from .sensor_archive import SensorArchive
+
+logger = logging.getLogger(__name__)
+
+TIMELINE_DIR = 'timeline'
+INDEX_FILE = 'index.json'
+LEVEL_DTYPE = np.dtype([('min', '<f4'), ('max', '<f4'), ('mean', '<f4'), ('count', '<u4')])
+KEYFRAME_DTYPE = np.dtype([('t', '<f8'), ('source', 'i1'), ('change_detected', 'i1'), ('attention_score', '<f4')])
+
+
+def _base_level(offsets: np.ndarray, values: np.ndarray, bucket_seconds: float, buckets: int) -> np.ndarray:
+    """Finest level straight from raw samples (offsets sorted, in seconds from t0)"""
+    level = np.zeros(buckets, dtype=LEVEL_DTYPE)
+    level['min'] = level['max'] = level['mean'] = np.nan
+    valid = np.isfinite(values)
+    offsets, values = offsets[valid], values[valid].astype(np.float64)
+    if not len(values):
+        return level
+
+    index = np.minimum((offsets // bucket_seconds).astype(np.int64), buckets - 1)
+    # Sorted bucket ids: each run is one bucket, so reduceat gives per-bucket min/max
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(index)) + 1))
+    occupied = index[starts]
+    counts = np.diff(np.append(starts, len(index)))
+    level['min'][occupied] = np.minimum.reduceat(values, starts)
+    level['max'][occupied] = np.maximum.reduceat(values, starts)
+    level['mean'][occupied] = np.add.reduceat(values, starts) / counts
+    level['count'][occupied] = counts
+    return level
+
+
+def _coarsen(level: np.ndarray, factor: int) -> np.ndarray:
+    """Merge ``factor`` neighbouring buckets; means are weighted by sample count"""
+    padded_len = -(-len(level) // factor) * factor
+    padded = np.zeros(padded_len, dtype=LEVEL_DTYPE)
+    padded['min'] = padded['max'] = padded['mean'] = np.nan
+    padded[:len(level)] = level
+    groups = padded.reshape(-1, factor)
+
+    counts = groups['count'].astype(np.float64)
+    sums = np.nansum(groups['mean'].astype(np.float64) * counts, axis=1)
+    total = counts.sum(axis=1)
+    out = np.zeros(len(groups), dtype=LEVEL_DTYPE)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out['mean'] = np.where(total > 0, sums / total, np.nan)
+        empty = np.isnan(groups['min']).all(axis=1)
+        out['min'] = np.where(empty, np.nan, np.where(np.isnan(groups['min']), np.inf, groups['min']).min(axis=1))
+        out['max'] = np.where(empty, np.nan, np.where(np.isnan(groups['max']), -np.inf, groups['max']).max(axis=1))
+    out['count'] = total
+    return out
+
+
+def _write_series(directory: str, name: str, levels: List[np.ndarray], bucket_seconds: float, factor: int) -> Dict[str, Any]:
+    series_dir = os.path.join(directory, name)
+    os.makedirs(series_dir, exist_ok=True)
+    info = []
+    for k, level in enumerate(levels):
+        np.save(os.path.join(series_dir, f"L{k}.npy"), level)
+        info.append({'bucket_seconds': bucket_seconds * factor ** k, 'buckets': len(level)})
+    return {'levels': info}
+
+
+class TimelineBuilder:
+    """
+    Precomputes per-recording zoom levels for the Timeline view.
+
+    Level 0 buckets raw samples into ``base_seconds`` bins; each further
+    level merges ``factor`` bins until one bin covers the whole recording.
+    Every bin keeps min / max / mean / count, so a zoomed-out curve still
+    shows spikes that a plain mean would flatten. Attention scores start at
+    the scorer's window size instead of ``base_seconds``; like level 0, that
+    window is coarsened when a skewed clock stretches the recording.
+    """
+
+    def __init__(
+        self,
+        base_seconds: float = 0.1,
+        factor: int = 4,
+        attention_window_seconds: float = 5.0,
+        max_base_buckets: int = 1 << 22,
+        max_attention_windows: int = MAX_WINDOWS,
+    ):
+        self.base_seconds = base_seconds
+        self.factor = max(2, factor)
+        self.attention_window_seconds = attention_window_seconds
+        self.max_base_buckets = max_base_buckets
+        self.max_attention_windows = max_attention_windows
+
+    def _levels(self, offsets: np.ndarray, values: np.ndarray, bucket_seconds: float, duration: float) -> List[np.ndarray]:
+        buckets = max(1, int(duration // bucket_seconds) + 1)
+        levels = [_base_level(offsets, values, bucket_seconds, buckets)]
+        while len(levels[-1]) > 1:
+            levels.append(_coarsen(levels[-1], self.factor))
+        return levels
+
+    def build(self, archive: SensorArchive) -> Dict[str, Any]:
+        """Build (or rebuild) the pyramid and keyframe index inside the archive directory"""
+        started = time.perf_counter()
+        imu = archive.columns('imu', ['t', 'ax', 'ay', 'az', 'ra', 'rb', 'rg'])
+        app_state = archive.columns('app_state', ['t', 'foreground'])
+        gaze = archive.columns('gaze', ['t', 'on_screen'])
+        keyframes = archive.columns('keyframes')
+
+        # Sensor streams carry client timestamps and keyframes the server receive
+        # time; the axis starts at the first sensor sample, and a skewed clock
+        # that stretches it only coarsens level 0 (see max_base_buckets)
+        streams = [c for c in (imu, app_state, gaze, keyframes) if len(c['t'])]
+        sensor_streams = streams[:-1] if len(keyframes['t']) else streams
+        t0 = float(min(c['t'][0] for c in (sensor_streams or streams))) if streams else 0.0
+        duration = max(0.0, float(max(c['t'][-1] for c in streams)) - t0) if streams else 0.0
+
+        base_seconds = self.base_seconds
+        while duration / base_seconds > self.max_base_buckets:
+            base_seconds *= self.factor
+
+        directory = os.path.join(archive.path, TIMELINE_DIR)
+        partial = f"{directory}.tmp"
+        shutil.rmtree(partial, ignore_errors=True)
+        os.makedirs(partial)
+
+        series = {}
+        imu_offsets = np.asarray(imu['t']) - t0
+        ax, ay, az = (np.asarray(imu[c], dtype=np.float64) for c in ('ax', 'ay', 'az'))
+        ra, rb, rg = (np.asarray(imu[c], dtype=np.float64) for c in ('ra', 'rb', 'rg'))
+        sources = {
+            'motion': (imu_offsets, np.sqrt(ax * ax + ay * ay + az * az)),
+            'rotation': (imu_offsets, np.sqrt(ra * ra + rb * rb + rg * rg)),
+            'foreground': (np.asarray(app_state['t']) - t0, np.asarray(app_state['foreground'], dtype=np.float64)),
+            'gaze': (np.asarray(gaze['t']) - t0, np.asarray(gaze['on_screen'], dtype=np.float64)),
+        }
+        for name, (offsets, values) in sources.items():
+            keep = (offsets >= 0) & (offsets <= duration)
+            levels = self._levels(offsets[keep], values[keep], base_seconds, duration)
+            series[name] = _write_series(partial, name, levels, base_seconds, self.factor)
+
+        # Attention: score once per window over the whole recording, then pyramid the
+        # scores; the sensor streams span at most ``duration``, so a window coarsened
+        # like level 0 keeps the scorer within max_attention_windows
+        window = self.attention_window_seconds
+        while duration / window >= self.max_attention_windows:
+            window *= self.factor
+        try:
+            attention = score_attention(imu, app_state, gaze, window_seconds=window,
+                                        max_windows=self.max_attention_windows)
+        except ValueError as e:
+            logger.warning(f"⚠️ No attention series for {os.path.basename(archive.path)}: {str(e)}")
+            attention = {'attention_score': None, 'timeline': {'scores': []}}
+        scores = np.asarray(attention['timeline']['scores'], dtype=np.float64)
+        score_offsets = attention['timeline'].get('start_time', t0) - t0 + np.arange(len(scores)) * window
+        levels = self._levels(score_offsets, scores, window, duration)
+        series['attention'] = _write_series(partial, 'attention', levels, window, self.factor)
+
+        # Keyframes sorted by timestamp for searchsorted range lookups
+        index = np.zeros(len(keyframes['t']), dtype=KEYFRAME_DTYPE)
+        for name in KEYFRAME_DTYPE.names:
+            index[name] = keyframes[name]
+        index = index[np.argsort(index['t'], kind='stable')]
+        np.save(os.path.join(partial, 'keyframes.npy'), index)
+
+        meta = {
+            't0': t0,
+            'duration': duration,
+            'factor': self.factor,
+            'series': series,
+            'keyframes': int(len(index)),
+            'attention_score': attention['attention_score'],
+            'built_at': time.time()
+        }
+        with open(os.path.join(partial, INDEX_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(partial, directory)
+        logger.info(
+            f"🗺️ Timeline pyramid built for {os.path.basename(archive.path)}: "
+            f"{duration:.0f}s, {len(imu['t'])} IMU rows, {len(index)} keyframes "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return meta
+
+
+def _nullable(values: np.ndarray, digits: int = 4) -> List[Optional[float]]:
+    return [None if v != v else round(v, digits) for v in values.astype(np.float64).tolist()]
+
+
+class Timeline:
+    """Read side: level selection and range slicing over memory-mapped levels"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, INDEX_FILE), 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+    @property
+    def series_names(self) -> List[str]:
+        return list(self.meta['series'])
+
+    def _pick_level(self, levels: List[Dict[str, Any]], span: float, max_points: int, resolution: Optional[float]) -> int:
+        """Finest level that fits ``max_points`` buckets (and is no finer than ``resolution``)"""
+        for k, level in enumerate(levels):
+            if resolution is not None and level['bucket_seconds'] < resolution:
+                continue
+            if span / level['bucket_seconds'] <= max_points:
+                return k
+        return len(levels) - 1
+
+    def series(self, name: str, start: float, end: float, max_points: int, resolution: Optional[float] = None) -> Dict[str, Any]:
+        levels = self.meta['series'][name]['levels']
+        k = self._pick_level(levels, end - start, max_points, resolution)
+        bucket = levels[k]['bucket_seconds']
+        data = np.load(os.path.join(self.path, name, f"L{k}.npy"), mmap_mode='r')
+        first = max(0, int(start // bucket))
+        last = min(len(data), int(np.ceil(end / bucket)))
+        window = np.asarray(data[first:last]) if last > first else np.zeros(0, dtype=LEVEL_DTYPE)
+        return {
+            'level': k,
+            'bucket_seconds': bucket,
+            'start': first * bucket,
+            'min': _nullable(window['min']),
+            'max': _nullable(window['max']),
+            'mean': _nullable(window['mean']),
+            'count': window['count'].tolist()
+        }
+
+    def keyframes(self, start: float, end: float, limit: int) -> Dict[str, Any]:
+        index = np.load(os.path.join(self.path, 'keyframes.npy'), mmap_mode='r')
+        t0 = self.meta['t0']
+        lo = int(np.searchsorted(index['t'], t0 + start, side='left'))
+        hi = int(np.searchsorted(index['t'], t0 + end, side='left'))
+        selected = np.arange(lo, hi)
+        if len(selected) > limit:
+            # Evenly thinned so a zoomed-out view still spans the whole range
+            selected = selected[np.linspace(0, len(selected) - 1, limit).round().astype(np.int64)]
+        rows = np.asarray(index[selected])
+        return {
+            'total': hi - lo,
+            'items': [
+                {
+                    'offset': round(float(row['t']) - t0, 3),
+                    'timestamp': float(row['t']),
+                    'source': 'FRONT' if row['source'] == 1 else 'REAR',
+                    'change_detected': bool(row['change_detected']),
+                    'attention_score': round(float(row['attention_score']), 4)
+                }
+                for row in rows
+            ]
+        }
+
+    def query(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        max_points: int = 1000,
+        resolution: Optional[float] = None,
+        series: Optional[Iterable[str]] = None,
+        keyframes: bool = True,
+    ) -> Dict[str, Any]:
+        """``start``/``end`` are seconds from the start of the recording"""
+        start = max(0.0, start or 0.0)
+        end = self.meta['duration'] + 1e-3 if end is None else end
+        if end <= start:
+            raise ValueError("end must be greater than start")
+        names = list(series) if series else self.series_names
+        unknown = [n for n in names if n not in self.meta['series']]
+        if unknown:
+            raise ValueError(f"Unknown series: {', '.join(unknown)}")
+        result = {
+            't0': self.meta['t0'],
+            'duration': self.meta['duration'],
+            'range': [start, end],
+            'series': {name: self.series(name, start, end, max_points, resolution) for name in names}
+        }
+        if keyframes:
+            result['keyframes'] = self.keyframes(start, end, max_points)
+        return result
+
+
+def open_timeline(archive_path: str) -> Optional[Timeline]:
+    path = os.path.join(archive_path, TIMELINE_DIR)
+    if not os.path.exists(os.path.join(path, INDEX_FILE)):
+        return None
+    return Timeline(path)
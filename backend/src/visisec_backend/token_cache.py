@@ -0,0 +1,82 @@
+"""
+VisiSec Verified Token Cache
+已验证 JWT 的有界 LRU 缓存（遵守 exp、按用户失效）
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+
+
+class TokenCache:
+    """
+    LRU of tokens whose signature and claims were already verified.
+
+    An entry lives until the token's own ``exp`` or ``max_age`` seconds,
+    whichever comes first. ``max_age`` bounds how long a revocation made by
+    another process can go unnoticed here; revocations made in this process
+    take effect immediately through ``invalidate_user``.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_age: float = 60.0):
+        self.max_entries = max(1, max_entries)
+        self.max_age = max_age
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                payload, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(token)
+                    self.hits += 1
+                    return payload
+                del self._entries[token]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        expires_at = time.time() + self.max_age
+        if payload.get('exp') is not None:
+            expires_at = min(expires_at, float(payload['exp']))
+        with self._lock:
+            self._entries[token] = (payload, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_user(self, username: str) -> int:
+        """Drop every cached token of ``username``; returns how many were dropped"""
+        with self._lock:
+            stale = [t for t, (payload, _) in self._entries.items() if payload.get('username') == username]
+            for token in stale:
+                del self._entries[token]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'max_age': self.max_age,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations
+            }
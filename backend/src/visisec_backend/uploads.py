@@ -0,0 +1,308 @@
+"""
+VisiSec Streaming Uploads
+流式上传（分块写入临时文件、边收边哈希、超限即断）与可断点续传的分块上传
+"""
+
+from typing import Any, BinaryIO, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    """Invalid upload request; ``status_code`` is the HTTP status to return"""
+
+    def __init__(self, message: str, status_code: int = 400, **details):
+        super().__init__(message)
+        self.status_code = status_code
+        self.details = details
+
+
+class UploadTooLargeError(UploadError):
+    def __init__(self, max_size: int):
+        super().__init__(f"File too large. Maximum size is {max_size} bytes", 413)
+
+
+def stream_to_file(
+    stream: BinaryIO,
+    path: str,
+    max_size: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """
+    Copy ``stream`` to ``path`` in fixed-size chunks, hashing as it goes.
+    Stops reading and removes the partial file as soon as ``max_size`` is
+    exceeded. Returns (size, sha256 hex digest).
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    partial = f"{path}.part"
+    try:
+        with open(partial, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(max_size)
+                hasher.update(chunk)
+                out.write(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    return size, hasher.hexdigest()
+
+
+def _read_exact(stream: BinaryIO, size: int) -> bytes:
+    """Read up to ``size`` bytes, tolerating short reads from raw streams"""
+    parts = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            break
+        parts.append(chunk)
+        remaining -= len(chunk)
+    return b''.join(parts)
+
+
+class _ChunkedUpload:
+    """State of one resumable upload; persisted next to its spool file"""
+
+    def __init__(self, upload_id: str, spool_dir: str, meta: Dict[str, Any]):
+        self.upload_id = upload_id
+        self.meta = meta
+        self.data_path = os.path.join(spool_dir, f"{upload_id}.part")
+        self.meta_path = os.path.join(spool_dir, f"{upload_id}.json")
+        self.received = 0
+        self.hasher = hashlib.sha256()
+        self.lock = threading.Lock()
+        self.touched_at = time.time()
+
+    @property
+    def chunk_size(self) -> int:
+        return self.meta['chunk_size']
+
+    @property
+    def next_index(self) -> int:
+        return self.received // self.chunk_size
+
+    def save_meta(self):
+        with open(self.meta_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False)
+
+    def to_dict(self) -> Dict[str, Any]:
+        total = self.meta['total_size']
+        return {
+            'upload_id': self.upload_id,
+            'filename': self.meta['filename'],
+            'category': self.meta['category'],
+            'total_size': total,
+            'chunk_size': self.chunk_size,
+            'received': self.received,
+            'next_chunk': self.next_index,
+            'total_chunks': (total + self.chunk_size - 1) // self.chunk_size,
+            'complete': self.received == total
+        }
+
+
+class ChunkedUploadManager:
+    """
+    Resumable upload protocol: init → PUT chunks in order → complete.
+
+    Chunks have a fixed size (the last may be shorter) and are appended to a
+    spool file while being hashed, so completion needs no second pass over
+    the data. A chunk that was already stored (client retry after a lost
+    response) is acknowledged without being written again; the client can
+    always ask for ``next_chunk`` to resume. Upload state is kept on disk,
+    so uploads also survive a server restart.
+    """
+
+    def __init__(
+        self,
+        spool_dir: str,
+        max_size: int,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        ttl: float = 24 * 3600.0,
+    ):
+        self.spool_dir = spool_dir
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self.ttl = ttl
+        self._uploads: Dict[str, _ChunkedUpload] = {}
+        self._lock = threading.Lock()
+        os.makedirs(spool_dir, exist_ok=True)
+
+    def init(self, category: str, filename: str, content_type: str, total_size: int, sha256: Optional[str] = None) -> Dict[str, Any]:
+        if total_size <= 0:
+            raise UploadError("total_size must be positive")
+        if total_size > self.max_size:
+            raise UploadTooLargeError(self.max_size)
+        self.purge_expired()
+
+        upload = _ChunkedUpload(uuid.uuid4().hex, self.spool_dir, {
+            'category': category,
+            'filename': filename,
+            'content_type': content_type,
+            'total_size': total_size,
+            'chunk_size': self.chunk_size,
+            'sha256': sha256.lower() if sha256 else None,
+            'created_at': time.time()
+        })
+        open(upload.data_path, 'wb').close()
+        upload.save_meta()
+        with self._lock:
+            self._uploads[upload.upload_id] = upload
+        logger.info(f"📦 Chunked upload {upload.upload_id} started: {filename} ({total_size} bytes)")
+        return upload.to_dict()
+
+    def _get(self, upload_id: str) -> _ChunkedUpload:
+        with self._lock:
+            upload = self._uploads.get(upload_id)
+            if upload is None:
+                upload = self._load(upload_id)
+            upload.touched_at = time.time()
+            return upload
+
+    def _load(self, upload_id: str) -> _ChunkedUpload:
+        """Rebuild state (offset and running hash) from the spool after a restart"""
+        if not upload_id.isalnum():
+            raise UploadError("Upload not found", 404)
+        meta_path = os.path.join(self.spool_dir, f"{upload_id}.json")
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Upload not found", 404)
+
+        upload = _ChunkedUpload(upload_id, self.spool_dir, meta)
+        # Only whole chunks count; a torn write from a crash is discarded
+        size = os.path.getsize(upload.data_path) if os.path.exists(upload.data_path) else 0
+        size = min(size, meta['total_size'])
+        if size < meta['total_size']:
+            size -= size % upload.chunk_size
+        with open(upload.data_path, 'r+b' if os.path.exists(upload.data_path) else 'w+b') as f:
+            f.truncate(size)
+            while f.tell() < size:
+                block = f.read(min(DEFAULT_CHUNK_SIZE, size - f.tell()))
+                if not block:
+                    break
+                upload.hasher.update(block)
+        upload.received = size
+        self._uploads[upload_id] = upload
+        logger.info(f"📦 Resumed chunked upload {upload_id} at {size} bytes")
+        return upload
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        return self._get(upload_id).to_dict()
+
+    def put_chunk(self, upload_id: str, index: int, stream: BinaryIO) -> Dict[str, Any]:
+        """Append chunk ``index`` read from ``stream``"""
+        upload = self._get(upload_id)
+        with upload.lock:
+            total = upload.meta['total_size']
+            offset = index * upload.chunk_size
+            expected = min(upload.chunk_size, total - offset)
+            if index < 0 or expected <= 0:
+                raise UploadError(f"Chunk index {index} out of range")
+
+            if index < upload.next_index or upload.received == total:
+                # Already stored: drain and acknowledge so retries are idempotent
+                while stream.read(DEFAULT_CHUNK_SIZE):
+                    pass
+                result = upload.to_dict()
+                result['duplicate'] = True
+                return result
+            if index > upload.next_index:
+                raise UploadError(
+                    f"Expected chunk {upload.next_index}, got {index}", 409,
+                    next_chunk=upload.next_index
+                )
+
+            # Buffer at most one chunk; reject anything longer without reading it all
+            data = _read_exact(stream, expected + 1)
+            if len(data) != expected:
+                raise UploadError(f"Chunk {index} must be {expected} bytes, got {len(data)}{'+' if len(data) > expected else ''}")
+            with open(upload.data_path, 'r+b') as f:
+                f.seek(offset)
+                f.write(data)
+            upload.hasher.update(data)
+            upload.received = offset + expected
+            return upload.to_dict()
+
+    def complete(self, upload_id: str, dest_path_for) -> Dict[str, Any]:
+        """
+        Verify size and hash, then move the spool file into place.
+        ``dest_path_for(meta)`` returns (media_id, destination path).
+        """
+        upload = self._get(upload_id)
+        with upload.lock:
+            total = upload.meta['total_size']
+            if upload.received != total:
+                raise UploadError(
+                    f"Upload incomplete: {upload.received}/{total} bytes", 409,
+                    next_chunk=upload.next_index
+                )
+            digest = upload.hasher.hexdigest()
+            expected = upload.meta.get('sha256')
+            if expected and expected != digest:
+                self._discard(upload)
+                raise UploadError("Checksum mismatch, upload discarded", 422, sha256=digest)
+
+            media_id, dest = dest_path_for(upload.meta)
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(upload.data_path, dest)
+            self._discard(upload)
+        logger.info(f"📦 Chunked upload {upload_id} complete: {dest}")
+        return {**upload.meta, 'media_id': media_id, 'path': dest, 'size': total, 'sha256': digest}
+
+    def abort(self, upload_id: str):
+        upload = self._get(upload_id)
+        with upload.lock:
+            self._discard(upload)
+
+    def _discard(self, upload: _ChunkedUpload):
+        with self._lock:
+            self._uploads.pop(upload.upload_id, None)
+        for path in (upload.data_path, upload.meta_path):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def purge_expired(self) -> int:
+        """Remove uploads not touched within ``ttl`` (including ones only on disk)"""
+        cutoff = time.time() - self.ttl
+        removed = 0
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith('.json'):
+                continue
+            upload_id = name[:-5]
+            with self._lock:
+                upload = self._uploads.get(upload_id)
+            if upload is not None:
+                touched = upload.touched_at
+            else:
+                # Not loaded since a restart: the spool file's mtime is the last chunk write
+                data_path = os.path.join(self.spool_dir, f"{upload_id}.part")
+                meta_path = os.path.join(self.spool_dir, name)
+                touched = os.path.getmtime(data_path if os.path.exists(data_path) else meta_path)
+            if touched < cutoff:
+                self._discard(upload or _ChunkedUpload(upload_id, self.spool_dir, {}))
+                removed += 1
+        if removed:
+            logger.info(f"🧹 Purged {removed} expired chunked uploads")
+        return removed
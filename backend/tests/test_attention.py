@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from visisec_backend.attention import app_state_columns, gaze_columns, imu_columns, score_attention
+
+
+def imu(t, magnitude):
+    t = np.asarray(t, dtype=np.float64)
+    return {'t': t, 'ax': np.full(len(t), float(magnitude)), 'ay': np.zeros(len(t)), 'az': np.zeros(len(t))}
+
+
+def test_scores_still_and_distracted_windows():
+    t = np.arange(0, 20, 0.1)
+    result = score_attention(
+        imu(t, 0.2),
+        app_state_columns([{'timestamp': 10.0, 'state': 'background'}]),
+        gaze_columns({'t': t, 'on_screen': (t < 10).astype(float)}),
+        window_seconds=5.0
+    )
+    scores = result['timeline']['scores']
+    assert len(scores) == 4 and result['stats']['windows'] == 4
+    assert scores[:2] == [1.0, 1.0]
+    # Background and looking away; window 2 also holds the one app switch
+    assert scores[3] == pytest.approx(1.0 - 0.5 - 0.3)
+    assert scores[2] == pytest.approx(scores[3] - 0.4 / 3, abs=1e-4)
+    assert [p['start'] for p in result['low_attention_periods']] == [10.0]
+    assert result['level'] == 'medium'
+
+
+def test_epoch_milliseconds_are_converted():
+    t = 1.7e12 + np.arange(0, 10_000, 100.0)
+    result = score_attention(imu(t, 6.0), window_seconds=5.0)
+    assert result['stats']['windows'] == 2
+    assert result['timeline']['start_time'] == pytest.approx(1.7e9)
+    assert result['timeline']['scores'] == [0.7, 0.7]
+
+
+def test_oversized_span_is_rejected_before_allocating():
+    # Seconds-since-start next to an epoch-seconds timestamp: ~54 years of windows
+    with pytest.raises(ValueError, match='limit 1000'):
+        score_attention(imu([0.0, 1.7e9], 0.0), window_seconds=5.0, max_windows=1000)
+    assert score_attention(imu([0.0, 4999.0], 0.0), window_seconds=5.0, max_windows=1000)['stats']['windows'] == 1000
+
+
+def test_mixed_timestamp_units_are_rejected():
+    with pytest.raises(ValueError, match='mix epoch milliseconds and seconds'):
+        score_attention(imu([0.0, 1.7e12], 0.0))
+
+
+def test_mismatched_column_lengths_are_rejected():
+    columns = imu_columns({'t': [0, 1, 2], 'ax': [0, 0], 'ay': [0, 0, 0], 'az': [0, 0, 0]})
+    with pytest.raises(ValueError, match='imu columns have different lengths'):
+        score_attention(columns)
+    with pytest.raises(ValueError, match='window_seconds'):
+        score_attention(imu([0.0], 0.0), window_seconds=0)
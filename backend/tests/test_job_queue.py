@@ -0,0 +1,190 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from visisec_backend.job_queue import DurableJobQueue, PRIORITIES
+from visisec_backend.media_jobs import JOB_CANCELLED, JOB_COMPLETED, JOB_FAILED, JOB_QUEUED, JOB_RUNNING
+
+
+class FakeJob:
+    def __init__(self, kind, media_id):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.media_id = media_id
+        self.done = threading.Event()
+        self.status = JOB_RUNNING
+        self.result = None
+        self.error = None
+
+    def to_dict(self, include_result=True):
+        return {'segments': 1, 'completed_segments': int(self.done.is_set()), 'progress': float(self.done.is_set())}
+
+
+class FakeExecutor:
+    """Stands in for MediaJobExecutor; jobs finish when the test says so (or at once with ``auto``)"""
+
+    def __init__(self, auto=True):
+        self.auto = auto
+        self.jobs = {}
+
+    def submit(self, kind, media_id, path, params, start_time=0.0, end_time=None):
+        job = FakeJob(kind, media_id)
+        self.jobs[job.job_id] = job
+        if self.auto:
+            self.complete(job.job_id)
+        return job
+
+    def complete(self, job_id):
+        job = self.jobs[job_id]
+        job.status, job.result = JOB_COMPLETED, {'media_id': job.media_id}
+        job.done.set()
+
+    def cancel(self, job_id):
+        job = self.jobs[job_id]
+        job.status = JOB_CANCELLED
+        job.done.set()
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def snapshot(self):
+        return {'jobs': len(self.jobs)}
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'jobs.sqlite3')
+
+
+def make_queue(db_path, **kwargs):
+    kwargs.setdefault('executor', FakeExecutor())
+    return DurableJobQueue(db_path, **kwargs)
+
+
+def enqueue(queue, media_id='m1', priority=PRIORITIES['normal']):
+    return queue.enqueue('keyframes', media_id, '/tmp/video.mp4', {}, priority=priority)['job_id']
+
+
+def test_each_job_is_claimed_by_exactly_one_worker(db_path):
+    queues = [make_queue(db_path) for _ in range(3)]
+    job_ids = {enqueue(queues[0], f'm{i}') for i in range(40)}
+    claims = []
+    claims_lock = threading.Lock()
+
+    def drain(queue):
+        while True:
+            row = queue._claim()
+            if row is None:
+                return
+            with claims_lock:
+                claims.append((row['job_id'], queue.worker_id))
+
+    threads = [threading.Thread(target=drain, args=(q,)) for q in queues for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    claimed = [job_id for job_id, _ in claims]
+    assert sorted(claimed) == sorted(job_ids)
+    assert queues[0].counts() == {JOB_RUNNING: 40}
+
+
+def test_claim_order_follows_priority(db_path):
+    queue = make_queue(db_path)
+    bulk = enqueue(queue, 'bulk', PRIORITIES['bulk'])
+    live = enqueue(queue, 'live', PRIORITIES['live'])
+    normal = enqueue(queue, 'normal')
+    assert [queue._claim()['job_id'] for _ in range(3)] == [live, normal, bulk]
+    assert queue._claim() is None
+
+
+def test_expired_lease_is_requeued_and_old_owner_cannot_finish(db_path):
+    crashed = make_queue(db_path, lease_seconds=0.05)
+    job_id = enqueue(crashed)
+    assert crashed._claim()['job_id'] == job_id
+
+    survivor = make_queue(db_path, lease_seconds=0.05)
+    assert survivor.recover() == 0   # lease still valid
+    time.sleep(0.1)
+    assert survivor.recover() == 1
+    assert survivor.get(job_id)['status'] == JOB_QUEUED
+
+    row = survivor._claim()
+    assert row['job_id'] == job_id and row['attempts'] == 2
+    crashed._finish(job_id, JOB_COMPLETED, result={'stale': True})
+    assert survivor.get(job_id)['status'] == JOB_RUNNING
+    survivor._finish(job_id, JOB_COMPLETED, result={'ok': True})
+    assert survivor.get(job_id)['result'] == {'ok': True}
+
+
+def test_job_fails_after_max_attempts(db_path):
+    queue = make_queue(db_path, lease_seconds=0.02, max_attempts=2)
+    job_id = enqueue(queue)
+    for _ in range(2):
+        assert queue._claim()['job_id'] == job_id
+        time.sleep(0.05)
+        queue.recover()
+    job = queue.get(job_id)
+    assert job['status'] == JOB_FAILED
+    assert job['attempts'] == 2
+    assert job['error'] == 'Worker died too many times'
+    assert queue._claim() is None
+
+
+def test_finish_is_idempotent(db_path):
+    finished = []
+    queue = make_queue(db_path, on_finish=finished.append)
+    job_id = enqueue(queue)
+    queue._claim()
+    queue._finish(job_id, JOB_COMPLETED, result={'n': 1})
+    queue._finish(job_id, JOB_COMPLETED, result={'n': 2})
+    queue._finish(job_id, JOB_FAILED, error='late', owned=False)
+    job = queue.get(job_id)
+    assert (job['status'], job['result'], job['error']) == (JOB_COMPLETED, {'n': 1}, None)
+    assert [j['job_id'] for j in finished] == [job_id]
+
+
+def test_workers_run_jobs_to_completion(db_path):
+    finished = []
+    queue = make_queue(db_path, concurrency=2, on_finish=finished.append)
+    queue.start()
+    try:
+        job_ids = [enqueue(queue, f'm{i}') for i in range(5)]
+        for job_id in job_ids:
+            job = queue.wait(job_id, timeout=5)
+            assert job['status'] == JOB_COMPLETED
+            assert job['result'] == {'media_id': job['media_id']}
+        # on_finish runs right after waiters are woken
+        deadline = time.monotonic() + 5
+        while len(finished) < len(job_ids) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sorted(j['job_id'] for j in finished) == sorted(job_ids)
+    finally:
+        queue.stop()
+
+
+def test_cancel_queued_job(db_path):
+    queue = make_queue(db_path)
+    job_id = enqueue(queue)
+    assert queue.cancel(job_id)
+    assert queue.get(job_id)['status'] == JOB_CANCELLED
+    assert not queue.cancel(job_id)
+    assert queue._claim() is None
+
+
+def test_cancel_running_job(db_path):
+    executor = FakeExecutor(auto=False)
+    queue = make_queue(db_path, executor=executor, concurrency=1)
+    queue.start()
+    try:
+        job_id = enqueue(queue)
+        deadline = time.monotonic() + 5
+        while not queue._running and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert queue.cancel(job_id)
+        assert queue.wait(job_id, timeout=5)['status'] == JOB_CANCELLED
+    finally:
+        queue.stop()
@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+
+from visisec_backend.event_loop import BackgroundLoop
+from visisec_backend.live_summary import LiveSummarizer
+
+
+class FakeSummarizer:
+    """Partials list the mapped texts; the reduce joins the partials"""
+
+    async def map_chunk(self, segments):
+        return '+'.join(seg['text'] for seg in segments)
+
+    async def reduce_messages(self, partials):
+        return list(partials)
+
+    async def llm(self, messages):
+        return ' | '.join(messages)
+
+
+@pytest.fixture
+def background():
+    loop = BackgroundLoop(name='test-live-summary')
+    yield loop
+    loop.stop()
+
+
+def summarizer(background, updates):
+    return LiveSummarizer(
+        FakeSummarizer(), background,
+        lambda recording_id, text, final: updates.append((recording_id, text, final)),
+        interval=3600, segment_threshold=2
+    )
+
+
+def wait_for(updates, count):
+    deadline = time.time() + 5
+    while len(updates) < count and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(updates) >= count
+
+
+def test_handoff_keeps_partials_and_unmapped_segments(background):
+    updates = []
+    old = summarizer(background, updates)
+    old.start('r1')
+    old.add_segments('r1', [{'text': 'a', 'start': 0}, {'text': 'b', 'start': 1}])   # mapped: threshold 2
+    wait_for(updates, 1)
+    old.add_segments('r1', [{'text': 'c', 'start': 2}])                                # still pending
+
+    # What the releasing worker writes to the shared session state
+    checkpoint = json.loads(json.dumps(old.checkpoint('r1')))
+    old.discard('r1')
+    assert checkpoint['partials'] == ['a+b']
+    assert [seg['text'] for seg in checkpoint['pending']] == ['c']
+    assert checkpoint['segment_count'] == 3
+
+    new = summarizer(background, updates)
+    new.start('r1', checkpoint)
+    new.add_segments('r1', [{'text': 'd', 'start': 3}])
+    assert new.finish('r1').result(5) == 'a+b | c+d'
+    assert updates[-1] == ('r1', 'a+b | c+d', True)
+
+
+def test_start_without_checkpoint_is_empty(background):
+    live = summarizer(background, [])
+    live.start('r2')
+    assert live.checkpoint('r2')['partials'] == []
+    assert live.finish('r2').result(5) is None
+    assert live.checkpoint('r2') is None
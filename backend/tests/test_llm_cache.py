@@ -0,0 +1,84 @@
+import asyncio
+import threading
+
+from visisec_backend.llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_cache_key_is_canonical():
+    messages = [{'role': 'user', 'content': 'hi'}]
+    assert make_cache_key('m', messages, 0.7, 100) == make_cache_key('m', [dict(reversed(messages[0].items()))], 0.7, 100)
+    assert make_cache_key('m', messages, 0.7, 100) != make_cache_key('m', messages, 0.2, 100)
+
+
+def test_memory_tier_lru_and_ttl():
+    cache = LLMResponseCache(max_entries=2, ttl=3600)
+    cache.set('a', '1')
+    cache.set('b', '2')
+    assert cache.get('a') == '1'
+    cache.set('c', '3')               # evicts b, the least recently used
+    assert cache.get('b') is None
+    assert cache.get('a') == '1'
+
+    expired = LLMResponseCache(ttl=-1)
+    expired.set('a', '1')
+    assert expired.get('a') is None
+    assert expired.stats()['expirations'] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    cache = LLMResponseCache(db_path=path)
+    cache.set('k', 'answer')
+    cache.close()
+
+    reopened = LLMResponseCache(db_path=path)
+    assert reopened.get('k') == 'answer'
+    assert reopened.get('k') == 'answer'
+    stats = reopened.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['disk_entries']) == (1, 1, 1)
+    reopened.close()
+
+
+def test_async_access_keeps_sqlite_off_the_loop(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    seeded = LLMResponseCache(db_path=path)
+    seeded.set('k', 'answer')
+    seeded.close()
+
+    cache = LLMResponseCache(db_path=path)
+    sqlite_threads = []
+    for name in ('_get_disk', '_set_disk'):
+        method = getattr(cache, name)
+
+        def traced(*args, _method=method):
+            sqlite_threads.append(threading.get_ident())
+            return _method(*args)
+        setattr(cache, name, traced)
+
+    async def scenario():
+        loop_thread = threading.get_ident()
+        assert await cache.aget('k') == 'answer'      # disk hit, promoted
+        assert await cache.aget('k') == 'answer'      # memory hit, no disk access
+        assert await cache.aget('missing') is None
+        await cache.aset('new', 'value')
+        return loop_thread
+
+    loop_thread = asyncio.run(scenario())
+    assert len(sqlite_threads) == 3
+    assert loop_thread not in sqlite_threads
+    assert cache.get_memory('new') == 'value'
+    stats = cache.stats()
+    assert (stats['disk_hits'], stats['memory_hits'], stats['misses'], stats['disk_entries']) == (1, 2, 1, 2)
+    cache.close()
+
+
+def test_async_access_without_disk_tier():
+    cache = LLMResponseCache()
+
+    async def scenario():
+        assert await cache.aget('k') is None
+        await cache.aset('k', 'v')
+        return await cache.aget('k')
+
+    assert asyncio.run(scenario()) == 'v'
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from visisec_backend.llm_gateway import CircuitBreaker, CircuitOpenError, LLMGateway, UpstreamError
+
+
+def half_open_gateway() -> LLMGateway:
+    gateway = LLMGateway(max_retries=0, failure_threshold=1, reset_timeout=0.0)
+    gateway.breaker.record_failure()
+    assert gateway.breaker.state == CircuitBreaker.OPEN
+    return gateway
+
+
+async def hang():
+    await asyncio.sleep(3600)
+
+
+def test_cancelled_probe_releases_half_open_breaker():
+    async def scenario():
+        gateway = half_open_gateway()
+        task = asyncio.ensure_future(gateway.call(None, hang))
+        await asyncio.sleep(0.01)
+        assert gateway.breaker.probe_in_flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not gateway.breaker.probe_in_flight
+
+        async def ok():
+            return 'ok'
+        assert await gateway.call(None, ok) == 'ok'
+        assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_stream_releases_half_open_breaker():
+    async def scenario():
+        gateway = half_open_gateway()
+
+        async def stream():
+            async with gateway.stream_slot():
+                await hang()
+
+        task = asyncio.ensure_future(stream())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not gateway.breaker.probe_in_flight
+        async with gateway.stream_slot():
+            pass
+        assert gateway.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens_breaker():
+    async def scenario():
+        gateway = half_open_gateway()
+
+        async def fail():
+            raise UpstreamError(503, 'down')
+        with pytest.raises(UpstreamError):
+            await gateway.call(None, fail)
+        gateway.breaker.reset_timeout = 60.0
+        with pytest.raises(CircuitOpenError):
+            await gateway.call(None, fail)
+
+    asyncio.run(scenario())
+
+
+def test_waiters_survive_cancelled_leader():
+    async def scenario():
+        gateway = LLMGateway()
+        calls = []
+
+        async def send():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return len(calls)
+
+        leader = asyncio.ensure_future(gateway.call('key', send))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(gateway.call('key', send))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await waiter == 2
+        assert leader.cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_identical_calls_are_coalesced():
+    async def scenario():
+        gateway = LLMGateway()
+        calls = []
+
+        async def send():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return 'done'
+
+        results = await asyncio.gather(*(gateway.call('key', send) for _ in range(3)))
+        assert results == ['done'] * 3
+        assert len(calls) == 1
+        assert gateway.coalesced == 2
+
+    asyncio.run(scenario())
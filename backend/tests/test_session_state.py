@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from visisec_backend.session_state import MemorySessionStore, SharedSessionStore
+from visisec_backend.storage import MemoryStorage, SQLiteStorage
+
+
+def new_session(session_id='s1', **fields):
+    return {'session_id': session_id, 'recording_id': f'rec-{session_id}', 'owner': 'user1',
+            'meeting_title': 'Weekly', 'start_time': '2026-10-17T10:00:00', 'status': 'active', **fields}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def storages(request, tmp_path):
+    """Two handles on the same session table, as two workers would have"""
+    if request.param == 'memory':
+        storage = MemoryStorage()
+        yield storage, storage
+        return
+    path = str(tmp_path / 'visisec.sqlite3')
+    first, second = SQLiteStorage(path), SQLiteStorage(path)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_claim_respects_live_lease(storages):
+    a, b = storages
+    a.save_session(new_session())
+    now = time.time()
+    assert a.claim_session('s1', 'worker-a', now + 10, now)
+    assert a.claim_session('s1', 'worker-a', now + 20, now)   # renewing its own claim
+    assert not b.claim_session('s1', 'worker-b', now + 10, now)
+    assert b.get_session('s1')['worker'] == 'worker-a'
+    assert not b.claim_session('missing', 'worker-b', now + 10, now)
+
+
+def test_claim_after_lease_expiry(storages):
+    a, b = storages
+    a.save_session(new_session())
+    now = time.time()
+    assert a.claim_session('s1', 'worker-a', now + 1, now)
+    assert b.claim_session('s1', 'worker-b', now + 11, now + 2)
+    session = a.get_session('s1')
+    assert (session['worker'], session['lease_until']) == ('worker-b', now + 11)
+
+
+def test_release_only_by_owner(storages):
+    a, b = storages
+    a.save_session(new_session())
+    now = time.time()
+    a.claim_session('s1', 'worker-a', now + 10, now)
+    assert not b.release_session('s1', 'worker-b')
+    assert a.release_session('s1', 'worker-a')
+    assert not a.release_session('s1', 'worker-a')
+    assert b.claim_session('s1', 'worker-b', now + 10, now)
+
+
+def test_renew_only_own_leases(storages):
+    a, b = storages
+    a.save_session(new_session('s1'))
+    a.save_session(new_session('s2'))
+    now = time.time()
+    a.claim_session('s1', 'worker-a', now + 1, now)
+    b.claim_session('s2', 'worker-b', now + 1, now)
+    a.renew_sessions(['s1', 's2'], 'worker-a', now + 30)
+    assert a.get_session('s1')['lease_until'] == now + 30
+    assert a.get_session('s2')['lease_until'] == now + 1
+
+
+def test_claim_clears_handoff_request(storages):
+    a, b = storages
+    a.save_session(new_session())
+    now = time.time()
+    a.claim_session('s1', 'worker-a', now + 10, now)
+    b.update_sessions({'s1': {'handoff': 'worker-b'}})
+    assert a.get_session('s1')['handoff'] == 'worker-b'
+    assert a.release_session('s1', 'worker-a')
+    assert b.claim_session('s1', 'worker-b', now + 10, now)
+    assert a.get_session('s1')['handoff'] is None
+
+
+def test_update_merges_extra_fields(storages):
+    a, b = storages
+    a.save_session(new_session(sensor_data_count=1))
+    b.update_sessions({'s1': {'sensor_data_count': 5, 'live_summary': 'so far'}})
+    session = a.get_session('s1')
+    assert (session['sensor_data_count'], session['live_summary'], session['meeting_title']) == (5, 'so far', 'Weekly')
+
+
+def test_concurrent_claims_have_one_winner(tmp_path):
+    path = str(tmp_path / 'visisec.sqlite3')
+    workers = [SQLiteStorage(path) for _ in range(4)]
+    workers[0].save_session(new_session())
+    now = time.time()
+    barrier = threading.Barrier(len(workers))
+    wins = []
+
+    def claim(index, storage):
+        barrier.wait()
+        if storage.claim_session('s1', f'worker-{index}', now + 10, now):
+            wins.append(index)
+
+    threads = [threading.Thread(target=claim, args=(i, s)) for i, s in enumerate(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(wins) == 1
+    assert workers[1].get_session('s1')['worker'] == f'worker-{wins[0]}'
+    for storage in workers:
+        storage.close()
+
+
+def test_shared_store_writes_behind_and_hands_off(tmp_path):
+    path = str(tmp_path / 'visisec.sqlite3')
+    storage_a, storage_b = SQLiteStorage(path), SQLiteStorage(path)
+    a = SharedSessionStore(storage_a, flush_interval=60)
+    a.start()   # pending updates wait for the (far-off) next flush
+    b = SharedSessionStore(storage_b, flush_interval=0)
+    a.create(new_session())
+    assert a.claim('s1', 'worker-a', 10)
+
+    a.update('s1', sensor_data_count=7)
+    assert a.get('s1')['sensor_data_count'] == 7       # pending fields overlay reads
+    assert b.get('s1').get('sensor_data_count') is None
+    assert a.stats()['pending_sessions'] == 1
+
+    # worker B asks for the session; the owner flushes on release
+    assert not b.claim('s1', 'worker-b', 10)
+    b.set('s1', handoff='worker-b')
+    assert a.get('s1')['handoff'] == 'worker-b'
+    assert a.release('s1', 'worker-a')
+    assert b.claim('s1', 'worker-b', 10)
+    session = b.get('s1')
+    assert (session['worker'], session['handoff'], session['sensor_data_count']) == ('worker-b', None, 7)
+    a.close()
+    b.close()
+    storage_a.close()
+    storage_b.close()
+
+
+def test_memory_store_lease_roundtrip():
+    store = MemorySessionStore()
+    store.create(new_session())
+    assert store.claim('s1', 'worker-a', 10)
+    assert not store.claim('s1', 'worker-b', 10)
+    store.update('s1', status='disconnected')
+    assert store.find('rec-s1')['status'] == 'disconnected'
+    assert store.release('s1', 'worker-a')
+    store.delete('s1')
+    assert store.get('s1') is None
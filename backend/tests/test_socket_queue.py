@@ -0,0 +1,113 @@
+import json
+import time
+
+from flask import Flask
+from flask_socketio import SocketIO, join_room
+from socketio import packet
+from werkzeug.test import EnvironBuilder
+
+from visisec_backend.server import parse_args
+from visisec_backend.socket_queue import LocalMessageBus, LocalPubSubManager, message_queue_options
+
+
+class Peer:
+    """
+    A client of one worker at the Engine.IO layer: its packets go through
+    the worker's real Socket.IO server and what the server sends it is
+    captured (Flask-SocketIO's test client refuses to run with a queue).
+    """
+
+    def __init__(self, worker, eio_sid: str):
+        app, socketio = worker
+        self.server = socketio.server
+        self.eio_sid = eio_sid
+        environ = EnvironBuilder('/socket.io/').get_environ()
+        environ['flask.app'] = app
+        self.server._handle_eio_connect(eio_sid, environ)
+        self.server._handle_eio_message(eio_sid, '0')
+
+    def emit(self, event: str, data):
+        self.server._handle_eio_message(self.eio_sid, '2' + json.dumps([event, data]))
+
+    def received(self, event: str, timeout: float = 2.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            events = [pkt.data[1] for sid, pkt in self.server.sent_packets
+                      if sid == self.eio_sid and pkt.packet_type == packet.EVENT and pkt.data[0] == event]
+            if events or time.monotonic() >= deadline:
+                return events
+            time.sleep(0.02)
+
+
+def make_worker(bus: LocalMessageBus):
+    app = Flask(__name__)
+    socketio = SocketIO(app, async_mode='threading', client_manager=LocalPubSubManager(bus=bus))
+    server = socketio.server
+    server.async_handlers = False
+    server.sent_packets = []
+    server._send_packet = lambda eio_sid, pkt: server.sent_packets.append((eio_sid, pkt))
+    # Room emits are encoded once and sent as Engine.IO packets
+    server._send_eio_packet = lambda eio_sid, eio_pkt: server.sent_packets.append(
+        (eio_sid, packet.Packet(encoded_packet=eio_pkt.data)))
+
+    @socketio.on('join')
+    def on_join(room):
+        join_room(room)
+
+    @socketio.on('shout')
+    def on_shout(data):
+        socketio.emit('news', data, to=data['room'])
+
+    return app, socketio
+
+
+def test_room_emit_crosses_workers():
+    bus = LocalMessageBus()
+    worker_a, worker_b = make_worker(bus), make_worker(bus)
+    speaker = Peer(worker_a, 'a1')
+    listener = Peer(worker_b, 'b1')
+    outsider = Peer(worker_b, 'b2')
+    listener.emit('join', 'meeting-1')
+
+    speaker.emit('shout', {'room': 'meeting-1', 'text': 'hello'})
+
+    assert listener.received('news') == [{'room': 'meeting-1', 'text': 'hello'}]
+    assert outsider.received('news', timeout=0.2) == []
+    # The speaker isn't in the room on its own worker either
+    assert speaker.received('news', timeout=0.2) == []
+
+
+def test_local_bus_delivers_to_every_subscriber():
+    bus = LocalMessageBus()
+    first, second = bus.subscribe('ch'), bus.subscribe('ch')
+    other = bus.subscribe('elsewhere')
+    bus.publish('ch', {'n': 1})
+    assert first.get_nowait() == {'n': 1}
+    assert second.get_nowait() == {'n': 1}
+    assert other.empty()
+
+
+def test_message_queue_options():
+    assert message_queue_options('', 'socketio') == {}
+    local = message_queue_options('local', 'visisec')
+    assert isinstance(local['client_manager'], LocalPubSubManager)
+    assert local['client_manager'].channel == 'visisec'
+    assert message_queue_options('redis://localhost:6379/0', 'visisec') == {
+        'message_queue': 'redis://localhost:6379/0',
+        'channel': 'visisec'
+    }
+
+
+def test_parse_args_defaults(monkeypatch):
+    for name in ('SERVER_MODE', 'FLASK_HOST', 'FLASK_PORT', 'SERVER_WORKERS', 'SERVER_ASYNC_MODE'):
+        monkeypatch.delenv(name, raising=False)
+    args = parse_args([])
+    assert (args.mode, args.host, args.port, args.workers, args.async_mode) == (
+        'development', '0.0.0.0', 5124, 1, 'gevent')
+
+
+def test_parse_args_env_and_flags(monkeypatch):
+    monkeypatch.setenv('SERVER_MODE', 'production')
+    monkeypatch.setenv('SERVER_WORKERS', '4')
+    args = parse_args(['--port', '6000', '--async-mode', 'eventlet'])
+    assert (args.mode, args.port, args.workers, args.async_mode) == ('production', 6000, 4, 'eventlet')
@@ -0,0 +1,38 @@
+import numpy as np
+
+from visisec_backend.sensor_archive import SensorArchiveWriter, open_archive
+from visisec_backend.sensor_buffers import ARCHIVE_STREAMS
+from visisec_backend.timeline import TimelineBuilder, open_timeline
+
+T0 = 1.7e9
+
+
+def build(tmp_path, t, **options):
+    writer = SensorArchiveWriter(str(tmp_path / 'rec'), ARCHIVE_STREAMS)
+    t = np.asarray(t, dtype=np.float64)
+    imu = {name: np.full(len(t), 0.5) for name, _ in ARCHIVE_STREAMS['imu']}
+    imu['t'] = t
+    writer.append('imu', imu)
+    writer.append('app_state', {'t': t[:1], 'foreground': [1]})
+    writer.close()
+    archive = open_archive(str(tmp_path), 'rec')
+    TimelineBuilder(factor=4, attention_window_seconds=5.0, **options).build(archive)
+    return open_timeline(archive.path).meta
+
+
+def test_attention_uses_the_configured_window(tmp_path):
+    meta = build(tmp_path, T0 + np.arange(0, 60, 0.1))
+    levels = meta['series']['attention']['levels']
+    assert levels[0] == {'bucket_seconds': 5.0, 'buckets': 12}
+    assert meta['attention_score'] == 1.0
+
+
+def test_skewed_clock_coarsens_the_attention_window(tmp_path):
+    # One sample from a client clock that started at 0, then real epoch seconds
+    t = np.concatenate(([1.0], T0 + np.arange(0, 60, 0.1)))
+    meta = build(tmp_path, t, max_base_buckets=1000, max_attention_windows=1000)
+    base = meta['series']['attention']['levels'][0]
+    assert base['buckets'] <= 1000
+    assert base['bucket_seconds'] * 1000 > meta['duration']
+    assert meta['series']['motion']['levels'][0]['buckets'] <= 1001
+    assert meta['attention_score'] is not None
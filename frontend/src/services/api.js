@@ -109,6 +109,62 @@ export async function uploadVideo(file) {
   }
 }
 
+/**
+ * 断点续传上传（分块 PUT，失败后从服务端记录的 next_chunk 继续）
+ * kind: 'audio' | 'video'
+ */
+export async function uploadResumable(file, kind, { maxRetries = 5, onProgress } = {}) {
+  const endpoint = '/api/v1/uploads'
+  logAPI('POST', endpoint, { filename: file.name, size: file.size, kind })
+
+  const request = async (method, path, body, headers = {}) => {
+    const response = await fetch(`${API_BASE_URL}${path}`, { method, body, headers })
+    const data = await response.json().catch(() => ({ error: response.statusText }))
+    if (!response.ok) {
+      const error = new Error(data.error || `HTTP ${response.status}`)
+      error.status = response.status
+      error.nextChunk = data.next_chunk
+      throw error
+    }
+    return data
+  }
+
+  try {
+    const upload = await request('POST', endpoint, JSON.stringify({
+      kind,
+      filename: file.name,
+      content_type: file.type,
+      total_size: file.size
+    }), { 'Content-Type': 'application/json' })
+
+    let index = upload.next_chunk
+    let failures = 0
+    while (index < upload.total_chunks) {
+      const chunk = file.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size)
+      try {
+        const state = await request('PUT', `${endpoint}/${upload.upload_id}/chunks/${index}`, chunk)
+        index = state.next_chunk
+        failures = 0
+        if (onProgress) onProgress(state.received / state.total_size)
+      } catch (error) {
+        if (error.status && error.status !== 409) throw error
+        if (++failures > maxRetries) throw error
+        // Ask the server where to resume instead of resending everything
+        await new Promise(resolve => setTimeout(resolve, Math.min(8000, 500 * 2 ** failures)))
+        const state = await request('GET', `${endpoint}/${upload.upload_id}`)
+        index = state.next_chunk
+      }
+    }
+
+    const data = await request('POST', `${endpoint}/${upload.upload_id}/complete`)
+    logAPIResponse('POST', endpoint, data)
+    return data
+  } catch (error) {
+    logAPIResponse('POST', endpoint, null, error)
+    throw error
+  }
+}
+
 /**
  * 分析注意力数据
  */
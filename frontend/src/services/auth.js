@@ -100,6 +100,11 @@ export async function changePassword(currentPassword, newPassword) {
     throw new Error(data.error || 'Password change failed')
   }
 
+  // Old tokens are revoked on password change; keep the fresh one
+  if (data.token) {
+    localStorage.setItem('auth_token', data.token)
+  }
+
   return data
 }
 
@@ -54,7 +54,9 @@ export class WebSocketManager {
           reconnection: true,
           reconnectionAttempts: 5,
           reconnectionDelay: 2000,
-          timeout: 10000
+          timeout: 10000,
+          // Authenticated once per connection; re-read on every reconnect
+          auth: (cb) => cb({ token: localStorage.getItem('auth_token') })
         })
 
         // Connection events
@@ -220,6 +222,10 @@ export class VisiSecWebSocket {
     this.wsManager = new WebSocketManager()
     this.sessionId = null
     this.recordingId = null
+    // Latest server flow-control advice (see 'throttle')
+    this.flowControl = { level: 'normal', minIntervalMs: 0, acks: true }
+    this.lastSensorSentAt = 0
+    this.throttleHandlers = []
     // Ensure socket initialized?? 
     // Actually, WebSocketManager.connect() initializes it.
     // But VisiSecWebSocket might call .on() before .connect().
@@ -234,6 +240,39 @@ export class VisiSecWebSocket {
     // If we init in connect(), .on() fails if called before.
 
     // Let's auto-init socket in WebSocketManager constructor with autoConnect: false
+
+    // After a reconnect (possibly to another server worker) pick the recording back up
+    this.wsManager.onEvent('connected', () => {
+      // Server asks for a lower send rate while it is under load
+      this.wsManager.off('throttle')
+      this.wsManager.on('throttle', (data) => {
+        this.flowControl = data
+        this.throttleHandlers.forEach(handler => handler(data))
+      })
+
+      if (!this.sessionId || !this.recordingId) {
+        return
+      }
+      const resume = () => this.wsManager.send('session_resume', {
+        sessionId: this.sessionId,
+        recordingId: this.recordingId
+      })
+      this.wsManager.off('session_resumed')
+      this.wsManager.on('session_resumed', (data) => {
+        this.sessionId = data.sessionId
+        log('▶️', 'Session resumed', data)
+      })
+      // Still live on another worker (the old connection hasn't dropped yet): try again shortly
+      this.wsManager.off('session_busy')
+      this.wsManager.on('session_busy', (data) => {
+        if (data.sessionId !== this.sessionId) {
+          return
+        }
+        log('⏳', 'Session busy on another server worker, retrying', data)
+        setTimeout(resume, data.retryAfterMs || 1000)
+      })
+      resume()
+    })
   }
 
   /**
@@ -287,6 +326,13 @@ export class VisiSecWebSocket {
       return
     }
 
+    // Each snapshot carries the full client history, so a skipped one loses nothing
+    const now = Date.now()
+    if (now - this.lastSensorSentAt < (this.flowControl.minIntervalMs || 0)) {
+      return
+    }
+    this.lastSensorSentAt = now
+
     try {
       this.wsManager.send('sensor_data', {
         sessionId: this.sessionId,
@@ -298,6 +344,47 @@ export class VisiSecWebSocket {
     }
   }
 
+  /**
+   * Send a batch of IMU points as one binary frame (format: imu-f32-v1)
+   * Each row: t (float64 ms), ax, ay, az, ra, rb, rg (float32), little-endian
+   */
+  sendSensorBatch(points, appStates = null, seq = null) {
+    if (!this.sessionId) {
+      log('⚠️', 'No active session - cannot send sensor batch')
+      return
+    }
+
+    const ROW_BYTES = 32
+    const buffer = new ArrayBuffer(points.length * ROW_BYTES)
+    const view = new DataView(buffer)
+    points.forEach((point, i) => {
+      const offset = i * ROW_BYTES
+      const accel = point.acceleration || {}
+      const rotation = point.rotationRate || {}
+      view.setFloat64(offset, point.timestamp, true)
+      view.setFloat32(offset + 8, accel.x || 0, true)
+      view.setFloat32(offset + 12, accel.y || 0, true)
+      view.setFloat32(offset + 16, accel.z || 0, true)
+      view.setFloat32(offset + 20, rotation.alpha || 0, true)
+      view.setFloat32(offset + 24, rotation.beta || 0, true)
+      view.setFloat32(offset + 28, rotation.gamma || 0, true)
+    })
+
+    try {
+      // Emit directly: logging every batch would defeat the purpose
+      this.wsManager.socket.emit('sensor_batch', {
+        sessionId: this.sessionId,
+        format: 'imu-f32-v1',
+        payload: buffer,
+        appState: appStates,
+        seq: seq
+      })
+    } catch (error) {
+      log('❌', 'Failed to send sensor batch', error)
+      throw error
+    }
+  }
+
   /**
    * Send keyframe
    */
@@ -308,11 +395,22 @@ export class VisiSecWebSocket {
     }
 
     try {
-      this.wsManager.send('keyframe', {
+      // Send the image as a binary attachment instead of a base64 string
+      const { base64, ...metadata } = frameData
+      const payload = {
         sessionId: this.sessionId,
         recordingId: this.recordingId,
-        ...frameData
-      })
+        ...metadata
+      }
+      if (base64) {
+        const binary = atob(base64.replace(/^data:[^,]*,/, ''))
+        const image = new Uint8Array(binary.length)
+        for (let i = 0; i < binary.length; i++) {
+          image[i] = binary.charCodeAt(i)
+        }
+        payload.image = image.buffer
+      }
+      this.wsManager.send('keyframe', payload)
     } catch (error) {
       log('❌', 'Failed to send keyframe', error)
       throw error
@@ -373,6 +471,14 @@ export class VisiSecWebSocket {
     this.wsManager.on('summary_update', handler)
   }
 
+  /**
+   * Register flow-control advice handler ({level, maxEventsPerSecond, minIntervalMs, acks}),
+   * e.g. to grow sendSensorBatch batches while the server is loaded
+   */
+  onThrottle(handler) {
+    this.throttleHandlers.push(handler)
+  }
+
   onError(handler) {
     this.wsManager.onEvent('error', handler)
   }